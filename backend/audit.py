@@ -0,0 +1,231 @@
+"""
+预约审计日志的异步批量写入
+
+开启 AUDIT_ASYNC 后，BookingLog 不再在用户请求的事务内插入：
+日志事件先暂存在会话上，事务提交后进入进程内队列，由后台线程每隔
+AUDIT_FLUSH_INTERVAL_MS 毫秒或攒满 AUDIT_BATCH_SIZE 条时批量插入（group commit）。
+事务回滚时暂存的事件随之丢弃。写库失败或关闭时仍未写入的事件会追加到
+AUDIT_SPOOL_FILE，下次启动时自动补写。
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from models import BookingLog
+
+load_dotenv()
+
+# 审计写入配置
+AUDIT_ASYNC = os.getenv("AUDIT_ASYNC", "false").lower() == "true"
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "200"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_QUEUE_MAXSIZE = int(os.getenv("AUDIT_QUEUE_MAXSIZE", "10000"))
+AUDIT_SPOOL_FILE = os.getenv("AUDIT_SPOOL_FILE", "./audit_spool.jsonl")
+
+# 会话上暂存待提交事件的键
+_PENDING_KEY = "pending_audit_events"
+_STOP = object()
+
+
+class AuditWriter:
+    """后台批量写入 BookingLog 的审计队列"""
+
+    def __init__(self, enabled: bool = AUDIT_ASYNC, flush_interval_ms: int = AUDIT_FLUSH_INTERVAL_MS,
+                 batch_size: int = AUDIT_BATCH_SIZE, maxsize: int = AUDIT_QUEUE_MAXSIZE,
+                 spool_file: str = AUDIT_SPOOL_FILE):
+        self.enabled = enabled
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.spool_file = spool_file
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._session_factory = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "spooled": 0,
+            "sync_fallbacks": 0,
+            "max_queue_depth": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, session_factory) -> None:
+        """补写上次遗留的事件并启动后台写入线程"""
+        if not self.enabled or self.running:
+            return
+        self._session_factory = session_factory
+        self._replay_spool()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """停止写入线程，队列中剩余事件写库，失败则落盘"""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # 线程未能按时退出，把剩余事件落盘，下次启动时补写
+            self._spool(self._drain())
+        self._thread = None
+
+    def defer(self, db: Session, entry: Dict) -> None:
+        """在会话上暂存一条审计事件（BookingLog 列值字典），事务提交后才进入队列"""
+        db.info.setdefault(_PENDING_KEY, []).append(entry)
+
+    def enqueue(self, events: List[Dict]) -> None:
+        """将已提交事务的事件放入队列；写入线程未运行或队列已满时在调用线程内直接写入"""
+        if not self.running:
+            self._incr("sync_fallbacks", len(events))
+            self._flush(events)
+            return
+        for item in events:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self._incr("sync_fallbacks")
+                self._flush([item])
+                continue
+            self._incr("enqueued")
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            if depth > self._stats["max_queue_depth"]:
+                self._stats["max_queue_depth"] = depth
+
+    def metrics(self) -> Dict:
+        """返回队列深度与写入统计"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            "enabled": self.enabled,
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "flush_interval_ms": int(self.flush_interval * 1000),
+            "batch_size": self.batch_size,
+        })
+        return stats
+
+    def _incr(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _drain(self) -> List[Dict]:
+        """取出队列中所有剩余事件"""
+        items = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return items
+            if item is not _STOP:
+                items.append(item)
+
+    def _run(self) -> None:
+        """后台线程：按时间间隔或批量大小触发写入"""
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                # 空闲时阻塞等待第一条事件，之后最多再等一个刷新间隔
+                timeout = None if not batch else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+
+            if stopping:
+                batch.extend(self._drain())
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: List[Dict]) -> None:
+        """批量插入一批事件，失败时落盘"""
+        started = time.perf_counter()
+        db = self._session_factory()
+        try:
+            db.execute(insert(BookingLog), batch)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[审计] 批量写入失败，{len(batch)} 条事件已落盘: {e}")
+            self._spool(batch)
+            return
+        finally:
+            db.close()
+
+        with self._stats_lock:
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["last_flush_ms"] = (time.perf_counter() - started) * 1000
+
+    def _spool(self, batch: List[Dict]) -> None:
+        """将事件追加写入本地文件"""
+        if not batch:
+            return
+        with open(self.spool_file, "a", encoding="utf-8") as f:
+            for item in batch:
+                f.write(json.dumps({**item, "timestamp": item["timestamp"].isoformat()}, ensure_ascii=False))
+                f.write("\n")
+        self._incr("spooled", len(batch))
+
+    def _replay_spool(self) -> None:
+        """启动时补写上次落盘的事件"""
+        if not os.path.exists(self.spool_file):
+            return
+        with open(self.spool_file, encoding="utf-8") as f:
+            batch = [json.loads(line) for line in f if line.strip()]
+        for item in batch:
+            item["timestamp"] = datetime.fromisoformat(item["timestamp"])
+
+        db = self._session_factory()
+        try:
+            if batch:
+                db.execute(insert(BookingLog), batch)
+                db.commit()
+            os.remove(self.spool_file)
+            print(f"[审计] 已补写 {len(batch)} 条落盘事件")
+        except Exception as e:
+            db.rollback()
+            print(f"[审计] 补写落盘事件失败: {e}")
+        finally:
+            db.close()
+
+
+# 全局审计写入器
+audit_writer = AuditWriter()
+
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        audit_writer.enqueue(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
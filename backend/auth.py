@@ -3,27 +3,248 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session, make_transient_to_detached
+from typing import Deque, Dict, Optional
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import hashlib
+import secrets
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
 
-from database import get_db
-from models import User
-from schemas import TokenData
+from database import get_db, SessionLocal
+from models import User, UserTokenVersion, RevokedToken, RefreshToken, OAuthState
+from schemas import TokenData, Principal
+from queries import USER_BY_EMAIL
+from cache import TTLCache
+from policy import get_policy
 
 load_dotenv()
 
 # JWT配置
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 24 * 60  # 24小时
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))  # 短期访问令牌
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+
+# 认证主体缓存：按令牌 sub（邮箱）缓存用户记录，避免每个请求都查询 users 表
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))  # 秒，0 表示禁用
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl_seconds=PRINCIPAL_CACHE_TTL)
+
+# 会话提交后才更新的内存状态（令牌版本、吊销列表）：回调暂存在 session.info 中，回滚时丢弃
+_AFTER_COMMIT_KEY = "auth_after_commit"
+
+def _on_commit(db: Session, callback) -> None:
+    """登记在 db 提交成功后执行的回调"""
+    db.info.setdefault(_AFTER_COMMIT_KEY, []).append(callback)
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session: Session) -> None:
+    for callback in session.info.pop(_AFTER_COMMIT_KEY, []):
+        callback()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_AFTER_COMMIT_KEY, None)
+
+# 令牌版本表的内存副本刷新间隔（秒），决定跨进程的失效传播延迟
+TOKEN_VERSION_REFRESH_SECONDS = float(os.getenv("TOKEN_VERSION_REFRESH_SECONDS", "5"))
+
+class TokenVersionCache:
+    """user_token_versions 表的内存副本
+
+    表中只有版本被提升过的用户，数据量很小，按固定间隔整表重新加载；
+    本进程内提升版本在事务提交后立即更新副本，其他进程在一个刷新间隔内生效。
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._versions: Dict[str, int] = {}
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> int:
+        """获取用户当前令牌版本"""
+        self._maybe_refresh()
+        return self._versions.get(user_id, 0)
+
+    def bump(self, db: Session, user_id: str) -> int:
+        """提升用户令牌版本（由调用方提交事务），使已签发令牌的声明失效
+
+        内存副本在事务提交后才更新，回滚时保持不变。
+        """
+        row = db.get(UserTokenVersion, user_id)
+        if row is None:
+            row = UserTokenVersion(user_id=user_id, version=self.get(user_id) + 1)
+            db.add(row)
+        else:
+            row.version += 1
+        version = row.version
+
+        def apply() -> None:
+            self._versions[user_id] = version
+
+        _on_commit(db, apply)
+        return version
+
+    def _maybe_refresh(self) -> None:
+        if time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        with self._lock:
+            if time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return
+            db = SessionLocal()
+            try:
+                rows = db.query(UserTokenVersion.user_id, UserTokenVersion.version).all()
+                self._versions = {user_id: version for user_id, version in rows}
+            except Exception as e:
+                print(f"加载令牌版本失败: {e}")
+            finally:
+                db.close()
+            self._loaded_at = time.monotonic()
+
+token_versions = TokenVersionCache(TOKEN_VERSION_REFRESH_SECONDS)
+
+# 吊销列表同步间隔（秒），决定登出在其他进程中生效的最大延迟
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "2"))
+
+class RevocationList:
+    """已吊销令牌 jti 的内存集合
+
+    verify_token 中的检查是一次集合查找，不访问数据库；每隔 refresh_seconds
+    整体重新加载未过期的吊销记录（访问令牌有效期很短，表中只有最近吊销的少量记录）。
+    不按自增 id 增量同步：清理过期记录后 SQLite 会复用 rowid，新记录可能低于已同步的水位线。
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._expiry: Dict[str, datetime] = {}
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti: str) -> bool:
+        """判断令牌是否已被吊销"""
+        self._maybe_refresh()
+        return jti in self._expiry
+
+    def revoke(self, db: Session, jti: str, user_id: Optional[str], expires_at: datetime) -> None:
+        """吊销令牌（由调用方提交事务），提交后本进程立即生效"""
+        if db.query(RevokedToken.id).filter(RevokedToken.jti == jti).first() is None:
+            db.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+
+        def apply() -> None:
+            self._expiry[jti] = expires_at
+
+        _on_commit(db, apply)
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def _maybe_refresh(self) -> None:
+        if time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        with self._lock:
+            if time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return
+            now = datetime.utcnow()
+            # 吊销记录只在过期后才被删除，未过期的已有条目（含查询期间本进程刚提交的）继续保留
+            expiry = {jti: expires_at for jti, expires_at in self._expiry.items() if expires_at > now}
+            db = SessionLocal()
+            try:
+                rows = (
+                    db.query(RevokedToken.jti, RevokedToken.expires_at)
+                    .filter(RevokedToken.expires_at > now)
+                    .all()
+                )
+                expiry.update(rows)
+            except Exception as e:
+                print(f"同步令牌吊销列表失败: {e}")
+            finally:
+                db.close()
+            self._expiry = expiry
+            self._loaded_at = time.monotonic()
+
+revocation_list = RevocationList(REVOCATION_REFRESH_SECONDS)
 
 # 密码加密上下文
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt 在专用线程池中执行，避免阻塞事件循环；线程数即并发上限
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+# 本地登录频率限制：窗口内每个邮箱、每个IP的失败次数
+LOGIN_WINDOW_SECONDS = float(os.getenv("LOGIN_WINDOW_SECONDS", "300"))
+LOGIN_MAX_FAILURES_PER_EMAIL = int(os.getenv("LOGIN_MAX_FAILURES_PER_EMAIL", "5"))
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "20"))
+
+class LoginRateLimiter:
+    """滑动窗口计数的登录频率限制器
+
+    超限的请求在进入 bcrypt 之前就被拒绝；跟踪的键数量有上限，超出时淘汰最久未活动的键。
+    """
+
+    def __init__(self, window_seconds: float, max_keys: int = 10000):
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._events: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, key: str, now: float) -> Deque[float]:
+        events = self._events.get(key)
+        if events is None:
+            return deque()
+        while events and events[0] <= now - self.window_seconds:
+            events.popleft()
+        return events
+
+    def _append(self, key: str, events: Deque[float], now: float) -> None:
+        events.append(now)
+        self._events[key] = events
+        self._events.move_to_end(key)
+        while len(self._events) > self.max_keys:
+            self._events.popitem(last=False)
+
+    def acquire(self, limits: Dict[str, int]) -> Optional[float]:
+        """各键窗口内次数都未达上限时，在同一把锁内为每个键记录一次并返回记录时间；否则返回 None
+
+        并发请求各自占用一个名额，不会同时通过检查；结果无需计数时用 release 归还。
+        """
+        now = time.monotonic()
+        with self._lock:
+            pruned = {key: self._prune(key, now) for key in limits}
+            if any(len(pruned[key]) >= limit for key, limit in limits.items()):
+                return None
+            for key, events in pruned.items():
+                self._append(key, events, now)
+        return now
+
+    def release(self, key: str, stamp: float) -> None:
+        """归还 acquire 记录的一次事件"""
+        with self._lock:
+            events = self._events.get(key)
+            if events is not None:
+                try:
+                    events.remove(stamp)
+                except ValueError:
+                    pass
+
+    def reset(self, key: str) -> None:
+        """清除某个键的记录"""
+        with self._lock:
+            self._events.pop(key, None)
+
+login_limiter = LoginRateLimiter(LOGIN_WINDOW_SECONDS)
+
 # HTTP Bearer认证
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
@@ -33,6 +254,16 @@ def get_password_hash(password: str) -> str:
     """获取密码哈希"""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """在密码线程池中验证密码，不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """在密码线程池中计算密码哈希，不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """创建访问令牌"""
     to_encode = data.copy()
@@ -42,9 +273,160 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire})
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_user_access_token(user: User, expires_delta: Optional[timedelta] = None) -> str:
+    """为用户签发携带 uid、grp、ver 声明的访问令牌"""
+    return create_access_token(
+        data={
+            "sub": user.email,
+            "uid": user.id,
+            "grp": user.group,
+            "ver": token_versions.get(user.id)
+        },
+        expires_delta=expires_delta
+    )
+
+def _hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def _new_refresh_token(db: Session, user_id: str, family_id: Optional[str] = None,
+                       token_id: Optional[str] = None) -> tuple:
+    """生成刷新令牌并写入会话（由调用方提交），返回 (明文, 记录)"""
+    token = secrets.token_urlsafe(32)
+    record = RefreshToken(
+        id=token_id or uuid.uuid4().hex,
+        user_id=user_id,
+        token_hash=_hash_refresh_token(token),
+        family_id=family_id or uuid.uuid4().hex,
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    db.add(record)
+    return token, record
+
+def _token_response(user: User, refresh_token: str) -> dict:
+    return {
+        "access_token": create_user_access_token(user),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+def issue_token_pair(db: Session, user: User) -> dict:
+    """签发短期访问令牌和刷新令牌（由调用方提交事务）"""
+    refresh_token, _ = _new_refresh_token(db, user.id)
+    return _token_response(user, refresh_token)
+
+def revoke_refresh_tokens(db: Session, user_id: Optional[str] = None, family_id: Optional[str] = None) -> int:
+    """吊销用户或令牌族下所有未吊销的刷新令牌（由调用方提交事务）"""
+    query = db.query(RefreshToken).filter(RefreshToken.revoked_at.is_(None))
+    if user_id:
+        query = query.filter(RefreshToken.user_id == user_id)
+    if family_id:
+        query = query.filter(RefreshToken.family_id == family_id)
+    return query.update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
+def revoke_refresh_token_family(db: Session, refresh_token: str) -> int:
+    """吊销刷新令牌所在的整个令牌族（登出时使用，由调用方提交事务）"""
+    family_id = (
+        db.query(RefreshToken.family_id)
+        .filter(RefreshToken.token_hash == _hash_refresh_token(refresh_token))
+        .scalar()
+    )
+    if family_id is None:
+        return 0
+    return revoke_refresh_tokens(db, family_id=family_id)
+
+def rotate_refresh_token(db: Session, refresh_token: str) -> dict:
+    """用刷新令牌换取新的令牌对，旧刷新令牌立即作废
+
+    已作废的刷新令牌再次出现视为泄露，整个令牌族全部吊销。
+    """
+    record = (
+        db.query(RefreshToken)
+        .filter(RefreshToken.token_hash == _hash_refresh_token(refresh_token))
+        .first()
+    )
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="无效的刷新令牌",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    if record is None or record.expires_at <= datetime.utcnow():
+        raise invalid
+    if record.revoked_at is not None:
+        revoke_refresh_tokens(db, family_id=record.family_id)
+        db.commit()
+        raise invalid
+
+    user = db.get(User, record.user_id)
+    if user is None or not user.is_active:
+        revoke_refresh_tokens(db, family_id=record.family_id)
+        db.commit()
+        raise invalid
+
+    # 以条件更新原子地认领旧令牌：并发的两次刷新只有一次能更新到这一行，
+    # 另一次视为重复使用，吊销整个令牌族
+    new_id = uuid.uuid4().hex
+    claimed = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == record.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow(), replaced_by=new_id)
+    ).rowcount
+    if claimed != 1:
+        db.rollback()
+        revoke_refresh_tokens(db, family_id=record.family_id)
+        db.commit()
+        raise invalid
+
+    new_token, _ = _new_refresh_token(db, user.id, record.family_id, token_id=new_id)
+    db.commit()
+    return _token_response(user, new_token)
+
+def purge_expired_refresh_tokens(db: Session) -> int:
+    """清理已过期的刷新令牌，返回删除数量"""
+    deleted = (
+        db.query(RefreshToken)
+        .filter(RefreshToken.expires_at <= datetime.utcnow())
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+def purge_expired_oauth_states(db: Session) -> int:
+    """清理过期未使用的 OAuth state（OAUTH_STATE_BACKEND=database 时写入），返回删除数量"""
+    deleted = (
+        db.query(OAuthState)
+        .filter(OAuthState.expires_at <= datetime.utcnow())
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+def bump_token_version(db: Session, user_id: str) -> int:
+    """用户组、状态等变更后提升令牌版本，已签发令牌需回退到数据库校验"""
+    return token_versions.bump(db, user_id)
+
+def revoke_token(db: Session, token_data: TokenData) -> bool:
+    """吊销令牌，旧格式（无 jti）令牌无法吊销时返回 False"""
+    if not token_data.jti:
+        return False
+    expires_at = token_data.expires_at or datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    revocation_list.revoke(db, token_data.jti, token_data.user_id, expires_at)
+    return True
+
+def purge_expired_revocations(db: Session) -> int:
+    """清理已过期令牌的吊销记录，返回删除数量"""
+    deleted = (
+        db.query(RevokedToken)
+        .filter(RevokedToken.expires_at <= datetime.utcnow())
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
 def verify_token(token: str) -> TokenData:
     """验证令牌"""
     try:
@@ -56,7 +438,21 @@ def verify_token(token: str) -> TokenData:
                 detail="无效的认证凭据",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        token_data = TokenData(email=email)
+        jti = payload.get("jti")
+        if jti and revocation_list.is_revoked(jti):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="令牌已失效",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        token_data = TokenData(
+            email=email,
+            user_id=payload.get("uid"),
+            group=payload.get("grp"),
+            version=payload.get("ver"),
+            jti=jti,
+            expires_at=datetime.utcfromtimestamp(payload["exp"]) if payload.get("exp") else None
+        )
         return token_data
     except JWTError:
         raise HTTPException(
@@ -67,7 +463,7 @@ def verify_token(token: str) -> TokenData:
 
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     """根据邮箱获取用户"""
-    return db.query(User).filter(User.email == email).first()
+    return db.execute(USER_BY_EMAIL, {"email": email}).scalars().first()
 
 def authenticate_user(db: Session, email: str) -> Optional[User]:
     """模拟OAuth认证用户（在实际实现中，这里会验证OAuth令牌）"""
@@ -85,13 +481,42 @@ def authenticate_user(db: Session, email: str) -> Optional[User]:
         db.refresh(user)
     return user
 
+def invalidate_principal(*emails: Optional[str]) -> None:
+    """用户信息变更后立即清除对应的认证主体缓存"""
+    for email in emails:
+        if email:
+            principal_cache.invalidate(email)
+
+def _load_principal(db: Session, email: str) -> Optional[User]:
+    """获取认证主体，优先使用缓存
+
+    命中缓存时用快照重建一个已脱离会话的 User，再以 merge(load=False) 挂到当前会话，
+    不发出 SELECT；路由对 current_user 的修改和提交照常生效。
+    """
+    snapshot = principal_cache.get(email)
+    if snapshot is not None:
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    user = get_user_by_email(db, email)
+    if user is not None:
+        principal_cache.set(email, {
+            attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs
+        })
+    return user
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
     """获取当前认证用户"""
     token_data = verify_token(credentials.credentials)
-    user = get_user_by_email(db, token_data.email)
+    return _get_verified_user(db, token_data.email)
+
+def _get_verified_user(db: Session, email: str) -> User:
+    """加载认证用户并检查其存在且未被禁用"""
+    user = _load_principal(db, email)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -105,6 +530,23 @@ async def get_current_user(
         )
     return user
 
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """获取当前认证主体（只读接口使用）
+
+    令牌声明的版本与当前令牌版本一致时直接信任声明，不查询数据库；
+    旧格式令牌或版本已提升（用户组变更、禁用等）时回退到数据库校验。
+    """
+    token_data = verify_token(credentials.credentials)
+    if (token_data.user_id and token_data.group
+            and token_data.version == token_versions.get(token_data.user_id)):
+        return Principal(id=token_data.user_id, email=token_data.email, group=token_data.group)
+
+    user = _get_verified_user(db, token_data.email)
+    return Principal(id=user.id, email=user.email, group=user.group)
+
 async def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -126,12 +568,7 @@ def check_user_permissions(user: User, required_group: str = "standard") -> bool
 
 def get_max_extend_hours(user: User) -> int:
     """根据用户组获取最大延长小时数"""
-    extend_limits = {
-        "standard": 4,
-        "premium": 8,
-        "admin": 24
-    }
-    return extend_limits.get(user.group, 4)
+    return get_policy(user.group)["max_extend_hours"]
 
 def require_admin(current_user: User = Depends(get_current_active_user)) -> User:
     """要求管理员权限"""
@@ -152,22 +589,32 @@ def authenticate_local_user(db: Session, email: str, password: str) -> Optional[
         return user
     return None
 
-def create_local_user(db: Session, name: str, email: str, password: str, group: str = "admin") -> User:
-    """创建本地用户（用于管理员账号）"""
-    # 检查用户是否已存在
+async def authenticate_local_user_async(db: Session, email: str, password: str) -> Optional[User]:
+    """认证本地用户，bcrypt 校验在密码线程池中执行"""
+    user = get_user_by_email(db, email)
+    if not user or not user.is_local_account or not user.password_hash:
+        return None
+    
+    if await verify_password_async(password, user.password_hash):
+        return user
+    return None
+
+def _ensure_email_available(db: Session, email: str) -> None:
+    """检查邮箱未被占用"""
     existing_user = get_user_by_email(db, email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="用户邮箱已存在"
         )
-    
-    # 创建新用户
+
+def _insert_local_user(db: Session, name: str, email: str, password_hash: str, group: str) -> User:
+    """写入本地用户记录"""
     user = User(
         id=f"local_{email.split('@')[0]}_{datetime.utcnow().timestamp()}",
         name=name,
         email=email,
-        password_hash=get_password_hash(password),
+        password_hash=password_hash,
         group=group,
         is_local_account=True
     )
@@ -177,14 +624,54 @@ def create_local_user(db: Session, name: str, email: str, password: str, group:
     db.refresh(user)
     return user
 
-def local_login(db: Session, email: str, password: str) -> dict:
-    """本地用户登录"""
-    user = authenticate_local_user(db, email, password)
+def create_local_user(db: Session, name: str, email: str, password: str, group: str = "admin") -> User:
+    """创建本地用户（用于管理员账号）"""
+    # 检查用户是否已存在
+    _ensure_email_available(db, email)
+    
+    # 创建新用户
+    return _insert_local_user(db, name, email, get_password_hash(password), group)
+
+async def create_local_user_async(db: Session, name: str, email: str, password: str, group: str = "admin") -> User:
+    """创建本地用户，密码哈希在密码线程池中计算"""
+    _ensure_email_available(db, email)
+    password_hash = await get_password_hash_async(password)
+    return _insert_local_user(db, name, email, password_hash, group)
+
+async def local_login(db: Session, email: str, password: str, client_ip: Optional[str] = None) -> dict:
+    """本地用户登录
+
+    同一邮箱或同一IP在窗口内的失败次数超限时直接返回 429，不再执行 bcrypt。
+    检查与占用名额在同一把锁内完成，登录成功后归还名额，只有失败才计数：
+    经反向代理时请求可能共用代理IP，正常登录不会把其他管理员挡在外面。
+    """
+    email_key = f"email:{email.lower()}"
+    limits = {email_key: LOGIN_MAX_FAILURES_PER_EMAIL}
+    ip_key = f"ip:{client_ip}" if client_ip else None
+    if ip_key:
+        limits[ip_key] = LOGIN_MAX_FAILURES_PER_IP
+    stamp = login_limiter.acquire(limits)
+    if stamp is None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="登录尝试过于频繁，请稍后再试"
+        )
+
+    try:
+        user = await authenticate_local_user_async(db, email, password)
+    except Exception:
+        # 校验过程出错不计为失败
+        for key in limits:
+            login_limiter.release(key, stamp)
+        raise
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="邮箱或密码错误"
         )
+    login_limiter.reset(email_key)
+    if ip_key:
+        login_limiter.release(ip_key, stamp)
     
     if not user.is_active:
         raise HTTPException(
@@ -192,15 +679,11 @@ def local_login(db: Session, email: str, password: str) -> dict:
             detail="账号已被禁用"
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email},
-        expires_delta=access_token_expires
-    )
+    tokens = issue_token_pair(db, user)
+    db.commit()
     
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **tokens,
         "user": {
             "id": user.id,
             "name": user.name,
@@ -225,15 +708,11 @@ def simulate_oauth_login(email: str, db: Session) -> dict:
             detail="OAuth认证失败"
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email},
-        expires_delta=access_token_expires
-    )
+    tokens = issue_token_pair(db, user)
+    db.commit()
     
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **tokens,
         "user": {
             "id": user.id,
             "name": user.name,
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+按 bookings 表重建小时用量汇总（usage_rollup_hourly）
+
+上线汇总表之前的历史预约、或手工修复预约数据之后，用此脚本重建指定区间。
+
+使用方法:
+    python backfill_rollup.py                                   # 重建全部
+    python backfill_rollup.py --since 2025-01-01 --until 2025-07-01
+"""
+
+import argparse
+import sys
+import os
+from datetime import datetime
+
+# 添加后端目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal, create_tables
+import rollup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按 bookings 表重建小时用量汇总")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="开始时间（UTC，含），默认不限")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="结束时间（UTC，不含），默认不限")
+    args = parser.parse_args()
+
+    if args.since and args.until and args.since >= args.until:
+        print("错误: 开始时间必须早于结束时间")
+        return False
+
+    # 确保数据库表存在
+    create_tables()
+
+    db = SessionLocal()
+    try:
+        count = rollup.backfill(db, args.since, args.until)
+        print(f"✅ 已按 {count} 个已结束的预约重建小时用量汇总")
+        return True
+    except Exception as e:
+        print(f"❌ 重建失败: {str(e)}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
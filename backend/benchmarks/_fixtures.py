@@ -0,0 +1,58 @@
+"""
+基准脚本共用的临时数据库工具
+
+脚本需先把 backend 目录加入 sys.path 再导入本模块。需要应用自身引擎（database.engine）的脚本
+应在导入任何应用模块之前调用 use_temp_database()；只需要独立引擎的脚本使用 create_temp_engine()，
+结束时调用 drop_temp_engine()。
+"""
+
+import os
+import tempfile
+from typing import Tuple
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.engine import Connection, Engine
+
+from models import Base, User
+
+
+def temp_db_path() -> str:
+    """创建一个空的临时 SQLite 文件，返回其路径"""
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    return path
+
+
+def remove_db(path: str) -> None:
+    """删除 SQLite 数据库文件及其 WAL 文件"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def use_temp_database() -> str:
+    """让 database 模块使用新的临时数据库（须在导入 database 之前调用），返回文件路径"""
+    path = temp_db_path()
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    return path
+
+
+def create_temp_engine() -> Tuple[Engine, str]:
+    """创建建好全部表的临时数据库，返回 (引擎, 文件路径)"""
+    path = temp_db_path()
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return engine, path
+
+
+def drop_temp_engine(engine: Engine, path: str) -> None:
+    """释放引擎的连接并删除临时数据库"""
+    engine.dispose()
+    remove_db(path)
+
+
+def seed_users(conn: Connection, count: int = 100) -> None:
+    """写入 user0 … user{count-1}，邮箱为 user{i}@example.com"""
+    conn.execute(insert(User), [
+        {"id": f"user{i}", "name": f"user{i}", "email": f"user{i}@example.com"} for i in range(count)
+    ])
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+认证请求吞吐量基准：有无认证主体缓存
+
+使用临时数据库启动应用，以同一个令牌反复请求 /api/users/me，
+分别在禁用缓存（每次查询 users 表）和启用缓存时测量每秒请求数。
+
+使用方法:
+    python benchmarks/bench_auth_cache.py
+    python benchmarks/bench_auth_cache.py --requests 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _fixtures import remove_db, use_temp_database
+
+_DB_PATH = use_temp_database()
+
+from fastapi.testclient import TestClient
+
+import auth
+from main import app
+
+
+def _measure(client: TestClient, headers: dict, requests: int) -> float:
+    """连续发送请求，返回每秒请求数"""
+    client.get("/api/users/me", headers=headers)  # 预热
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get("/api/users/me", headers=headers)
+        assert response.status_code == 200, response.text
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="认证主体缓存对请求吞吐量的影响")
+    parser.add_argument("--requests", type=int, default=2000, help="每轮请求数")
+    args = parser.parse_args()
+
+    try:
+        with TestClient(app) as client:
+            token = auth.create_access_token({"sub": "admin@example.com"})
+            headers = {"Authorization": f"Bearer {token}"}
+
+            ttl = auth.principal_cache.ttl_seconds or 30
+            auth.principal_cache.ttl_seconds = 0
+            without_cache = _measure(client, headers, args.requests)
+
+            auth.principal_cache.ttl_seconds = ttl
+            auth.principal_cache.clear()
+            with_cache = _measure(client, headers, args.requests)
+    finally:
+        remove_db(_DB_PATH)
+
+    print(f"禁用缓存: {without_cache:8.0f} 请求/秒")
+    print(f"启用缓存: {with_cache:8.0f} 请求/秒")
+    print(f"提升:     {with_cache / without_cache:8.2f}x")
+    print(f"缓存统计: {auth.principal_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+预约主键基准测试：uuid4 文本 vs 时间有序标识符
+
+分别用两种主键向临时 SQLite 数据库批量插入预约，输出插入吞吐量、
+主键与外键索引大小以及数据库文件大小。
+
+使用方法:
+    python benchmarks/bench_booking_ids.py                 # 默认 100 万条
+    python benchmarks/bench_booking_ids.py --rows 200000   # 指定行数
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, text
+
+from _fixtures import create_temp_engine, drop_temp_engine
+from ids import new_id
+from models import Booking, BookingLog, Resource, User
+
+
+def _index_sizes(conn) -> dict:
+    """通过 dbstat 统计各索引占用字节数（SQLite 未编译 dbstat 时返回空）"""
+    try:
+        rows = conn.execute(text(
+            "SELECT name, SUM(pgsize) FROM dbstat "
+            "WHERE name LIKE 'ix_%' OR name LIKE 'sqlite_autoindex_%' GROUP BY name"
+        )).all()
+    except Exception:
+        return {}
+    return {name: size for name, size in rows}
+
+
+def run(label: str, make_id, rows: int, batch_size: int) -> None:
+    """使用给定的主键生成函数执行一轮插入"""
+    engine, path = create_temp_engine()
+
+    base_time = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": "bench", "name": "bench", "email": "bench@example.com"}])
+        conn.execute(insert(Resource), [{"id": "gpu-bench", "name": "bench"}])
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for offset in range(0, rows, batch_size):
+            bookings = []
+            logs = []
+            for i in range(offset, min(offset + batch_size, rows)):
+                booking_id = make_id()
+                start = base_time + timedelta(minutes=i)
+                bookings.append({
+                    "id": booking_id,
+                    "user_id": "bench",
+                    "resource_id": "gpu-bench",
+                    "task_name": "bench",
+                    "start_time": start,
+                    "end_time": start + timedelta(hours=1),
+                    "original_end_time": start + timedelta(hours=1),
+                    "created_at": start,
+                    "updated_at": start,
+                })
+                logs.append({"booking_id": booking_id, "action": "created", "timestamp": start})
+            conn.execute(insert(Booking), bookings)
+            conn.execute(insert(BookingLog), logs)
+    elapsed = time.perf_counter() - started
+
+    with engine.connect() as conn:
+        sizes = _index_sizes(conn)
+    file_size = os.path.getsize(path)
+    drop_temp_engine(engine, path)
+
+    print(f"[{label}] 插入 {rows} 条预约+日志: {elapsed:.2f}s, {rows / elapsed:,.0f} 行/秒")
+    print(f"[{label}] 数据库文件大小: {file_size / 1024 / 1024:.1f} MiB")
+    for name, size in sorted(sizes.items()):
+        print(f"[{label}]   索引 {name}: {size / 1024 / 1024:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预约主键插入性能与索引大小对比")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="插入的预约数量")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="每批插入的行数")
+    args = parser.parse_args()
+
+    run("uuid4", lambda: str(uuid.uuid4()), args.rows, args.batch_size)
+    run("time-ordered", new_id, args.rows, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
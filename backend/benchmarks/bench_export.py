@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+流式导出基准：一次性在内存中拼出整个导出 vs 分批流式导出（export.py）
+
+在临时 SQLite 数据库中写入不同数量的预约，用 tracemalloc 测量两种写法导出 CSV（可选 gzip）时的
+Python 内存峰值与耗时。流式导出的峰值应只与批大小有关，与总行数无关。
+
+使用方法:
+    python benchmarks/bench_export.py
+    python benchmarks/bench_export.py --sizes 10000 50000 200000 --gzip
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _fixtures import remove_db, seed_users, use_temp_database
+
+DB_PATH = use_temp_database()
+
+from sqlalchemy import insert
+
+import export
+from database import SessionLocal, engine
+from ids import new_id
+from models import Base, Booking, Resource
+
+
+def _fill(total: int) -> None:
+    """把预约表补足到 total 行"""
+    with engine.begin() as conn:
+        existing = conn.execute(Booking.__table__.select().with_only_columns(Booking.id)).fetchall()
+        base_time = datetime(2024, 1, 1)
+        rows = []
+        for i in range(len(existing), total):
+            start = base_time + timedelta(minutes=10 * i)
+            rows.append({
+                "id": new_id(),
+                "user_id": f"user{i % 100}",
+                "resource_id": f"gpu-{i % 4}",
+                "task_name": f"训练任务 {i}",
+                "estimated_memory_gb": 2 + i % 7,
+                "start_time": start,
+                "end_time": start + timedelta(hours=2),
+                "original_end_time": start + timedelta(hours=2),
+                "status": "completed",
+            })
+        if rows:
+            conn.execute(insert(Booking), rows)
+
+
+def _in_memory(compress: bool) -> int:
+    """旧写法：取回全部 ORM 实例，拼出完整文件后再返回"""
+    db = SessionLocal()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for booking in db.query(Booking).order_by(Booking.start_time, Booking.id).all():
+            writer.writerow([booking.id, booking.user_id, booking.resource_id, booking.task_name,
+                             booking.estimated_memory_gb, booking.start_time.isoformat(),
+                             booking.end_time.isoformat(), booking.status])
+        data = buffer.getvalue().encode("utf-8")
+        return len(gzip.compress(data) if compress else data)
+    finally:
+        db.close()
+
+
+def _streaming(compress: bool) -> int:
+    return sum(len(chunk) for chunk in export.stream_bookings("csv", compress))
+
+
+def _measure(func, compress: bool):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = func(compress)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 1024 / 1024, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出内存峰值与耗时对比")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 100000], help="预约行数")
+    parser.add_argument("--gzip", action="store_true", help="同时压缩为 gzip")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        seed_users(conn)
+        conn.execute(insert(Resource), [{"id": f"gpu-{i}", "name": f"GPU-{i}"} for i in range(4)])
+
+    try:
+        print(f"{'行数':>8}  {'写法':<6} {'耗时(ms)':>10} {'内存峰值(MB)':>14} {'输出(KB)':>10}")
+        for total in sorted(args.sizes):
+            _fill(total)
+            for label, func in (("内存", _in_memory), ("流式", _streaming)):
+                elapsed, peak, size = _measure(func, args.gzip)
+                print(f"{total:>8}  {label:<6} {elapsed:>10.1f} {peak:>14.2f} {size / 1024:>10.0f}")
+    finally:
+        engine.dispose()
+        remove_db(DB_PATH)
+
+
+if __name__ == "__main__":
+    main()
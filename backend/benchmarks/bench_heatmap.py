@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+容量规划热力图基准：逐预约逐小时的 Python 循环 vs NumPy 差分数组（analytics.reserved_memory_heatmap）
+
+在临时 SQLite 数据库中为多块 GPU 写入跨一年的预约，计算 53 周的“资源 × 一周中的小时”热力图，
+输出两种写法的耗时（均包含查询），并核对两者结果一致。
+
+使用方法:
+    python benchmarks/bench_heatmap.py
+    python benchmarks/bench_heatmap.py --resources 48 --bookings 200000
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from _fixtures import create_temp_engine, drop_temp_engine, seed_users
+from analytics import UTILIZED_STATUSES, reserved_memory_heatmap
+from ids import new_id
+from models import Booking, Resource
+
+
+def _prepare(engine, resources: int, bookings: int):
+    """写入均匀分布在一年内的预约，返回会话工厂和统计区间"""
+    base_time = datetime(2024, 1, 1)
+    step = timedelta(days=366) / bookings
+    with engine.begin() as conn:
+        seed_users(conn)
+        conn.execute(insert(Resource), [
+            {"id": f"gpu-{i:02d}", "name": f"GPU-{i:02d}", "total_memory_gb": 24} for i in range(resources)
+        ])
+        rows = []
+        for i in range(bookings):
+            start = base_time + step * i
+            rows.append({
+                "id": new_id(),
+                "user_id": f"user{i % 100}",
+                "resource_id": f"gpu-{i % resources:02d}",
+                "task_name": "bench",
+                "estimated_memory_gb": 2 + i % 7,
+                "start_time": start,
+                "end_time": start + timedelta(minutes=45 + 37 * (i % 11)),
+                "original_end_time": start + timedelta(minutes=45 + 37 * (i % 11)),
+                "status": "completed" if i % 10 else "cancelled",
+            })
+        conn.execute(insert(Booking), rows)
+    return sessionmaker(bind=engine), base_time + timedelta(weeks=53)
+
+
+def _python_heatmap(db, start_date: datetime, end_date: datetime):
+    """对照写法：取回预约后逐预约、逐小时累加重叠部分，再按一周中的小时平均"""
+    origin = datetime.combine(start_date.date(), datetime.min.time())
+    window_end = datetime.combine(end_date.date(), datetime.min.time())
+    if window_end < end_date:
+        window_end += timedelta(days=1)
+    resources = [row.id for row in db.query(Resource.id).order_by(Resource.name)]
+    bookings = db.query(Booking.resource_id, Booking.start_time, Booking.end_time, Booking.estimated_memory_gb).filter(
+        Booking.is_deleted == False,
+        Booking.status.in_(UTILIZED_STATUSES),
+        Booking.start_time < window_end,
+        Booking.end_time > origin
+    ).all()
+    totals = defaultdict(float)
+    for booking in bookings:
+        cursor = max(booking.start_time, origin)
+        finish = min(booking.end_time, window_end)
+        while cursor < finish:
+            hour = cursor.replace(minute=0, second=0, microsecond=0)
+            segment_end = min(hour + timedelta(hours=1), finish)
+            column = hour.weekday() * 24 + hour.hour
+            totals[(booking.resource_id, column)] += (segment_end - cursor).total_seconds() / 3600 * booking.estimated_memory_gb
+            cursor = segment_end
+    counts = defaultdict(int)
+    hour = origin
+    while hour < window_end:
+        counts[hour.weekday() * 24 + hour.hour] += 1
+        hour += timedelta(hours=1)
+    return [
+        [round(totals[(resource, column)] / counts[column], 2) if counts[column] else 0.0 for column in range(168)]
+        for resource in resources
+    ]
+
+
+def _time(label: str, func, iterations: int):
+    """执行 iterations 次并输出单次平均耗时（毫秒），返回最后一次的结果"""
+    func()  # 预热（含首次导入 NumPy）
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = func()
+    per_call = (time.perf_counter() - started) / iterations * 1000
+    print(f"  {label:<10} {per_call:10.1f} ms/次")
+    return per_call, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="资源热力图计算耗时对比")
+    parser.add_argument("--resources", type=int, default=36, help="GPU 数量")
+    parser.add_argument("--bookings", type=int, default=100000, help="一年内的预约数量")
+    parser.add_argument("--iterations", type=int, default=3, help="每种写法的调用次数")
+    args = parser.parse_args()
+
+    engine, path = create_temp_engine()
+    Session, end_date = _prepare(engine, args.resources, args.bookings)
+    db = Session()
+    start_date = end_date - timedelta(weeks=53)
+
+    print(f"{args.resources} 块 GPU、{args.bookings} 个预约，53 周 × 168 列")
+    python_cost, expected = _time("Python", lambda: _python_heatmap(db, start_date, end_date), args.iterations)
+    numpy_cost, actual = _time("NumPy", lambda: reserved_memory_heatmap(db, start_date, end_date), args.iterations)
+    print(f"  加速比     {python_cost / numpy_cost:10.2f}x")
+    mismatches = sum(
+        abs(a - b) > 0.011 for row_a, row_b in zip(expected, actual["values"]) for a, b in zip(row_a, row_b)
+    )
+    print(f"结果一致: {mismatches == 0}（不一致的单元格 {mismatches} 个）")
+
+    db.close()
+    drop_temp_engine(engine, path)
+
+
+if __name__ == "__main__":
+    main()
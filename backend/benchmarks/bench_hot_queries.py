@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+热点查询微基准：ORM 查询构建 vs 预构建语句（queries.py）
+
+在临时 SQLite 数据库中准备数据，分别以旧写法（每次用 ORM 表达式重新构建、返回完整实例）
+和预构建 Core 语句（只绑定参数、返回轻量 Row）执行三条热点查询，输出每次调用的平均耗时。
+
+使用方法:
+    python benchmarks/bench_hot_queries.py
+    python benchmarks/bench_hot_queries.py --iterations 5000 --bookings 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from _fixtures import create_temp_engine, drop_temp_engine, seed_users
+from ids import new_id
+from models import Booking, Resource, User
+from queries import CALENDAR_BOOKINGS, CONFLICTING_BOOKINGS, USER_BY_EMAIL
+
+
+def _prepare(engine, bookings: int):
+    """写入测试数据，返回会话工厂"""
+    base_time = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        seed_users(conn)
+        conn.execute(insert(Resource), [{"id": f"gpu-{i}", "name": f"GPU-{i}"} for i in range(4)])
+        rows = []
+        for i in range(bookings):
+            start = base_time + timedelta(minutes=30 * i)
+            rows.append({
+                "id": new_id(),
+                "user_id": f"user{i % 100}",
+                "resource_id": f"gpu-{i % 4}",
+                "task_name": "bench",
+                "estimated_memory_gb": 4,
+                "start_time": start,
+                "end_time": start + timedelta(hours=2),
+                "original_end_time": start + timedelta(hours=2),
+                "status": "upcoming",
+            })
+        conn.execute(insert(Booking), rows)
+    return sessionmaker(bind=engine), base_time
+
+
+def _time(label: str, func, iterations: int) -> float:
+    """执行 iterations 次并输出单次平均耗时（微秒）"""
+    func()  # 预热编译缓存
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    per_call = (time.perf_counter() - started) / iterations * 1e6
+    print(f"  {label:<10} {per_call:10.1f} µs/次")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热点查询单次调用开销对比")
+    parser.add_argument("--iterations", type=int, default=2000, help="每种写法的调用次数")
+    parser.add_argument("--bookings", type=int, default=5000, help="测试数据中的预约数量")
+    args = parser.parse_args()
+
+    engine, path = create_temp_engine()
+    Session, base_time = _prepare(engine, args.bookings)
+    db = Session()
+
+    window_start = base_time + timedelta(days=10)
+    window_end = window_start + timedelta(hours=4)
+    week_end = window_start + timedelta(days=7)
+
+    def user_orm():
+        db.query(User).filter(User.email == "user42@example.com").first()
+
+    def user_prebuilt():
+        db.execute(USER_BY_EMAIL, {"email": "user42@example.com"}).scalars().first()
+
+    def conflict_orm():
+        bookings = db.query(Booking).filter(
+            Booking.resource_id == "gpu-1",
+            Booking.is_deleted == False,
+            Booking.status.in_(["upcoming", "active"]),
+            Booking.start_time < window_end,
+            Booking.end_time > window_start
+        ).all()
+        sum(b.estimated_memory_gb for b in bookings)
+
+    def conflict_prebuilt():
+        rows = db.execute(CONFLICTING_BOOKINGS, {
+            "resource_id": "gpu-1",
+            "start_time": window_start,
+            "end_time": window_end,
+            "exclude_booking_id": ""
+        }).all()
+        sum(r.estimated_memory_gb for r in rows)
+
+    def calendar_orm():
+        bookings = db.query(Booking).filter(
+            Booking.is_deleted == False,
+            Booking.start_time < week_end,
+            Booking.end_time > window_start
+        ).all()
+        [b.resource.name for b in bookings]
+
+    def calendar_prebuilt():
+        db.execute(CALENDAR_BOOKINGS, {"start_date": window_start, "end_date": week_end}).all()
+
+    for name, orm_func, prebuilt_func in [
+        ("按邮箱查询用户", user_orm, user_prebuilt),
+        ("显存冲突查询", conflict_orm, conflict_prebuilt),
+        ("日历范围查询", calendar_orm, calendar_prebuilt),
+    ]:
+        print(name)
+        orm_cost = _time("ORM", orm_func, args.iterations)
+        db.expunge_all()
+        prebuilt_cost = _time("预构建", prebuilt_func, args.iterations)
+        db.expunge_all()
+        print(f"  加速比     {orm_cost / prebuilt_cost:10.2f}x")
+
+    db.close()
+    drop_temp_engine(engine, path)
+
+
+if __name__ == "__main__":
+    main()
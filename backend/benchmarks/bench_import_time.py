@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+后端启动导入耗时基准
+
+在全新的子进程中多次执行 `import main`（不设置任何 OAuth 环境变量），
+输出导入耗时的中位数、是否加载了 OAuth 相关依赖，以及 -X importtime 统计中
+main 直接导入的模块里累计耗时最高的几个。
+
+使用方法:
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --runs 10 --top 15
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from _fixtures import remove_db, temp_db_path
+
+# 子进程中测量 import main 的耗时，并报告 OAuth 依赖是否被加载
+_PROBE = """
+import sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(elapsed * 1000, "httpx" in sys.modules, "oauth_service" in sys.modules)
+"""
+
+
+def _clean_env(db_path: str) -> dict:
+    """去掉 OAuth 配置，模拟未启用 OAuth 的部署"""
+    env = {k: v for k, v in os.environ.items() if not k.startswith("OAUTH_")}
+    env["DATABASE_URL"] = f"sqlite:///{db_path}"
+    return env
+
+
+def _probe(env: dict):
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    )
+    elapsed, httpx_loaded, oauth_loaded = result.stdout.split()[-3:]
+    return float(elapsed), httpx_loaded == "True", oauth_loaded == "True"
+
+
+def _top_modules(env: dict, top: int):
+    """解析 -X importtime 输出，返回 main 直接导入的模块中累计耗时最高的几个"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 嵌套层级由名称前的缩进表示（每层两个空格），只统计 main 直接导入的模块
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            modules.append((int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端 import main 的启动耗时")
+    parser.add_argument("--runs", type=int, default=5, help="子进程运行次数")
+    parser.add_argument("--top", type=int, default=10, help="列出的模块数")
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    try:
+        env = _clean_env(db_path)
+        samples = [_probe(env) for _ in range(args.runs)]
+        top_modules = _top_modules(env, args.top)
+    finally:
+        remove_db(db_path)
+
+    timings = [sample[0] for sample in samples]
+    print(f"import main: 中位数 {statistics.median(timings):8.1f} ms  "
+          f"(最小 {min(timings):.1f} / 最大 {max(timings):.1f}, {args.runs} 次)")
+    print(f"已加载 oauth_service: {samples[0][2]}  已加载 httpx: {samples[0][1]}")
+    print("main 直接导入的模块（累计耗时）:")
+    for cumulative, name in top_modules:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
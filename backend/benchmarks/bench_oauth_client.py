@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+OAuth 登录步骤基准：每步新建 HTTP 客户端 vs 共享连接池客户端
+
+在本地启动一个桩 IdP（令牌端点 + 用户信息端点，userinfo 偶发 503），
+分别以旧写法（每次请求新建 httpx.AsyncClient，重新建立 TCP 连接）和
+oauth_service 的共享客户端（keep-alive 连接池 + 退避重试）完成授权码交换与用户信息获取，
+输出每次登录的平均耗时以及重试后的成功率。
+
+使用方法:
+    python benchmarks/bench_oauth_client.py
+    python benchmarks/bench_oauth_client.py --logins 500 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+PORT = _free_port()
+IDP_URL = f"http://127.0.0.1:{PORT}"
+os.environ.update({
+    "OAUTH_CLIENT_ID": "bench-client",
+    "OAUTH_CLIENT_SECRET": "bench-secret",
+    "OAUTH_AUTHORIZATION_URL": f"{IDP_URL}/authorize",
+    "OAUTH_TOKEN_URL": f"{IDP_URL}/token",
+    "OAUTH_USER_INFO_URL": f"{IDP_URL}/userinfo",
+    "OAUTH_HTTP_BACKOFF": "0.01",
+})
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Form, Response
+
+from oauth_service import GenericOAuthService
+
+# 每隔 FLAKY_EVERY 次用户信息请求返回一次 503，模拟 IdP 抖动
+FLAKY_EVERY = 20
+_userinfo_calls = itertools.count(1)
+
+stub_idp = FastAPI()
+
+
+@stub_idp.post("/token")
+async def token(code: str = Form(...)):
+    return {"access_token": f"at-{code}", "token_type": "Bearer", "expires_in": 3600}
+
+
+@stub_idp.get("/userinfo")
+async def userinfo(response: Response):
+    if next(_userinfo_calls) % FLAKY_EVERY == 0:
+        response.status_code = 503
+        return {"error": "temporarily_unavailable"}
+    return {"sub": "42", "email": "bench@example.com", "name": "Bench"}
+
+
+def _start_idp() -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(stub_idp, host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+async def _login_per_request_client(service: GenericOAuthService, code: str) -> None:
+    """旧写法：每个步骤新建客户端"""
+    async with httpx.AsyncClient() as client:
+        response = await client.post(service.config.token_url, data={"code": code})
+        response.raise_for_status()
+        access_token = response.json()["access_token"]
+    async with httpx.AsyncClient() as client:
+        response = await client.get(
+            service.config.user_info_url, headers={"Authorization": f"Bearer {access_token}"}
+        )
+        response.raise_for_status()
+
+
+async def _login_shared_client(service: GenericOAuthService, code: str) -> None:
+    """共享客户端：完整的 complete_oauth_flow"""
+    await service.complete_oauth_flow(code, service.generate_state())
+
+
+async def _measure(login, service: GenericOAuthService, logins: int, concurrency: int):
+    """并发执行登录，返回 (每次登录平均毫秒, 成功数)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    succeeded = 0
+
+    async def one(i: int) -> None:
+        nonlocal succeeded
+        async with semaphore:
+            try:
+                await login(service, f"code{i}")
+                succeeded += 1
+            except Exception:
+                pass
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(logins)))
+    elapsed = time.perf_counter() - started
+    return elapsed / logins * 1000, succeeded
+
+
+async def _run(args) -> None:
+    service = GenericOAuthService()
+    await _login_shared_client(service, "warmup")
+    try:
+        per_request = await _measure(_login_per_request_client, service, args.logins, args.concurrency)
+        shared = await _measure(_login_shared_client, service, args.logins, args.concurrency)
+    finally:
+        await service.aclose()
+
+    print(f"每步新建客户端: {per_request[0]:8.2f} ms/登录  成功 {per_request[1]}/{args.logins}")
+    print(f"共享连接池客户端: {shared[0]:8.2f} ms/登录  成功 {shared[1]}/{args.logins}")
+    print(f"提升:           {per_request[0] / shared[0]:8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OAuth 共享 HTTP 客户端对登录耗时的影响")
+    parser.add_argument("--logins", type=int, default=300, help="每轮登录次数")
+    parser.add_argument("--concurrency", type=int, default=10, help="并发登录数")
+    args = parser.parse_args()
+
+    server = _start_idp()
+    try:
+        asyncio.run(_run(args))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+资源利用率统计基准：逐条取回预约在 Python 中累加 vs 数据库聚合（analytics.py）
+
+在临时 SQLite 数据库中写入跨一年的预约，分别统计单个资源和所有资源一整年的利用率，
+输出两种写法的单次耗时，并核对两者算出的显存时长一致。
+
+使用方法:
+    python benchmarks/bench_resource_stats.py
+    python benchmarks/bench_resource_stats.py --bookings 100000 --iterations 10
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from _fixtures import create_temp_engine, drop_temp_engine, seed_users
+from analytics import UTILIZED_STATUSES, resource_utilization
+from ids import new_id
+from models import Booking, Resource
+
+RESOURCES = 4
+
+
+def _prepare(engine, bookings: int):
+    """写入均匀分布在一年内的预约，返回会话工厂"""
+    base_time = datetime(2024, 1, 1)
+    step = timedelta(days=366) / bookings
+    with engine.begin() as conn:
+        seed_users(conn)
+        conn.execute(insert(Resource), [{"id": f"gpu-{i}", "name": f"GPU-{i}"} for i in range(RESOURCES)])
+        rows = []
+        for i in range(bookings):
+            start = base_time + step * i
+            rows.append({
+                "id": new_id(),
+                "user_id": f"user{i % 100}",
+                "resource_id": f"gpu-{i % RESOURCES}",
+                "task_name": "bench",
+                "estimated_memory_gb": 2 + i % 7,
+                "start_time": start,
+                "end_time": start + timedelta(hours=1 + i % 5),
+                "original_end_time": start + timedelta(hours=1 + i % 5),
+                "status": "completed" if i % 10 else "cancelled",
+            })
+        conn.execute(insert(Booking), rows)
+    return sessionmaker(bind=engine), base_time
+
+
+def _python_stats(db, resource_id: str, start_date: datetime, end_date: datetime) -> float:
+    """旧写法：取回区间内的全部预约，逐条裁剪后累加显存时长"""
+    bookings = db.query(Booking).filter(
+        Booking.resource_id == resource_id,
+        Booking.is_deleted == False,
+        Booking.status.in_(UTILIZED_STATUSES),
+        Booking.start_time < end_date,
+        Booking.end_time > start_date
+    ).all()
+    gb_hours = 0.0
+    for booking in bookings:
+        begin = max(booking.start_time, start_date)
+        finish = min(booking.end_time, end_date)
+        gb_hours += (finish - begin).total_seconds() / 3600 * booking.estimated_memory_gb
+    return gb_hours
+
+
+def _time(label: str, func, iterations: int) -> float:
+    """执行 iterations 次并输出单次平均耗时（毫秒）"""
+    func()  # 预热
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    per_call = (time.perf_counter() - started) / iterations * 1000
+    print(f"  {label:<10} {per_call:10.2f} ms/次")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description="资源利用率统计耗时对比")
+    parser.add_argument("--bookings", type=int, default=50000, help="一年内的预约数量")
+    parser.add_argument("--iterations", type=int, default=5, help="每种写法的调用次数")
+    args = parser.parse_args()
+
+    engine, path = create_temp_engine()
+    Session, base_time = _prepare(engine, args.bookings)
+    db = Session()
+    start_date, end_date = base_time, base_time + timedelta(days=366)
+
+    python_total = _python_stats(db, "gpu-1", start_date, end_date)
+    sql_total = resource_utilization(db, start_date, end_date, "gpu-1")[0]["gb_hours_used"]
+    print(f"gpu-1 全年显存时长: Python {python_total:.2f} / SQL {sql_total:.2f} GB·小时")
+
+    print("单个资源全年统计")
+    python_cost = _time("Python", lambda: _python_stats(db, "gpu-1", start_date, end_date), args.iterations)
+    db.expunge_all()
+    sql_cost = _time("SQL 聚合", lambda: resource_utilization(db, start_date, end_date, "gpu-1"), args.iterations)
+    print(f"  加速比     {python_cost / sql_cost:10.2f}x")
+
+    print("所有资源全年统计")
+    python_cost = _time("Python", lambda: [
+        _python_stats(db, f"gpu-{i}", start_date, end_date) for i in range(RESOURCES)
+    ], args.iterations)
+    db.expunge_all()
+    sql_cost = _time("SQL 聚合", lambda: resource_utilization(db, start_date, end_date), args.iterations)
+    print(f"  加速比     {python_cost / sql_cost:10.2f}x")
+
+    db.close()
+    drop_temp_engine(engine, path)
+
+
+if __name__ == "__main__":
+    main()
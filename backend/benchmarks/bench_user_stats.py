@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+用户统计基准：取回全部预约在 Python 中计算 vs 数据库一次聚合（UserService.get_user_stats）
+
+在临时 SQLite 数据库中为一个重度用户写入大量预约，输出两种写法的单次耗时并核对结果一致。
+
+使用方法:
+    python benchmarks/bench_user_stats.py
+    python benchmarks/bench_user_stats.py --bookings 20000 --iterations 50
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from _fixtures import create_temp_engine, drop_temp_engine
+from ids import new_id
+from models import Booking, Resource, User
+from services import UserService
+
+STATUSES = ("completed", "completed", "completed", "cancelled", "active", "upcoming")
+
+
+def _prepare(engine, bookings: int):
+    """为 heavy 用户写入预约，返回会话工厂"""
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": "heavy", "name": "heavy", "email": "heavy@example.com"},
+            {"id": "other", "name": "other", "email": "other@example.com"},
+        ])
+        conn.execute(insert(Resource), [{"id": "gpu-0", "name": "GPU-0"}])
+        rows = []
+        for i in range(bookings):
+            start = now - timedelta(hours=2 * (bookings - i))
+            rows.append({
+                "id": new_id(),
+                "user_id": "heavy" if i % 5 else "other",
+                "resource_id": "gpu-0",
+                "task_name": "bench",
+                "estimated_memory_gb": 4,
+                "start_time": start,
+                "end_time": start + timedelta(hours=1 + i % 3),
+                "original_end_time": start + timedelta(hours=1 + i % 3),
+                "status": STATUSES[i % len(STATUSES)],
+            })
+        conn.execute(insert(Booking), rows)
+    return sessionmaker(bind=engine)
+
+
+def _python_stats(db, user_id: str) -> dict:
+    """旧写法：取回用户全部预约后在 Python 中计数和累加"""
+    bookings = db.query(Booking).filter(Booking.user_id == user_id, Booking.is_deleted == False).all()
+    now = datetime.utcnow()
+    total_hours = used_hours = 0.0
+    for booking in bookings:
+        duration = (booking.end_time - booking.start_time).total_seconds() / 3600
+        total_hours += duration
+        if booking.status == "completed":
+            used_hours += duration
+        elif booking.status == "active" and booking.start_time <= now:
+            used_hours += (min(now, booking.end_time) - booking.start_time).total_seconds() / 3600
+    return {
+        "total_bookings": len(bookings),
+        "active_bookings": len([b for b in bookings if b.status == "active"]),
+        "upcoming_bookings": len([b for b in bookings if b.status == "upcoming"]),
+        "completed_bookings": len([b for b in bookings if b.status == "completed"]),
+        "total_hours": total_hours,
+        "used_hours": used_hours,
+    }
+
+
+def _time(label: str, func, iterations: int) -> float:
+    """执行 iterations 次并输出单次平均耗时（毫秒）"""
+    func()  # 预热
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    per_call = (time.perf_counter() - started) / iterations * 1000
+    print(f"  {label:<10} {per_call:10.2f} ms/次")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用户统计耗时对比")
+    parser.add_argument("--bookings", type=int, default=10000, help="预约总数（其中 80% 属于重度用户）")
+    parser.add_argument("--iterations", type=int, default=20, help="每种写法的调用次数")
+    args = parser.parse_args()
+
+    engine, path = create_temp_engine()
+    Session = _prepare(engine, args.bookings)
+    db = Session()
+    service = UserService(db)
+
+    expected, actual = _python_stats(db, "heavy"), service.get_user_stats("heavy")
+    # 接口返回的小时数保留两位小数
+    print("结果一致:", all(abs(expected[key] - actual[key]) < 0.01 for key in expected))
+
+    print("重度用户统计")
+    python_cost = _time("Python", lambda: _python_stats(db, "heavy"), args.iterations)
+    db.expunge_all()
+    sql_cost = _time("SQL 聚合", lambda: service.get_user_stats("heavy"), args.iterations)
+    print(f"  加速比     {python_cost / sql_cost:10.2f}x")
+
+    db.close()
+    drop_temp_engine(engine, path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc, inspect, text
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from models import Base
+import metrics
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,18 +12,88 @@ load_dotenv()
 # 数据库配置
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./openbook.db")
 
-# 创建数据库引擎
+
+class InstrumentedQueuePool(QueuePool):
+    """记录取得连接的等待时间与超时次数的连接池"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            metrics.DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+
+# 创建数据库引擎（内存 SQLite 保留默认的单线程连接池）
+engine_options = {} if ":memory:" in DATABASE_URL else {"poolclass": InstrumentedQueuePool}
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
+    **engine_options
 )
 
+
+@event.listens_for(engine, "checkout")
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    metrics.DB_POOL_CHECKOUTS.inc()
+
+
+def _collect_pool_metrics():
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        metrics.DB_POOL_SIZE.set(pool.size())
+        metrics.DB_POOL_CHECKED_OUT.set(pool.checkedout())
+
+
+metrics.register_collector(_collect_pool_metrics)
+
+# SQLite 使用 WAL 日志模式：长时间的只读查询（如流式导出）不会阻塞预约写入
+if DATABASE_URL.startswith("sqlite") and ":memory:" not in DATABASE_URL:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # 创建数据库表
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    # create_all 不会为已存在的表补建索引，这里逐个检查补齐
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+# 为已存在的表补充新增的列（仅支持可为空的新增列）
+def _add_missing_columns():
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+                added.append(f"{table.name}.{column.name}")
+
+        # 旧的预约日志补齐冗余的用户与资源字段
+        if "booking_logs.user_id" in added:
+            conn.execute(text(
+                "UPDATE booking_logs SET "
+                "user_id = (SELECT user_id FROM bookings WHERE bookings.id = booking_logs.booking_id), "
+                "resource_id = (SELECT resource_id FROM bookings WHERE bookings.id = booking_logs.booking_id)"
+            ))
+
+    if added:
+        print(f"数据库结构已更新，新增列: {', '.join(added)}")
 
 # 获取数据库会话
 def get_db():
@@ -0,0 +1,185 @@
+"""
+预约与预约日志的流式导出
+
+查询通过 yield_per 以数据库游标分批取行，每批格式化为 CSV 或 JSONL 后立即交给 StreamingResponse，
+可选地用 zlib 流式压缩为 gzip。任何时刻内存中只有一批行，与导出的总行数无关。
+
+生成器在响应开始发送后才执行，请求的数据库会话此时可能已关闭，因此导出使用独立的会话，
+在生成器结束（包括客户端中途断开）时关闭。
+"""
+
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+from database import SessionLocal
+from models import Booking, BookingLog, User
+from services import _to_naive_utc
+
+load_dotenv()
+
+# 每批从数据库游标取出的行数
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+BOOKING_COLUMNS = [
+    Booking.id, Booking.user_id, User.email.label("user_email"), User.group.label("user_group"),
+    Booking.resource_id, Booking.task_name, Booking.estimated_memory_gb, Booking.start_time,
+    Booking.end_time, Booking.original_end_time, Booking.status, Booking.is_deleted,
+    Booking.created_at, Booking.updated_at,
+]
+
+LOG_COLUMNS = [
+    BookingLog.id, BookingLog.booking_id, BookingLog.action, BookingLog.details, BookingLog.data,
+    BookingLog.user_id, BookingLog.resource_id, BookingLog.actor_id, BookingLog.timestamp,
+]
+
+
+def _booking_query(db, start_time: Optional[datetime], end_time: Optional[datetime],
+                   resource_id: Optional[str], user_id: Optional[str], status: Optional[str],
+                   include_deleted: bool):
+    """开始时间落在 [start_time, end_time) 内的预约，按开始时间排序"""
+    query = db.query(*BOOKING_COLUMNS).outerjoin(User, User.id == Booking.user_id)
+    if start_time:
+        query = query.filter(Booking.start_time >= start_time)
+    if end_time:
+        query = query.filter(Booking.start_time < end_time)
+    if resource_id:
+        query = query.filter(Booking.resource_id == resource_id)
+    if user_id:
+        query = query.filter(Booking.user_id == user_id)
+    if status:
+        query = query.filter(Booking.status == status)
+    if not include_deleted:
+        query = query.filter(Booking.is_deleted == False)
+    return query.order_by(Booking.start_time, Booking.id)
+
+
+def _log_query(db, start_time: Optional[datetime], end_time: Optional[datetime],
+               resource_id: Optional[str], user_id: Optional[str], action: Optional[str],
+               booking_id: Optional[str]):
+    """时间戳落在 [start_time, end_time) 内的日志，按时间排序"""
+    query = db.query(*LOG_COLUMNS)
+    if start_time:
+        query = query.filter(BookingLog.timestamp >= start_time)
+    if end_time:
+        query = query.filter(BookingLog.timestamp < end_time)
+    if resource_id:
+        query = query.filter(BookingLog.resource_id == resource_id)
+    if user_id:
+        query = query.filter(BookingLog.user_id == user_id)
+    if action:
+        query = query.filter(BookingLog.action == action)
+    if booking_id:
+        query = query.filter(BookingLog.booking_id == booking_id)
+    return query.order_by(BookingLog.timestamp, BookingLog.id)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    return value
+
+
+def _format_batch(rows: List, fields: List[str], fmt: str) -> str:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        return buffer.getvalue()
+    return "".join(
+        json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=_json_default) + "\n"
+        for row in rows
+    )
+
+
+def _stream(build_query, fmt: str, compress: bool, batch_size: int) -> Iterator[bytes]:
+    """在独立会话中分批取行并格式化（可选 gzip 压缩）"""
+    db = SessionLocal()
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 输出 gzip 格式
+
+    def emit(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    try:
+        query = build_query(db)
+        fields = [column["name"] for column in query.column_descriptions]
+        if fmt == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(fields)
+            yield emit(buffer.getvalue())
+
+        batch = []
+        for row in query.yield_per(batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                chunk = emit(_format_batch(batch, fields, fmt))
+                batch.clear()
+                if chunk:
+                    yield chunk
+        if batch:
+            chunk = emit(_format_batch(batch, fields, fmt))
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        db.close()
+
+
+def _check_format(fmt: str) -> None:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+
+def stream_bookings(fmt: str = "csv", compress: bool = False, start_time: Optional[datetime] = None,
+                    end_time: Optional[datetime] = None, resource_id: Optional[str] = None,
+                    user_id: Optional[str] = None, status: Optional[str] = None,
+                    include_deleted: bool = False, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """流式导出预约"""
+    _check_format(fmt)
+    start_time, end_time = _to_naive_utc(start_time), _to_naive_utc(end_time)
+    return _stream(
+        lambda db: _booking_query(db, start_time, end_time, resource_id, user_id, status, include_deleted),
+        fmt, compress, batch_size
+    )
+
+
+def stream_logs(fmt: str = "csv", compress: bool = False, start_time: Optional[datetime] = None,
+                end_time: Optional[datetime] = None, resource_id: Optional[str] = None,
+                user_id: Optional[str] = None, action: Optional[str] = None,
+                booking_id: Optional[str] = None, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """流式导出预约日志"""
+    _check_format(fmt)
+    start_time, end_time = _to_naive_utc(start_time), _to_naive_utc(end_time)
+    return _stream(
+        lambda db: _log_query(db, start_time, end_time, resource_id, user_id, action, booking_id),
+        fmt, compress, batch_size
+    )
+
+
+def export_filename(kind: str, fmt: str, compress: bool) -> str:
+    return f"{kind}_{datetime.utcnow():%Y%m%d%H%M%S}.{fmt}" + (".gz" if compress else "")
+
+
+def media_type(fmt: str, compress: bool) -> str:
+    return "application/gzip" if compress else EXPORT_FORMATS[fmt]
@@ -0,0 +1,194 @@
+"""
+GPU 需求预测（离线任务）
+
+按资源型号（资源名称去掉末尾编号，如 RTX-4090D-1 -> RTX-4090D）汇总最近若干整周的逐小时需求：
+已满足的需求来自小时汇总表 usage_rollup_hourly，未满足的需求来自因显存不足被拒绝的预约请求
+（admission_rejections，按请求的显存和时段计入；被拒后改约成功的请求会重复计入，结果偏保守）。
+
+对每个型号：
+- 周均需求做线性拟合得到趋势，去趋势后按一周中的小时取平均得到季节基线；
+- 未来各周的预测 = 趋势外推 + 季节基线；
+- 把历史各周的残差叠加到预测上作为需求样本，估算增加 0..N 张卡后超出总显存的需求占比（预期拒绝率）。
+  按型号内的总显存估算，不考虑单卡装箱。
+
+全部计算为 NumPy 向量运算；结果写入 demand_forecast_reports，由管理员报表接口返回最新一份。
+"""
+
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.orm import Session
+
+from analytics import bin_intervals, hours_between
+from models import AdmissionRejection, DemandForecastReport, Resource, UsageRollupHourly
+
+DEFAULT_HISTORY_WEEKS = 12
+DEFAULT_HORIZON_WEEKS = 4
+DEFAULT_MAX_EXTRA_CARDS = 4
+
+HOURS_PER_WEEK = 168
+
+
+def resource_class(name: str) -> str:
+    """资源型号：去掉名称末尾以分隔符连接的编号"""
+    return re.sub(r"[-_ #]\d+$", "", name or "") or name
+
+
+def _week_start(now: datetime) -> datetime:
+    """now 所在周的周一 0 点"""
+    return datetime.combine(now.date() - timedelta(days=now.weekday()), datetime.min.time())
+
+
+def build_report(db: Session, now: Optional[datetime] = None, history_weeks: int = DEFAULT_HISTORY_WEEKS,
+                 horizon_weeks: int = DEFAULT_HORIZON_WEEKS,
+                 max_extra_cards: int = DEFAULT_MAX_EXTRA_CARDS) -> dict:
+    """根据最近 history_weeks 个整周的数据生成需求预测报告"""
+    import numpy as np
+
+    if history_weeks < 2:
+        raise ValueError("至少需要 2 周历史数据才能拟合趋势")
+
+    history_end = _week_start(now or datetime.utcnow())
+    history_start = history_end - timedelta(weeks=history_weeks)
+    hours = history_weeks * HOURS_PER_WEEK
+
+    resources = db.query(Resource.id, Resource.name, Resource.total_memory_gb, Resource.is_active) \
+        .order_by(Resource.name).all()
+    classes = sorted({resource_class(row.name) for row in resources})
+    class_index = {name: i for i, name in enumerate(classes)}
+    class_of_resource = {row.id: class_index[resource_class(row.name)] for row in resources}
+    n_classes = len(classes)
+    origin = literal(history_start, UsageRollupHourly.hour.type)
+
+    # 已满足的需求：小时汇总表中每行就是某小时的 GB·小时，直接散点累加
+    served = np.zeros((n_classes, hours))
+    rows = db.connection().execute(
+        select(
+            UsageRollupHourly.resource_id,
+            hours_between(db, origin, UsageRollupHourly.hour),
+            func.sum(UsageRollupHourly.gb_hours)
+        )
+        .where(UsageRollupHourly.hour >= history_start, UsageRollupHourly.hour < history_end)
+        .group_by(UsageRollupHourly.resource_id, UsageRollupHourly.hour)
+    ).all()
+    rows = [row for row in rows if row[0] in class_of_resource]
+    if rows and n_classes:
+        resource_ids, offsets, gb_hours = zip(*rows)
+        c = np.fromiter((class_of_resource[rid] for rid in resource_ids), dtype=np.int64, count=len(rows))
+        flat = c * hours + np.rint(np.asarray(offsets, dtype=float)).astype(np.int64)
+        served = np.bincount(flat, weights=gb_hours, minlength=n_classes * hours).reshape(n_classes, hours)
+
+    # 未满足的需求：被拒绝的请求按时段和显存展开到小时
+    rejected = np.zeros((n_classes, hours))
+    rejection_counts = np.zeros(n_classes, dtype=np.int64)
+    rows = db.connection().execute(
+        select(
+            AdmissionRejection.resource_id,
+            hours_between(db, origin, AdmissionRejection.start_time),
+            hours_between(db, origin, AdmissionRejection.end_time),
+            AdmissionRejection.requested_memory_gb
+        )
+        .where(AdmissionRejection.start_time < history_end, AdmissionRejection.end_time > history_start)
+    ).all()
+    rows = [row for row in rows if row[0] in class_of_resource]
+    if rows and n_classes:
+        resource_ids, starts, ends, memory = zip(*rows)
+        c = np.fromiter((class_of_resource[rid] for rid in resource_ids), dtype=np.int64, count=len(rows))
+        rejected = bin_intervals(c, starts, ends, memory, n_classes, hours)
+        rejection_counts = np.bincount(c, minlength=n_classes)
+
+    # 需求（GB，每小时平均）按 型号 × 周 × 一周中的小时 排列；history_start 为周一 0 点
+    demand = (served + rejected).reshape(n_classes, history_weeks, HOURS_PER_WEEK)
+    weeks = np.arange(history_weeks)
+    weekly_mean = demand.mean(axis=2)
+    slope, intercept = np.polyfit(weeks, weekly_mean.T, 1) if n_classes else (np.zeros(0), np.zeros(0))
+    trend = slope[:, None] * weeks + intercept[:, None]
+    detrended = demand - trend[:, :, None]
+    season = detrended.mean(axis=1)
+    residuals = detrended - season[:, None, :]
+
+    future = np.arange(history_weeks, history_weeks + horizon_weeks)
+    forecast = np.clip(
+        (slope[:, None] * future + intercept[:, None])[:, :, None] + season[:, None, :], 0, None
+    )
+
+    # 需求样本：预测 + 历史残差，形状 (型号, 预测周, 历史周, 小时)
+    samples = np.clip(forecast[:, :, None, :] + residuals[:, None, :, :], 0, None)
+    capacity = np.zeros(n_classes)
+    card_memory = np.zeros(n_classes)
+    for row in resources:
+        if row.is_active:
+            i = class_of_resource[row.id]
+            capacity[i] += row.total_memory_gb or 0
+            card_memory[i] = max(card_memory[i], row.total_memory_gb or 0)
+    extra = np.arange(max_extra_cards + 1)
+    capacities = capacity[:, None] + card_memory[:, None] * extra  # (型号, 方案)
+    overflow = np.clip(samples[..., None] - capacities[:, None, None, None, :], 0, None).sum(axis=(1, 2, 3))
+    total = samples.sum(axis=(1, 2, 3))
+    rejection_rates = np.divide(overflow, total[:, None], out=np.zeros_like(overflow), where=total[:, None] > 0)
+
+    report_classes = []
+    for name, i in class_index.items():
+        report_classes.append({
+            "resource_class": name,
+            "resources": [row.id for row in resources if class_of_resource[row.id] == i and row.is_active],
+            "capacity_gb": int(capacity[i]),
+            "card_memory_gb": int(card_memory[i]),
+            "mean_demand_gb": round(float(demand[i].mean()), 2),
+            "trend_gb_per_week": round(float(slope[i]), 3),
+            "served_gb_hours": round(float(served[i].sum()), 2),
+            "rejected_gb_hours": round(float(rejected[i].sum()), 2),
+            "rejections": int(rejection_counts[i]),
+            "baseline": np.round(demand[i].mean(axis=0), 2).tolist(),
+            "forecast": [
+                {
+                    "week_start": (history_end + timedelta(weeks=k)).isoformat(),
+                    "mean_demand_gb": round(float(forecast[i, k].mean()), 2),
+                    "peak_demand_gb": round(float(forecast[i, k].max()), 2)
+                }
+                for k in range(horizon_weeks)
+            ],
+            "scenarios": [
+                {
+                    "extra_cards": int(n),
+                    "capacity_gb": int(capacities[i, n]),
+                    "expected_rejection_rate": round(float(rejection_rates[i, n]), 4)
+                }
+                for n in extra
+            ]
+        })
+
+    return {
+        "history_start": history_start.isoformat(),
+        "history_end": history_end.isoformat(),
+        "history_weeks": history_weeks,
+        "horizon_weeks": horizon_weeks,
+        "classes": report_classes
+    }
+
+
+def run(db: Session, now: Optional[datetime] = None, history_weeks: int = DEFAULT_HISTORY_WEEKS,
+        horizon_weeks: int = DEFAULT_HORIZON_WEEKS,
+        max_extra_cards: int = DEFAULT_MAX_EXTRA_CARDS) -> DemandForecastReport:
+    """生成并保存一份需求预测报告"""
+    params = {
+        "history_weeks": history_weeks,
+        "horizon_weeks": horizon_weeks,
+        "max_extra_cards": max_extra_cards
+    }
+    record = DemandForecastReport(
+        generated_at=datetime.utcnow(),
+        params=params,
+        report=build_report(db, now, **params)
+    )
+    db.add(record)
+    db.commit()
+    db.refresh(record)
+    return record
+
+
+def latest(db: Session) -> Optional[DemandForecastReport]:
+    """最新一份需求预测报告"""
+    return db.query(DemandForecastReport).order_by(DemandForecastReport.generated_at.desc()).first()
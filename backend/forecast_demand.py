@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+GPU 需求预测离线任务
+
+根据小时用量汇总和被拒绝的预约请求，生成各资源型号的需求预测与扩容方案的预期拒绝率，
+保存后可通过 GET /api/admin/analytics/forecast 查看。建议每周运行一次（如 cron）。
+
+使用方法:
+    python forecast_demand.py
+    python forecast_demand.py --history-weeks 26 --horizon-weeks 8 --max-extra-cards 6
+"""
+
+import argparse
+import sys
+import os
+
+# 添加后端目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal, create_tables
+import forecast
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成 GPU 需求预测报告")
+    parser.add_argument("--history-weeks", type=int, default=forecast.DEFAULT_HISTORY_WEEKS, help="使用最近几个整周的历史")
+    parser.add_argument("--horizon-weeks", type=int, default=forecast.DEFAULT_HORIZON_WEEKS, help="预测未来几周")
+    parser.add_argument("--max-extra-cards", type=int, default=forecast.DEFAULT_MAX_EXTRA_CARDS, help="评估最多增加几张卡")
+    args = parser.parse_args()
+
+    # 确保数据库表存在
+    create_tables()
+
+    db = SessionLocal()
+    try:
+        record = forecast.run(db, history_weeks=args.history_weeks, horizon_weeks=args.horizon_weeks,
+                              max_extra_cards=args.max_extra_cards)
+        print(f"✅ 需求预测已生成（{record.generated_at}）")
+        for item in record.report["classes"]:
+            rates = ", ".join(
+                f"+{s['extra_cards']}: {s['expected_rejection_rate']:.1%}" for s in item["scenarios"]
+            )
+            print(f"  {item['resource_class']}: 平均需求 {item['mean_demand_gb']}GB / 总显存 {item['capacity_gb']}GB，"
+                  f"趋势 {item['trend_gb_per_week']:+}GB/周，预期拒绝率 {rates}")
+        return True
+    except Exception as e:
+        print(f"❌ 生成失败: {str(e)}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,56 @@
+"""
+时间有序的紧凑标识符
+
+生成 ULID 风格的 26 位 Crockford Base32 字符串：前 48 位为毫秒时间戳，后 80 位为随机数。
+字典序即时间序，新记录总是追加在 B-tree 索引末尾；比 36 位的 uuid4 文本更短，
+且与旧的 uuid4 主键存放在同一 String 列中，历史数据无需迁移。
+"""
+
+import os
+import threading
+import time
+
+# Crockford Base32 字母表（去掉 I L O U，字典序与数值序一致）
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+_RANDOM_BITS = 80
+_RANDOM_MAX = (1 << _RANDOM_BITS) - 1
+
+_lock = threading.Lock()
+_last_ms = -1
+_last_random = 0
+
+
+def _encode(value: int) -> str:
+    """将 128 位整数编码为 26 位 Base32 字符串"""
+    chars = []
+    for _ in range(26):
+        chars.append(_ALPHABET[value & 0x1F])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_id() -> str:
+    """生成新的时间有序标识符
+
+    同一毫秒内生成的多个标识符在随机部分上递增，保证单进程内严格单调。
+    """
+    global _last_ms, _last_random
+
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms <= _last_ms:
+            # 同一毫秒（或时钟回拨）：沿用上一个时间戳并递增随机部分
+            now_ms = _last_ms
+            random_part = _last_random + 1
+            if random_part > _RANDOM_MAX:
+                now_ms += 1
+                random_part = int.from_bytes(os.urandom(10), "big")
+        else:
+            random_part = int.from_bytes(os.urandom(10), "big")
+
+        _last_ms = now_ms
+        _last_random = random_part
+
+    return _encode((now_ms << _RANDOM_BITS) | random_part)
+
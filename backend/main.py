@@ -1,14 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 import os
+import sys
 import asyncio
+import time
 from contextlib import asynccontextmanager
 
 from database import create_tables, init_db, SessionLocal
 from routers import auth, bookings, resources, users, admin
-from services import BookingService
+from services import BookingService, ResourceService
+from audit import audit_writer
+from policy import rebuild_counters
+import quota
+import metrics
+from auth import purge_expired_revocations, purge_expired_refresh_tokens, purge_expired_oauth_states
 
 # 后台任务标志
 background_tasks_active = True
@@ -18,19 +25,29 @@ async def status_update_task():
     global background_tasks_active
     
     while background_tasks_active:
+        db = SessionLocal()
         try:
-            db = SessionLocal()
             booking_service = BookingService(db)
+            started = time.perf_counter()
             updated_count = booking_service.update_booking_statuses()
+            metrics.STATUS_UPDATE_DURATION.observe(time.perf_counter() - started)
             
             if updated_count and updated_count > 0:
                 print(f"[后台任务] 自动更新了 {updated_count} 个预约状态")
             
-            db.close()
+            # 清理已过期令牌的吊销记录、刷新令牌、OAuth state 和滑出窗口的配额日桶
+            purge_expired_revocations(db)
+            purge_expired_refresh_tokens(db)
+            purge_expired_oauth_states(db)
+            quota.purge_expired(db)
             
         except Exception as e:
+            metrics.BACKGROUND_TASK_FAILURES.inc()
             print(f"[后台任务] 状态更新失败: {e}")
             # 不打印完整错误堆栈，避免日志过多
+        finally:
+            # 任一步骤失败也要归还连接
+            db.close()
         
         # 每分钟检查一次
         await asyncio.sleep(60)
@@ -42,6 +59,17 @@ async def lifespan(app: FastAPI):
     create_tables()
     init_db()
     
+    # 按预约表重建用户预约计数器与配额日桶（策略准入使用）
+    db = SessionLocal()
+    try:
+        rebuild_counters(db)
+        quota.rebuild(db)
+    finally:
+        db.close()
+    
+    # 启动异步审计写入（AUDIT_ASYNC=true 时）
+    audit_writer.start(SessionLocal)
+    
     # 启动后台任务
     task = asyncio.create_task(status_update_task())
     print("后台状态更新任务已启动")
@@ -56,6 +84,10 @@ async def lifespan(app: FastAPI):
         await task
     except asyncio.CancelledError:
         pass
+    audit_writer.stop()
+    # 只有 OAuth 模块已被加载时才需要关闭其 HTTP 客户端，避免关闭时才去导入
+    if "oauth_service" in sys.modules:
+        await sys.modules["oauth_service"].close_oauth_service()
     print("后台任务已关闭")
 
 # 创建FastAPI应用实例
@@ -75,8 +107,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # 预约列表的分页游标
 )
 
+# 请求延迟与错误指标（最外层，计入其余中间件的耗时）
+app.add_middleware(metrics.MetricsMiddleware)
+
 # 注册路由
 app.include_router(auth.router, prefix="/api")
 app.include_router(bookings.router, prefix="/api")
@@ -108,6 +144,34 @@ async def health_check():
         "message": "OpenBook API 运行正常"
     }
 
+def _collect_resource_memory():
+    """抓取时按当前时刻填充各资源的显存指标"""
+    db = SessionLocal()
+    try:
+        usage = ResourceService(db).get_current_memory_usage()
+    finally:
+        db.close()
+    for gauge, field in ((metrics.RESOURCE_TOTAL_GB, "total_memory_gb"),
+                         (metrics.RESOURCE_RESERVED_GB, "reserved_memory_gb"),
+                         (metrics.RESOURCE_FREE_GB, "free_memory_gb")):
+        gauge.replace({(row["resource_id"], row["resource_name"]): row[field] for row in usage})
+
+
+metrics.register_collector(_collect_resource_memory)
+
+@app.get("/metrics", summary="Prometheus 指标", include_in_schema=False)
+def prometheus_metrics(request: Request):
+    """Prometheus 抓取端点，需携带 METRICS_TOKEN 作为 Bearer 令牌；未配置令牌时端点关闭"""
+    if not metrics.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not metrics.check_token(request.headers.get("Authorization")):
+        raise HTTPException(
+            status_code=401,
+            detail="无效的指标访问令牌",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """HTTP异常处理器"""
@@ -0,0 +1,278 @@
+"""
+Prometheus 指标（文本格式 0.0.4，不依赖 prometheus_client）
+
+指标在进程内以字典累加，记录一次只是加锁后的几次加法，可在生产环境常开。
+请求延迟按路由模板（如 /api/bookings/{booking_id}）而不是实际路径分组，未匹配的路径统一记为 unmatched，
+避免标签数量随 URL 增长。数据库连接池、各资源当前显存等需要现查的指标由采集函数在 /metrics 被抓取时填充。
+
+多 worker 部署时每个进程各自计数，需由 Prometheus 按实例分别抓取。
+/metrics 需携带 METRICS_TOKEN 作为 Bearer 令牌；未配置 METRICS_TOKEN 时端点关闭。
+"""
+
+import os
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 抓取 /metrics 所需的 Bearer 令牌，为空时端点关闭
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 请求延迟的桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List["_Metric"] = []
+_collectors: List[Callable[[], None]] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+        return tuple(labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    """只增不减的计数器，标签值按声明顺序以位置参数传入"""
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """可任意设置的当前值"""
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def replace(self, values: Dict[Tuple[str, ...], float]) -> None:
+        """整体替换所有标签组合的值（已删除的资源等不再输出）"""
+        values = {self._key(key): value for key, value in values.items()}
+        with self._lock:
+            self._values = values
+
+
+class Histogram(_Metric):
+    """累积分布直方图；每个标签组合保存各桶计数、总和与次数"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)  # value <= buckets[index]，超出最大桶时落在 +Inf
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, [list(counts), total, count]) for key, (counts, total, count) in self._series.items())
+        lines = []
+        bucket_names = self.labelnames + ("le",)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(bucket_names, key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# HTTP 请求
+HTTP_REQUESTS = Counter("openbook_http_requests_total", "HTTP 请求数",
+                        ("method", "route", "status"))
+HTTP_ERRORS = Counter("openbook_http_request_errors_total", "返回 5xx 或抛出未处理异常的 HTTP 请求数",
+                      ("method", "route"))
+HTTP_LATENCY = Histogram("openbook_http_request_duration_seconds", "HTTP 请求耗时（秒，含响应体发送）",
+                         ("method", "route"))
+
+# 预约准入
+ADMISSIONS_ACCEPTED = Counter("openbook_admissions_accepted_total", "创建成功的预约数", ("resource_id",))
+ADMISSIONS_REJECTED = Counter("openbook_admissions_rejected_total",
+                              "被拒绝的预约创建请求数（reason: policy 用户组策略、quota 配额、memory 显存不足）",
+                              ("resource_id", "reason"))
+
+# 后台状态更新
+STATUS_UPDATE_DURATION = Histogram("openbook_status_update_duration_seconds", "一次预约状态更新的耗时（秒）")
+STATUS_TRANSITIONS = Counter("openbook_status_transitions_total", "后台任务完成的预约状态转换数",
+                             ("from_status", "to_status"))
+BACKGROUND_TASK_FAILURES = Counter("openbook_background_task_failures_total", "后台任务执行失败次数")
+
+# 数据库连接池
+DB_POOL_CHECKOUTS = Counter("openbook_db_pool_checkouts_total", "从连接池取出连接的次数")
+DB_POOL_WAIT = Histogram("openbook_db_pool_wait_seconds", "从连接池取得连接的等待时间（秒）",
+                         buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+DB_POOL_TIMEOUTS = Counter("openbook_db_pool_timeouts_total", "等待连接池超时的次数")
+DB_POOL_SIZE = Gauge("openbook_db_pool_size", "连接池常驻连接数")
+DB_POOL_CHECKED_OUT = Gauge("openbook_db_pool_checked_out", "当前已取出的连接数")
+
+# 资源显存（抓取时按当前时刻计算）
+RESOURCE_TOTAL_GB = Gauge("openbook_resource_total_memory_gb", "资源总显存（GB）", ("resource_id", "resource_name"))
+RESOURCE_RESERVED_GB = Gauge("openbook_resource_reserved_memory_gb", "当前时刻已预约的显存（GB）",
+                             ("resource_id", "resource_name"))
+RESOURCE_FREE_GB = Gauge("openbook_resource_free_memory_gb", "当前时刻剩余的显存（GB）",
+                         ("resource_id", "resource_name"))
+
+COLLECTOR_FAILURES = Counter("openbook_metrics_collector_failures_total", "抓取时采集函数执行失败次数")
+
+
+def register_collector(collector: Callable[[], None]) -> None:
+    """注册在每次抓取前调用的采集函数（用于填充需要现查的 Gauge）"""
+    _collectors.append(collector)
+
+
+def check_token(authorization: Optional[str]) -> bool:
+    """校验 Authorization 头中的 Bearer 令牌（常量时间比较）"""
+    if not METRICS_TOKEN or not authorization:
+        return False
+    scheme, _, token = authorization.partition(" ")
+    return scheme.lower() == "bearer" and secrets.compare_digest(token.strip(), METRICS_TOKEN)
+
+
+def render() -> bytes:
+    """运行采集函数并输出全部指标；单个采集函数失败不影响其余指标"""
+    for collector in _collectors:
+        try:
+            collector()
+        except Exception as e:
+            COLLECTOR_FAILURES.inc()
+            print(f"[指标] 采集失败: {e}")
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+# 路由对象 id -> 上层前缀（路由对象随应用常驻，id 不会复用）
+_route_prefixes: Dict[int, str] = {}
+
+
+def _matched_route(scope):
+    """请求匹配到的路由对象；Starlette 较早版本不在 scope 中保存路由对象，按 endpoint 反查"""
+    route = scope.get("route")
+    if route is not None:
+        return route
+    endpoint = scope.get("endpoint")
+    router = scope.get("router")
+    if endpoint is None or router is None:
+        return None
+    for candidate in router.routes:
+        if getattr(candidate, "endpoint", None) is endpoint:
+            return candidate
+    return None
+
+
+def _route_template(scope) -> str:
+    """请求匹配到的完整路由模板
+
+    嵌套挂载的路由器中，路由对象的 path 不含上层前缀；前缀在首次请求时
+    由路由正则匹配的路径后缀反推并缓存，之后每次只是一次字典查找。
+    """
+    route = _matched_route(scope)
+    if route is None or not hasattr(route, "path_regex"):
+        return "unmatched"
+    prefix = _route_prefixes.get(id(route))
+    if prefix is None:
+        path = scope["path"]
+        prefix = ""
+        for i, char in enumerate(path):
+            if char == "/" and route.path_regex.match(path[i:]):
+                prefix = path[:i]
+                break
+        _route_prefixes[id(route)] = prefix
+    return prefix + route.path
+
+
+class MetricsMiddleware:
+    """记录每个 HTTP 请求的耗时、状态码和错误（纯 ASGI 中间件，不缓冲流式响应）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            method = scope["method"]
+            route = _route_template(scope)
+            HTTP_LATENCY.observe(time.perf_counter() - started, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status))
+            if status >= 500:
+                HTTP_ERRORS.inc(method, route)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Date, Float, Boolean, ForeignKey, Text, Index, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -21,6 +21,107 @@ class User(Base):
     # 关联预约
     bookings = relationship("Booking", back_populates="user")
 
+    # 游标分页索引
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
+
+class UserTokenVersion(Base):
+    __tablename__ = "user_token_versions"
+    
+    # 仅在用户组变更、禁用等需要让旧令牌声明失效时写入；无记录即版本 0
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UserBookingCounter(Base):
+    __tablename__ = "user_booking_counters"
+    
+    # 每个用户未结束的预约数，随预约状态变化增量维护，供策略准入使用
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    upcoming = Column(Integer, nullable=False, default=0)
+    active = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class QuotaLedger(Base):
+    __tablename__ = "quota_ledger"
+    
+    # 按天分桶的显存时长用量（GB·小时），scope 为 "user:<用户ID>" 或 "group:<用户组>"
+    scope = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    gb_hours = Column(Float, nullable=False, default=0.0)
+
+class UsageRollupHourly(Base):
+    __tablename__ = "usage_rollup_hourly"
+    
+    # 按小时汇总的已结束预约用量：预约结束或释放时增量累加，可由 backfill_rollup.py 按 bookings 表重建
+    hour = Column(DateTime, primary_key=True)  # 整点（UTC）
+    resource_id = Column(String, primary_key=True)
+    user_id = Column(String, primary_key=True)
+    group = Column(String, primary_key=True)  # 结束时预约者所在的用户组
+    gb_hours = Column(Float, nullable=False, default=0.0)  # 该小时内的预约显存时长
+    booking_count = Column(Integer, nullable=False, default=0)  # 在该小时开始的预约数
+
+    __table_args__ = (
+        Index("ix_usage_rollup_hourly_resource_hour", "resource_id", "hour"),
+        Index("ix_usage_rollup_hourly_user_hour", "user_id", "hour"),
+    )
+
+class AdmissionRejection(Base):
+    __tablename__ = "admission_rejections"
+    
+    # 因显存不足被拒绝的预约请求，作为未满足需求参与需求预测
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    resource_id = Column(String, nullable=False)
+    user_id = Column(String, nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    requested_memory_gb = Column(Integer, nullable=False)
+    available_memory_gb = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_admission_rejections_start_time", "start_time"),
+    )
+
+class DemandForecastReport(Base):
+    __tablename__ = "demand_forecast_reports"
+    
+    # 离线需求预测任务（forecast_demand.py）的结果，接口返回最新一份
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    generated_at = Column(DateTime, default=datetime.utcnow, index=True)
+    params = Column(JSON, nullable=False)
+    report = Column(JSON, nullable=False)
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    jti = Column(String, unique=True, nullable=False)
+    user_id = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)  # 令牌原过期时间，过期后可清理
+    revoked_at = Column(DateTime, default=datetime.utcnow)
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    token_hash = Column(String, unique=True, nullable=False)  # SHA-256，不保存明文
+    family_id = Column(String, nullable=False, index=True)  # 同一次登录轮换出的令牌属于同一族
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    revoked_at = Column(DateTime, nullable=True)
+    replaced_by = Column(String, nullable=True)  # 轮换后的新令牌ID
+
+class OAuthState(Base):
+    __tablename__ = "oauth_states"
+    
+    # 多进程部署时共享的 OAuth state 存储（OAUTH_STATE_BACKEND=database），使用后即删除
+    state = Column(String, primary_key=True)
+    data = Column(JSON, nullable=False)  # code_verifier、nonce 等仅保存在服务端的数据
+    expires_at = Column(DateTime, nullable=False, index=True)
+
 class Resource(Base):
     __tablename__ = "resources"
     
@@ -35,10 +136,15 @@ class Resource(Base):
     # 关联预约
     bookings = relationship("Booking", back_populates="resource")
 
+    # 游标分页索引
+    __table_args__ = (
+        Index("ix_resources_created_at_id", "created_at", "id"),
+    )
+
 class Booking(Base):
     __tablename__ = "bookings"
     
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True, index=True)  # 新预约为时间有序的 26 位标识符（见 ids.py），旧数据为 uuid4
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     resource_id = Column(String, ForeignKey("resources.id"), nullable=False)
     task_name = Column(String, nullable=False)
@@ -55,11 +161,30 @@ class Booking(Base):
     user = relationship("User", back_populates="bookings")
     resource = relationship("Resource", back_populates="bookings")
 
+    # 用户预约列表的游标分页索引；按资源和时间范围查询（显存检查、利用率统计）的索引
+    __table_args__ = (
+        Index("ix_bookings_user_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_bookings_resource_end_time", "resource_id", "end_time"),
+    )
+
 class BookingLog(Base):
     __tablename__ = "booking_logs"
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     booking_id = Column(String, ForeignKey("bookings.id"), nullable=False)
     action = Column(String, nullable=False)  # created, extended, released, cancelled
-    details = Column(Text)  # JSON格式的详细信息
+    details = Column(Text)  # 可读的文字说明
+    data = Column(JSON)  # 结构化详情：old_end_time, new_end_time, hours, old_status, new_status 等
+    user_id = Column(String)  # 预约所属用户（冗余存储，便于按用户检索）
+    resource_id = Column(String)  # 预约所属资源（冗余存储，便于按资源检索）
+    actor_id = Column(String)  # 操作者用户ID，系统自动操作为 "system"
     timestamp = Column(DateTime, default=datetime.utcnow)
+
+    # 审计查询索引
+    __table_args__ = (
+        Index("ix_booking_logs_booking_ts", "booking_id", "timestamp"),
+        Index("ix_booking_logs_user_ts", "user_id", "timestamp"),
+        Index("ix_booking_logs_resource_ts", "resource_id", "timestamp"),
+        Index("ix_booking_logs_action_ts", "action", "timestamp"),
+        Index("ix_booking_logs_ts_id", "timestamp", "id"),
+    )
@@ -10,18 +10,46 @@ Generic OAuth 2.0 服务
 - 企业SSO系统
 """
 
+import asyncio
+import importlib.util
 import secrets
+import threading
+import time
 import httpx
+from datetime import datetime, timedelta
 from typing import Dict, Optional, Any
-from authlib.integrations.starlette_client import OAuth
-from authlib.integrations.httpx_client import AsyncOAuth2Client
 from fastapi import HTTPException, status
-from itsdangerous import URLSafeTimedSerializer
+from jose import jwt, JWTError
 import os
 from dotenv import load_dotenv
 
+from cache import TTLCache
+from database import SessionLocal
+from models import OAuthState
+
 load_dotenv()
 
+# 与OAuth提供商通信的HTTP客户端配置
+OAUTH_HTTP_TIMEOUT = float(os.getenv("OAUTH_HTTP_TIMEOUT", "10"))
+OAUTH_HTTP_MAX_CONNECTIONS = int(os.getenv("OAUTH_HTTP_MAX_CONNECTIONS", "50"))
+OAUTH_HTTP_MAX_KEEPALIVE = int(os.getenv("OAUTH_HTTP_MAX_KEEPALIVE", "20"))
+OAUTH_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("OAUTH_HTTP_KEEPALIVE_EXPIRY", "30"))
+OAUTH_HTTP2 = os.getenv("OAUTH_HTTP2", "true").lower() == "true"
+OAUTH_HTTP_RETRIES = int(os.getenv("OAUTH_HTTP_RETRIES", "2"))
+OAUTH_HTTP_BACKOFF = float(os.getenv("OAUTH_HTTP_BACKOFF", "0.2"))
+
+# 可安全重试的上游状态码（仅用于幂等请求）
+_RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+# OAuth state 存储：memory（单进程）或 database（多进程共享 SQLite 表）、有效期（秒）与内存容量
+OAUTH_STATE_BACKEND = os.getenv("OAUTH_STATE_BACKEND", "memory").lower()
+OAUTH_STATE_TTL = int(os.getenv("OAUTH_STATE_TTL", "600"))
+OAUTH_STATE_MAX_ENTRIES = int(os.getenv("OAUTH_STATE_MAX_ENTRIES", "10000"))
+
+# OIDC 发现文档缓存时间，以及遇到未知 kid 时重新拉取 JWKS 的最小间隔（秒）
+OAUTH_OIDC_CACHE_SECONDS = float(os.getenv("OAUTH_OIDC_CACHE_SECONDS", "3600"))
+OAUTH_JWKS_MIN_REFRESH_SECONDS = float(os.getenv("OAUTH_JWKS_MIN_REFRESH_SECONDS", "60"))
+
 class OAuthConfig:
     """OAuth配置类"""
     def __init__(self):
@@ -33,6 +61,13 @@ class OAuthConfig:
         self.user_info_url = os.getenv("OAUTH_USER_INFO_URL")
         self.redirect_uri = os.getenv("OAUTH_REDIRECT_URI", "http://localhost:8000/api/auth/oauth/callback")
         
+        # OIDC 模式：设置 issuer 后端点可由发现文档推导，并在本地校验 id_token
+        self.oidc_issuer = os.getenv("OAUTH_OIDC_ISSUER")
+        self.oidc_discovery_url = os.getenv("OAUTH_OIDC_DISCOVERY_URL") or (
+            f"{self.oidc_issuer.rstrip('/')}/.well-known/openid-configuration" if self.oidc_issuer else None
+        )
+        self.jwks_url = os.getenv("OAUTH_JWKS_URL")
+        
         # 可选配置
         self.scope = os.getenv("OAUTH_SCOPE", "openid email profile")
         self.provider_name = os.getenv("OAUTH_PROVIDER_NAME", "OAuth Provider")
@@ -44,18 +79,20 @@ class OAuthConfig:
         self.id_field = os.getenv("OAUTH_ID_FIELD", "sub")
         
         # 安全配置
-        self.state_secret = os.getenv("OAUTH_STATE_SECRET", "your-state-secret-change-in-production")
         self.use_pkce = os.getenv("OAUTH_USE_PKCE", "true").lower() == "true"
         
         # 验证必需配置
         self._validate_config()
     
+    @property
+    def oidc_enabled(self) -> bool:
+        return bool(self.oidc_issuer)
+    
     def _validate_config(self):
-        """验证OAuth配置"""
-        required_fields = [
-            "client_id", "client_secret", "authorization_url", 
-            "token_url", "user_info_url"
-        ]
+        """验证OAuth配置（OIDC 模式下端点可由发现文档推导）"""
+        required_fields = ["client_id", "client_secret"]
+        if not self.oidc_enabled:
+            required_fields += ["authorization_url", "token_url", "user_info_url"]
         
         missing_fields = []
         for field in required_fields:
@@ -65,47 +102,279 @@ class OAuthConfig:
         if missing_fields:
             raise ValueError(f"缺少必需的OAuth配置: {', '.join(missing_fields)}")
 
+class MemoryStateStore:
+    """进程内 state 存储：容量有上限、按 TTL 过期，state 只能取出一次"""
+    
+    def __init__(self, ttl_seconds: int = OAUTH_STATE_TTL, maxsize: int = OAUTH_STATE_MAX_ENTRIES):
+        self._cache = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+    
+    def save(self, state: str, data: Dict[str, Any]) -> None:
+        self._cache.set(state, data)
+    
+    def consume(self, state: str) -> Optional[Dict[str, Any]]:
+        return self._cache.pop(state)
+
+class DatabaseStateStore:
+    """基于 oauth_states 表的 state 存储，供多个 worker 进程共享"""
+    
+    def __init__(self, ttl_seconds: int = OAUTH_STATE_TTL):
+        self.ttl_seconds = ttl_seconds
+    
+    def save(self, state: str, data: Dict[str, Any]) -> None:
+        db = SessionLocal()
+        try:
+            db.add(OAuthState(
+                state=state,
+                data=data,
+                expires_at=datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+            ))
+            db.commit()
+        finally:
+            db.close()
+    
+    def consume(self, state: str) -> Optional[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            record = db.get(OAuthState, state)
+            if record is None:
+                return None
+            data, expires_at = record.data, record.expires_at
+            # 删除成功的进程才算取得 state，并发重放只有一个能成功
+            deleted = (
+                db.query(OAuthState)
+                .filter(OAuthState.state == state)
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            if deleted != 1 or expires_at <= datetime.utcnow():
+                return None
+            return data
+        finally:
+            db.close()
+
+def create_state_store(backend: str = OAUTH_STATE_BACKEND):
+    """按配置创建 state 存储"""
+    if backend == "database":
+        return DatabaseStateStore()
+    if backend != "memory":
+        raise ValueError(f"未知的OAUTH_STATE_BACKEND: {backend}")
+    return MemoryStateStore()
+
 class GenericOAuthService:
     """通用OAuth 2.0服务"""
     
     def __init__(self):
         self.config = OAuthConfig()
-        self.serializer = URLSafeTimedSerializer(self.config.state_secret)
-        self._client = None
+        self.state_store = create_state_store()
+        self._http: Optional[httpx.AsyncClient] = None
+        self._discovery: Optional[Dict[str, Any]] = None
+        self._discovery_expires = 0.0
+        self._jwks: Dict[str, Dict[str, Any]] = {}
+        self._jwks_fetched_at = 0.0
+        self._oidc_lock = asyncio.Lock()
     
     @property
-    def client(self) -> AsyncOAuth2Client:
-        """获取OAuth客户端"""
-        if not self._client:
-            self._client = AsyncOAuth2Client(
-                client_id=self.config.client_id,
-                client_secret=self.config.client_secret,
-                token_endpoint=self.config.token_url
+    def http(self) -> httpx.AsyncClient:
+        """共享的HTTP客户端（连接池 + keep-alive），首次使用时创建"""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(OAUTH_HTTP_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=OAUTH_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=OAUTH_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=OAUTH_HTTP_KEEPALIVE_EXPIRY
+                ),
+                # HTTP/2 需要安装 h2（httpx[http2]），未安装时回退到 HTTP/1.1
+                http2=OAUTH_HTTP2 and importlib.util.find_spec("h2") is not None,
+                headers={"Accept": "application/json"}
             )
-        return self._client
+        return self._http
     
-    def generate_state(self, user_data: Optional[Dict] = None) -> str:
-        """生成OAuth state参数（防CSRF攻击）"""
-        state_data = {
-            "nonce": secrets.token_urlsafe(32),
-            "timestamp": secrets.token_urlsafe(16)
-        }
-        if user_data:
-            state_data.update(user_data)
+    async def aclose(self) -> None:
+        """关闭共享的HTTP客户端（应用关闭时调用）"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+    
+    async def _request(self, method: str, url: str, idempotent: bool = True, **kwargs) -> httpx.Response:
+        """发送请求，瞬时故障时按指数退避重试
+        
+        非幂等请求（授权码交换）只在连接尚未建立时重试，避免授权码被重复提交。
+        """
+        for attempt in range(OAUTH_HTTP_RETRIES + 1):
+            last_attempt = attempt == OAUTH_HTTP_RETRIES
+            try:
+                response = await self.http.request(method, url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if last_attempt:
+                    raise
+            except httpx.TransportError:
+                if last_attempt or not idempotent:
+                    raise
+            else:
+                if last_attempt or not idempotent or response.status_code not in _RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+                # 丢弃的响应先关闭，释放连接后再重试
+                await response.aclose()
+            await asyncio.sleep(OAUTH_HTTP_BACKOFF * (2 ** attempt))
+    
+    async def discover(self) -> Optional[Dict[str, Any]]:
+        """拉取并缓存 OIDC 发现文档，补全未显式配置的端点；非 OIDC 模式返回 None"""
+        if not self.config.oidc_enabled:
+            return None
+        if self._discovery is not None and time.monotonic() < self._discovery_expires:
+            return self._discovery
         
-        return self.serializer.dumps(state_data)
+        async with self._oidc_lock:
+            if self._discovery is None or time.monotonic() >= self._discovery_expires:
+                try:
+                    response = await self._request("GET", self.config.oidc_discovery_url)
+                    document = response.json()
+                except (httpx.HTTPError, ValueError) as e:
+                    if self._discovery is None:
+                        raise HTTPException(
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=f"获取OIDC发现文档失败: {str(e)}"
+                        )
+                    # 沿用过期的文档，稍后重试
+                    document = self._discovery
+                self._discovery = document
+                self._discovery_expires = time.monotonic() + OAUTH_OIDC_CACHE_SECONDS
+                
+                config = self.config
+                config.authorization_url = config.authorization_url or document.get("authorization_endpoint")
+                config.token_url = config.token_url or document.get("token_endpoint")
+                config.user_info_url = config.user_info_url or document.get("userinfo_endpoint")
+                config.jwks_url = config.jwks_url or document.get("jwks_uri")
+        return self._discovery
     
-    def verify_state(self, state: str, max_age: int = 600) -> Dict:
-        """验证OAuth state参数"""
+    async def _get_signing_key(self, kid: Optional[str]) -> Dict[str, Any]:
+        """按 kid 查找 JWKS 公钥；未知 kid 时重新拉取 JWKS（限制频率，防止伪造 kid 打满 IdP）"""
+        key = self._jwks.get(kid)
+        if key is not None:
+            return key
+        
+        async with self._oidc_lock:
+            key = self._jwks.get(kid)
+            stale = time.monotonic() - self._jwks_fetched_at >= OAUTH_JWKS_MIN_REFRESH_SECONDS
+            if key is None and (stale or not self._jwks) and self.config.jwks_url:
+                try:
+                    response = await self._request("GET", self.config.jwks_url)
+                    keys = response.json().get("keys", [])
+                except (httpx.HTTPError, ValueError) as e:
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail=f"获取JWKS失败: {str(e)}"
+                    )
+                self._jwks = {k.get("kid"): k for k in keys}
+                self._jwks_fetched_at = time.monotonic()
+                key = self._jwks.get(kid)
+                # 只有一把未标注 kid 的密钥时直接使用
+                if key is None and kid is None and len(keys) == 1:
+                    key = keys[0]
+        
+        if key is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="id_token 签名密钥未知"
+            )
+        return key
+    
+    async def verify_id_token(
+        self,
+        id_token: str,
+        access_token: Optional[str] = None,
+        nonce: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """在本地校验 id_token 的签名、issuer、audience、有效期与 nonce，返回声明"""
+        document = await self.discover() or {}
+        try:
+            header = jwt.get_unverified_header(id_token)
+        except JWTError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"无效的id_token: {str(e)}"
+            )
+        
+        algorithms = document.get("id_token_signing_alg_values_supported") or ["RS256"]
+        if header.get("alg") not in algorithms or header.get("alg") == "none":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="id_token 签名算法不受支持"
+            )
+        
+        key = await self._get_signing_key(header.get("kid"))
         try:
-            return self.serializer.loads(state, max_age=max_age)
-        except Exception as e:
+            claims = jwt.decode(
+                id_token,
+                key,
+                algorithms=[header["alg"]],
+                audience=self.config.client_id,
+                issuer=document.get("issuer", self.config.oidc_issuer),
+                access_token=access_token
+            )
+        except JWTError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"id_token 校验失败: {str(e)}"
+            )
+        
+        if nonce is not None and claims.get("nonce") != nonce:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="id_token nonce 不匹配"
+            )
+        return claims
+    
+    async def build_authorization(self) -> Dict[str, str]:
+        """生成 state（含 PKCE code_verifier 与 OIDC nonce）并构建授权URL"""
+        await self.discover()
+        
+        state_data = {}
+        code_challenge = None
+        if self.config.use_pkce:
+            pkce_data = generate_pkce_pair()
+            code_challenge = pkce_data["code_challenge"]
+            # 将code_verifier保存到state中
+            state_data["code_verifier"] = pkce_data["code_verifier"]
+        
+        nonce = None
+        if self.config.oidc_enabled:
+            nonce = secrets.token_urlsafe(16)
+            state_data["oidc_nonce"] = nonce
+        
+        state = self.generate_state(state_data)
+        return {
+            "authorization_url": self.get_authorization_url(state, code_challenge, nonce),
+            "state": state
+        }
+    
+    def generate_state(self, user_data: Optional[Dict] = None) -> str:
+        """生成OAuth state参数（防CSRF攻击）
+        
+        state 本身是随机值，code_verifier 等数据只保存在服务端的 state 存储中
+        """
+        state = secrets.token_urlsafe(32)
+        self.state_store.save(state, dict(user_data or {}))
+        return state
+    
+    def verify_state(self, state: str) -> Dict:
+        """验证并消费OAuth state参数：每个 state 只能使用一次，过期或重放均被拒绝"""
+        state_data = self.state_store.consume(state)
+        if state_data is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"无效的state参数: {str(e)}"
+                detail="无效的state参数: 不存在、已过期或已被使用"
             )
+        return state_data
     
-    def get_authorization_url(self, state: str, code_challenge: Optional[str] = None) -> str:
+    def get_authorization_url(
+        self,
+        state: str,
+        code_challenge: Optional[str] = None,
+        nonce: Optional[str] = None
+    ) -> str:
         """构建OAuth授权URL"""
         params = {
             "client_id": self.config.client_id,
@@ -122,6 +391,9 @@ class GenericOAuthService:
                 "code_challenge_method": "S256"
             })
         
+        if nonce:
+            params["nonce"] = nonce
+        
         # 构建URL
         param_string = "&".join([f"{k}={v}" for k, v in params.items()])
         return f"{self.config.authorization_url}?{param_string}"
@@ -129,13 +401,9 @@ class GenericOAuthService:
     async def exchange_code_for_token(
         self, 
         code: str, 
-        state: str,
         code_verifier: Optional[str] = None
     ) -> Dict[str, Any]:
-        """用授权码换取访问令牌"""
-        
-        # 验证state
-        self.verify_state(state)
+        """用授权码换取访问令牌（调用方负责先验证state）"""
         
         # 准备令牌请求
         token_data = {
@@ -151,15 +419,11 @@ class GenericOAuthService:
             token_data["code_verifier"] = code_verifier
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.config.token_url,
-                    data=token_data,
-                    headers={"Accept": "application/json"}
-                )
-                response.raise_for_status()
-                return response.json()
-                
+            response = await self._request(
+                "POST", self.config.token_url, idempotent=False, data=token_data
+            )
+            return response.json()
+            
         except httpx.HTTPError as e:
             # 获取详细的错误信息
             error_detail = str(e)
@@ -178,17 +442,13 @@ class GenericOAuthService:
     async def get_user_info(self, access_token: str) -> Dict[str, Any]:
         """获取用户信息"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    self.config.user_info_url,
-                    headers={
-                        "Authorization": f"Bearer {access_token}",
-                        "Accept": "application/json"
-                    }
-                )
-                response.raise_for_status()
-                return response.json()
-                
+            response = await self._request(
+                "GET",
+                self.config.user_info_url,
+                headers={"Authorization": f"Bearer {access_token}"}
+            )
+            return response.json()
+            
         except httpx.HTTPError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -209,13 +469,22 @@ class GenericOAuthService:
     async def complete_oauth_flow(
         self, 
         code: str, 
-        state: str,
-        code_verifier: Optional[str] = None
+        state: str
     ) -> Dict[str, Any]:
-        """完整的OAuth流程：代码交换 + 用户信息获取"""
+        """完整的OAuth流程：state 验证 + 代码交换 + 用户信息获取
+        
+        OIDC 模式下优先从本地校验过的 id_token 声明中读取用户信息，
+        声明中缺少邮箱时才回退到用户信息端点。
+        """
+        # 验证并消费state，取出服务端保存的code_verifier（如果使用PKCE）和OIDC nonce
+        state_data = self.verify_state(state)
+        code_verifier = state_data.get("code_verifier")
+        nonce = state_data.get("oidc_nonce")
+        
+        await self.discover()
         
         # 1. 用授权码换取访问令牌
-        token_response = await self.exchange_code_for_token(code, state, code_verifier)
+        token_response = await self.exchange_code_for_token(code, code_verifier)
         access_token = token_response.get("access_token")
         
         if not access_token:
@@ -224,8 +493,15 @@ class GenericOAuthService:
                 detail="未能获取访问令牌"
             )
         
-        # 2. 获取用户信息
-        oauth_user_info = await self.get_user_info(access_token)
+        # 2. 获取用户信息（OIDC 模式下优先使用 id_token 声明）
+        oauth_user_info = None
+        id_token = token_response.get("id_token")
+        if self.config.oidc_enabled and id_token:
+            claims = await self.verify_id_token(id_token, access_token, nonce)
+            if claims.get(self.config.email_field):
+                oauth_user_info = claims
+        if oauth_user_info is None:
+            oauth_user_info = await self.get_user_info(access_token)
         
         # 3. 映射用户信息
         user_info = self.map_user_info(oauth_user_info)
@@ -246,7 +522,8 @@ class GenericOAuthService:
             "name": self.config.provider_name,
             "authorization_url": self.config.authorization_url,
             "scopes": self.config.scope.split(),
-            "supports_pkce": self.config.use_pkce
+            "supports_pkce": self.config.use_pkce,
+            "oidc": self.config.oidc_enabled
         }
 
 # PKCE助手函数
@@ -270,5 +547,34 @@ def generate_pkce_pair() -> Dict[str, str]:
         "code_challenge": code_challenge
     }
 
-# 全局OAuth服务实例
-oauth_service = GenericOAuthService()
+# OAuth服务实例：首次使用时构建并缓存，未配置时不影响应用启动
+_oauth_service: Optional[GenericOAuthService] = None
+_oauth_service_lock = threading.Lock()
+
+def get_oauth_service() -> GenericOAuthService:
+    """获取OAuth服务；OAuth未启用或配置不完整时返回 503"""
+    global _oauth_service
+    if _oauth_service is not None:
+        return _oauth_service
+    
+    if os.getenv("OAUTH_ENABLED", "true").lower() != "true":
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="OAuth登录未启用"
+        )
+    
+    with _oauth_service_lock:
+        if _oauth_service is None:
+            try:
+                _oauth_service = GenericOAuthService()
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"OAuth登录不可用: {str(e)}"
+                )
+    return _oauth_service
+
+async def close_oauth_service() -> None:
+    """关闭已构建的OAuth服务的HTTP客户端"""
+    if _oauth_service is not None:
+        await _oauth_service.aclose()
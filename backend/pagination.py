@@ -0,0 +1,63 @@
+"""
+游标（键集）分页工具
+
+按 (created_at, id)（或其他时间列与 id）倒序进行键集分页：每一页都从上一页最后一条记录的位置继续，
+查询直接命中 (created_at, id) 索引，不再使用 OFFSET，因此第 N 页与第 1 页的代价相同。
+"""
+
+import base64
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+from cache import TTLCache
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    """将 (created_at, id) 编码为不透明的游标字符串"""
+    raw = f"{created_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析游标字符串，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), row_id
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+def apply_keyset(query: Query, model: Any, cursor: Optional[str] = None,
+                 time_attr: str = "created_at") -> Query:
+    """为查询添加键集过滤条件和 (时间列, id) 倒序排序"""
+    time_column = getattr(model, time_attr)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        try:
+            row_id = model.id.type.python_type(row_id)
+        except ValueError:
+            raise ValueError("无效的分页游标")
+        query = query.filter(
+            or_(
+                time_column < created_at,
+                and_(time_column == created_at, model.id < row_id)
+            )
+        )
+    return query.order_by(time_column.desc(), model.id.desc())
+
+
+def next_cursor(items: List[Any], limit: int, time_attr: str = "created_at") -> Optional[str]:
+    """根据本页结果生成下一页游标，已到最后一页时返回 None"""
+    if len(items) < limit or not items:
+        return None
+    last = items[-1]
+    return encode_cursor(getattr(last, time_attr), last.id)
+
+
+# 管理列表共用的总数缓存（键为 (列表, 搜索条件)，写入后按列表整体失效），避免每次翻页都执行全表 COUNT
+count_cache = TTLCache(maxsize=256, ttl_seconds=30.0)
@@ -0,0 +1,169 @@
+"""
+按用户组的预约策略
+
+GROUP_POLICIES 以声明方式列出各用户组的限制（-1 表示不限制），
+创建、修改和延长预约时由 check_* 函数在准入阶段统一校验。
+
+并发预约数来自 user_booking_counters 表中按用户维护的计数器：
+预约创建、取消、开始、结束时与预约本身在同一事务内增量更新，
+准入时只需一次主键查询，不再扫描 bookings 表。启动时会按 bookings 表重建计数器。
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.orm import Session
+
+from models import Booking, UserBookingCounter
+
+UNLIMITED = -1
+
+# 各用户组的预约策略
+GROUP_POLICIES: Dict[str, Dict[str, int]] = {
+    "standard": {
+        "max_booking_duration": 8,     # 单次预约最长小时数
+        "max_advance_days": 7,         # 最多提前天数
+        "max_concurrent_bookings": 2,  # 未结束（未开始 + 进行中）的预约数上限
+        "max_extend_hours": 4,         # 单次延长的最大小时数
+        "quota_gb_hours": 500,         # 每个用户滚动窗口内的显存时长配额（GB·小时）
+        "group_quota_gb_hours": UNLIMITED,  # 整个用户组滚动窗口内的配额
+        "priority": 0,                 # 抢占优先级，数值越大越高
+        "can_preempt": False,          # 显存不足时能否抢占更低优先级用户未开始的预约
+    },
+    "premium": {
+        "max_booking_duration": 24,
+        "max_advance_days": 14,
+        "max_concurrent_bookings": 5,
+        "max_extend_hours": 8,
+        "quota_gb_hours": 2000,
+        "group_quota_gb_hours": UNLIMITED,
+        "priority": 1,
+        "can_preempt": True,
+    },
+    "admin": {
+        "max_booking_duration": UNLIMITED,
+        "max_advance_days": UNLIMITED,
+        "max_concurrent_bookings": UNLIMITED,
+        "max_extend_hours": 24,
+        "quota_gb_hours": UNLIMITED,
+        "group_quota_gb_hours": UNLIMITED,
+        "priority": 2,
+        "can_preempt": True,
+    },
+}
+
+
+def get_policy(group: str) -> Dict[str, int]:
+    """获取用户组策略，未知用户组按 standard 处理"""
+    return GROUP_POLICIES.get(group, GROUP_POLICIES["standard"])
+
+
+def _exceeds(value: float, limit: int) -> bool:
+    return limit != UNLIMITED and value > limit
+
+
+def get_counters(db: Session, user_id: str) -> Tuple[int, int]:
+    """返回用户 (未开始, 进行中) 的预约数"""
+    row = (
+        db.query(UserBookingCounter.upcoming, UserBookingCounter.active)
+        .filter(UserBookingCounter.user_id == user_id)
+        .first()
+    )
+    return (row.upcoming, row.active) if row else (0, 0)
+
+
+def _non_negative(expr):
+    """expr 小于 0 时取 0（CASE 表达式，各数据库通用；双参数 max() 只有 SQLite 支持）"""
+    return case((expr < 0, 0), else_=expr)
+
+
+def adjust_counters(db: Session, user_id: str, upcoming: int = 0, active: int = 0) -> None:
+    """增量调整用户的预约计数器（由调用方提交事务）
+
+    在数据库内原子地加减，并发请求不会丢失更新。
+    """
+    if not upcoming and not active:
+        return
+    result = db.execute(
+        update(UserBookingCounter)
+        .where(UserBookingCounter.user_id == user_id)
+        .values(
+            upcoming=_non_negative(UserBookingCounter.upcoming + upcoming),
+            active=_non_negative(UserBookingCounter.active + active),
+            updated_at=datetime.utcnow()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.execute(insert(UserBookingCounter).values(
+            user_id=user_id, upcoming=max(upcoming, 0), active=max(active, 0)
+        ))
+
+
+def apply_transitions(db: Session, transitions: Iterable[Tuple[str, str, str]]) -> None:
+    """按 (user_id, 原状态, 新状态) 批量调整计数器，每个用户只写一次"""
+    deltas = defaultdict(lambda: [0, 0])
+    for user_id, old_status, new_status in transitions:
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            if status == "upcoming":
+                deltas[user_id][0] += sign
+            elif status == "active":
+                deltas[user_id][1] += sign
+    for user_id, (upcoming, active) in deltas.items():
+        adjust_counters(db, user_id, upcoming, active)
+
+
+def rebuild_counters(db: Session) -> int:
+    """按 bookings 表重建所有用户的计数器，返回涉及的用户数"""
+    rows = (
+        db.query(
+            Booking.user_id,
+            func.sum(case((Booking.status == "upcoming", 1), else_=0)),
+            func.sum(case((Booking.status == "active", 1), else_=0)),
+        )
+        .filter(Booking.is_deleted == False, Booking.status.in_(["upcoming", "active"]))
+        .group_by(Booking.user_id)
+        .all()
+    )
+    db.query(UserBookingCounter).delete(synchronize_session=False)
+    if rows:
+        db.execute(insert(UserBookingCounter), [
+            {"user_id": user_id, "upcoming": upcoming, "active": active}
+            for user_id, upcoming, active in rows
+        ])
+    db.commit()
+    return len(rows)
+
+
+def check_duration(group: str, start_time: datetime, end_time: datetime) -> None:
+    """校验预约时长"""
+    limit = get_policy(group)["max_booking_duration"]
+    if _exceeds((end_time - start_time).total_seconds() / 3600, limit):
+        raise ValueError(f"单次预约时长不能超过{limit}小时")
+
+
+def check_create(db: Session, user_id: str, group: str, start_time: datetime,
+                 end_time: datetime, now: datetime) -> None:
+    """创建预约的准入校验：时长、提前天数、并发预约数"""
+    policy = get_policy(group)
+    check_duration(group, start_time, end_time)
+
+    if _exceeds((start_time - now) / timedelta(days=1), policy["max_advance_days"]):
+        raise ValueError(f"最多只能提前{policy['max_advance_days']}天预约")
+
+    limit = policy["max_concurrent_bookings"]
+    if limit != UNLIMITED:
+        upcoming, active = get_counters(db, user_id)
+        if upcoming + active >= limit:
+            raise ValueError(f"未结束的预约数已达上限（{limit}个）")
+
+
+def check_extend(group: str, hours: int) -> None:
+    """延长预约的准入校验"""
+    limit = get_policy(group)["max_extend_hours"]
+    if hours <= 0:
+        raise ValueError("延长时间必须大于0小时")
+    if _exceeds(hours, limit):
+        raise ValueError(f"单次最多延长{limit}小时")
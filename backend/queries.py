@@ -0,0 +1,67 @@
+"""
+热点查询的预构建语句
+
+每个请求都会执行的几条查询在模块加载时一次性构建成 Core select()，
+调用时只绑定参数，SQLAlchemy 可直接命中编译缓存；除用户查询外均只选取需要的列，
+返回轻量 Row 而不是完整的 ORM 实例。
+"""
+
+from sqlalchemy import bindparam, select
+
+from models import Booking, Resource, User
+
+# 预约视为占用显存的状态
+OCCUPYING_STATUSES = ("upcoming", "active")
+
+# 按邮箱查询用户（get_current_user 每个请求都会执行）
+USER_BY_EMAIL = (
+    select(User)
+    .where(User.email == bindparam("email"))
+    .limit(1)
+)
+
+# 与指定时间段重叠且占用显存的预约（显存可用性检查与抢占的时间线）
+# 参数: resource_id, start_time, end_time, exclude_booking_id（不排除时传空字符串）
+CONFLICTING_BOOKINGS = (
+    select(
+        Booking.id,
+        Booking.user_id,
+        Booking.estimated_memory_gb,
+        Booking.start_time,
+        Booking.end_time,
+        Booking.status
+    )
+    .where(
+        Booking.resource_id == bindparam("resource_id"),
+        Booking.is_deleted == False,
+        Booking.status.in_(OCCUPYING_STATUSES),
+        Booking.start_time < bindparam("end_time"),
+        Booking.end_time > bindparam("start_time"),
+        Booking.id != bindparam("exclude_booking_id")
+    )
+)
+
+# 日历时间范围内的预约，列名与 BookingResponse 字段一一对应
+# 参数: start_date, end_date
+CALENDAR_BOOKINGS = (
+    select(
+        Booking.id,
+        Booking.user_id,
+        Booking.resource_id,
+        Resource.name.label("resource_name"),
+        Booking.task_name,
+        Booking.estimated_memory_gb,
+        Booking.start_time,
+        Booking.end_time,
+        Booking.original_end_time,
+        Booking.status,
+        Booking.created_at,
+        Booking.updated_at
+    )
+    .join(Resource, Booking.resource_id == Resource.id)
+    .where(
+        Booking.is_deleted == False,
+        Booking.start_time < bindparam("end_date"),
+        Booking.end_time > bindparam("start_date")
+    )
+)
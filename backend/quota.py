@@ -0,0 +1,209 @@
+"""
+滚动窗口显存时长配额（GB·小时）
+
+每个预约按 显存 × 时长 计入用量，并按 UTC 自然日拆分到 quota_ledger 表的日桶中，
+用户与用户组各有一组桶（scope 为 "user:<ID>" / "group:<组名>"）。
+创建、修改、延长、释放、取消预约时与预约本身在同一事务内增量加减对应日桶，
+组桶始终按预约者当前所在的组计入，管理员修改用户组时整体迁移该用户的用量，
+准入时只读取新预约前后各一个窗口的日桶（一次主键范围查询），与历史预约数量无关。
+
+任意连续 QUOTA_WINDOW_DAYS 天的用量之和不得超过用户组策略中的配额。
+启动时按 bookings 表重建窗口内的日桶。
+"""
+
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from models import Booking, QuotaLedger, User
+from policy import UNLIMITED, get_policy
+
+load_dotenv()
+
+# 配额滚动窗口（天）
+QUOTA_WINDOW_DAYS = int(os.getenv("QUOTA_WINDOW_DAYS", "7"))
+
+# 浮点误差容忍
+_EPSILON = 1e-6
+
+
+def user_scope(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def group_scope(group: str) -> str:
+    return f"group:{group}"
+
+
+def split_gb_hours(start_time: datetime, end_time: datetime, memory_gb: float) -> Dict[date, float]:
+    """将 [start_time, end_time) 的显存时长按 UTC 自然日拆分"""
+    buckets: Dict[date, float] = {}
+    cursor = start_time
+    while cursor < end_time:
+        day_end = datetime.combine(cursor.date() + timedelta(days=1), datetime.min.time())
+        segment_end = min(day_end, end_time)
+        buckets[cursor.date()] = (segment_end - cursor).total_seconds() / 3600 * memory_gb
+        cursor = segment_end
+    return buckets
+
+
+def _add(db: Session, scope: str, buckets: Dict[date, float]) -> None:
+    """在数据库内原子地累加日桶"""
+    for day, amount in buckets.items():
+        result = db.execute(
+            update(QuotaLedger)
+            .where(QuotaLedger.scope == scope, QuotaLedger.day == day)
+            .values(gb_hours=QuotaLedger.gb_hours + amount)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.execute(insert(QuotaLedger).values(scope=scope, day=day, gb_hours=amount))
+
+
+def record(db: Session, user_id: str, group: str, start_time: datetime, end_time: datetime,
+           memory_gb: float, sign: int = 1) -> None:
+    """把一段预约计入（sign=1）或移出（sign=-1）用户与用户组的用量（由调用方提交事务）"""
+    if end_time <= start_time or not memory_gb:
+        return
+    buckets = {day: sign * amount for day, amount in split_gb_hours(start_time, end_time, memory_gb).items()}
+    _add(db, user_scope(user_id), buckets)
+    _add(db, group_scope(group), buckets)
+
+
+def move_user_group(db: Session, user_id: str, old_group: Optional[str], new_group: Optional[str]) -> None:
+    """用户改组后把该用户的用量从原用户组的日桶移到新用户组（由调用方提交事务）
+
+    用户日桶恰好是该用户所有预约的用量之和，整体移动后组桶与重建结果一致，
+    之后释放、取消预约按用户当前所在的组退还即可。
+    """
+    old_group, new_group = old_group or "standard", new_group or "standard"
+    if old_group == new_group:
+        return
+    usage = dict(
+        db.query(QuotaLedger.day, QuotaLedger.gb_hours)
+        .filter(QuotaLedger.scope == user_scope(user_id))
+        .all()
+    )
+    if not usage:
+        return
+    _add(db, group_scope(old_group), {day: -amount for day, amount in usage.items()})
+    _add(db, group_scope(new_group), usage)
+
+
+def _load(db: Session, scope: str, first_day: date, last_day: date) -> Dict[date, float]:
+    rows = (
+        db.query(QuotaLedger.day, QuotaLedger.gb_hours)
+        .filter(QuotaLedger.scope == scope, QuotaLedger.day >= first_day, QuotaLedger.day <= last_day)
+        .all()
+    )
+    return {row.day: row.gb_hours for row in rows}
+
+
+def _peak_window(usage: Dict[date, float], first_end: date, last_end: date) -> float:
+    """窗口终点在 [first_end, last_end] 内的所有滚动窗口中的最大用量"""
+    window = sum(usage.get(first_end - timedelta(days=i), 0.0) for i in range(QUOTA_WINDOW_DAYS))
+    peak = window
+    day = first_end
+    while day < last_end:
+        day += timedelta(days=1)
+        window += usage.get(day, 0.0) - usage.get(day - timedelta(days=QUOTA_WINDOW_DAYS), 0.0)
+        peak = max(peak, window)
+    return peak
+
+
+def _check_scope(db: Session, scope: str, limit: int, buckets: Dict[date, float], label: str) -> None:
+    if limit == UNLIMITED:
+        return
+    first_day, last_day = min(buckets), max(buckets)
+    window = timedelta(days=QUOTA_WINDOW_DAYS - 1)
+    usage = _load(db, scope, first_day - window, last_day + window)
+    for day, amount in buckets.items():
+        usage[day] = usage.get(day, 0.0) + amount
+    # 受新预约影响的窗口：终点从首日到末日之后 QUOTA_WINDOW_DAYS - 1 天
+    if _peak_window(usage, first_day, last_day + window) > limit + _EPSILON:
+        raise ValueError(f"{label}显存时长配额不足（每 {QUOTA_WINDOW_DAYS} 天 {limit} GB·小时）")
+
+
+def check(db: Session, user_id: str, group: str, start_time: datetime, end_time: datetime,
+          memory_gb: float) -> None:
+    """准入校验：计入这段预约后，用户与用户组在任意滚动窗口内都不超过配额"""
+    if end_time <= start_time or not memory_gb:
+        return
+    policy = get_policy(group)
+    buckets = split_gb_hours(start_time, end_time, memory_gb)
+    _check_scope(db, user_scope(user_id), policy["quota_gb_hours"], buckets, "")
+    _check_scope(db, group_scope(group), policy["group_quota_gb_hours"], buckets, "用户组")
+
+
+def get_status(db: Session, user_id: str, group: str, now: datetime) -> dict:
+    """返回当前窗口用量、含已预约部分的窗口峰值和剩余配额"""
+    policy = get_policy(group)
+    today = now.date()
+    window = timedelta(days=QUOTA_WINDOW_DAYS - 1)
+    usage = _load(db, user_scope(user_id), today - window, today + window)
+    used = _peak_window(usage, today, today)
+    peak = _peak_window(usage, today, today + window)
+    limit = policy["quota_gb_hours"]
+    return {
+        "window_days": QUOTA_WINDOW_DAYS,
+        "limit_gb_hours": None if limit == UNLIMITED else limit,
+        "used_gb_hours": round(used, 2),
+        "peak_gb_hours": round(peak, 2),
+        "remaining_gb_hours": None if limit == UNLIMITED else round(max(limit - peak, 0.0), 2),
+        "daily": [
+            {"day": day, "gb_hours": round(usage.get(day, 0.0), 2)}
+            for day in (today - window + timedelta(days=i) for i in range(2 * QUOTA_WINDOW_DAYS - 1))
+        ],
+    }
+
+
+def rebuild(db: Session, now: Optional[datetime] = None) -> int:
+    """按 bookings 表重建仍可能影响准入的日桶（最近一个窗口及以后），返回涉及的预约数
+
+    更早的日桶不再参与准入，直接丢弃。
+    """
+    now = now or datetime.utcnow()
+    first_day = now.date() - timedelta(days=QUOTA_WINDOW_DAYS - 1)
+    horizon = datetime.combine(first_day, datetime.min.time())
+    rows = (
+        db.query(Booking.user_id, User.group, Booking.start_time, Booking.end_time, Booking.estimated_memory_gb)
+        .join(User, User.id == Booking.user_id)
+        .filter(
+            Booking.is_deleted == False,
+            Booking.status != "cancelled",
+            Booking.end_time > horizon
+        )
+        .all()
+    )
+    totals: Dict[tuple, float] = defaultdict(float)
+    for row in rows:
+        start_time = max(row.start_time, horizon)
+        for day, amount in split_gb_hours(start_time, row.end_time, row.estimated_memory_gb).items():
+            totals[(user_scope(row.user_id), day)] += amount
+            totals[(group_scope(row.group or "standard"), day)] += amount
+
+    db.query(QuotaLedger).delete(synchronize_session=False)
+    if totals:
+        db.execute(insert(QuotaLedger), [
+            {"scope": scope, "day": day, "gb_hours": amount} for (scope, day), amount in totals.items()
+        ])
+    db.commit()
+    return len(rows)
+
+
+def purge_expired(db: Session, now: Optional[datetime] = None) -> int:
+    """删除已滑出窗口的日桶，返回删除数量"""
+    now = now or datetime.utcnow()
+    first_day = now.date() - timedelta(days=QUOTA_WINDOW_DAYS - 1)
+    deleted = (
+        db.query(QuotaLedger)
+        .filter(QuotaLedger.day < first_day)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
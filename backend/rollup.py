@@ -0,0 +1,161 @@
+"""
+按小时预聚合的用量表（usage_rollup_hourly）
+
+预约结束（到期自动结束、过期未开始或用户主动释放）时，把它的显存时长按 UTC 整点拆分，
+与预约状态变更在同一事务内增量累加到 (小时, 资源, 用户, 用户组) 对应的行上，
+预约数计入预约开始所在的小时。
+
+报表按小时行汇总即可，不必再扫描数月的 bookings 表；
+历史数据或修复数据后用 backfill 按 bookings 表重建指定区间（见 backfill_rollup.py）。
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+
+from models import Booking, UsageRollupHourly, User
+
+# 汇总维度 -> 分组列
+GROUP_BY_FIELDS = {
+    "resource": UsageRollupHourly.resource_id,
+    "user": UsageRollupHourly.user_id,
+    "group": UsageRollupHourly.group,
+    "day": func.date(UsageRollupHourly.hour),
+    "hour": UsageRollupHourly.hour,
+}
+
+_HOUR = timedelta(hours=1)
+
+
+def floor_hour(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def _ceil_hour(dt: datetime) -> datetime:
+    hour = floor_hour(dt)
+    return hour if hour == dt else hour + _HOUR
+
+
+def split_gb_hours(start_time: datetime, end_time: datetime, memory_gb: float) -> Dict[datetime, float]:
+    """将 [start_time, end_time) 的显存时长按 UTC 整点拆分"""
+    buckets: Dict[datetime, float] = {}
+    cursor = start_time
+    while cursor < end_time:
+        hour = floor_hour(cursor)
+        segment_end = min(hour + _HOUR, end_time)
+        buckets[hour] = (segment_end - cursor).total_seconds() / 3600 * memory_gb
+        cursor = segment_end
+    return buckets
+
+
+def _add(db: Session, hour: datetime, resource_id: str, user_id: str, group: str,
+         gb_hours: float, booking_count: int) -> None:
+    """在数据库内原子地累加一行"""
+    result = db.execute(
+        update(UsageRollupHourly)
+        .where(
+            UsageRollupHourly.hour == hour,
+            UsageRollupHourly.resource_id == resource_id,
+            UsageRollupHourly.user_id == user_id,
+            UsageRollupHourly.group == group
+        )
+        .values(
+            gb_hours=UsageRollupHourly.gb_hours + gb_hours,
+            booking_count=UsageRollupHourly.booking_count + booking_count
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.execute(insert(UsageRollupHourly).values(
+            hour=hour, resource_id=resource_id, user_id=user_id, group=group,
+            gb_hours=gb_hours, booking_count=booking_count
+        ))
+
+
+def record(db: Session, booking: Booking, group: str) -> None:
+    """把一个已结束的预约计入小时汇总（由调用方提交事务）"""
+    buckets = split_gb_hours(booking.start_time, booking.end_time, booking.estimated_memory_gb or 0)
+    start_hour = floor_hour(booking.start_time)
+    buckets.setdefault(start_hour, 0.0)
+    for hour, gb_hours in buckets.items():
+        _add(db, hour, booking.resource_id, booking.user_id, group or "standard",
+             gb_hours, 1 if hour == start_hour else 0)
+
+
+def backfill(db: Session, since: Optional[datetime] = None, until: Optional[datetime] = None) -> int:
+    """按 bookings 表重建 [since, until) 内的小时汇总（按整点对齐），返回涉及的预约数
+
+    不指定区间时重建全部数据。区间边界上的预约只计入区间内的部分。
+    """
+    since = floor_hour(since) if since else None
+    until = _ceil_hour(until) if until else None
+
+    query = (
+        db.query(Booking.resource_id, Booking.user_id, User.group, Booking.start_time,
+                 Booking.end_time, Booking.estimated_memory_gb)
+        .join(User, User.id == Booking.user_id)
+        .filter(Booking.is_deleted == False, Booking.status == "completed")
+    )
+    if since:
+        query = query.filter(Booking.end_time > since)
+    if until:
+        query = query.filter(Booking.start_time < until)
+    rows = query.all()
+
+    totals: Dict[tuple, List[float]] = defaultdict(lambda: [0.0, 0])
+    for row in rows:
+        start_time = max(row.start_time, since) if since else row.start_time
+        end_time = min(row.end_time, until) if until else row.end_time
+        for hour, gb_hours in split_gb_hours(start_time, end_time, row.estimated_memory_gb or 0).items():
+            totals[(hour, row.resource_id, row.user_id, row.group or "standard")][0] += gb_hours
+        start_hour = floor_hour(row.start_time)
+        if (not since or start_hour >= since) and (not until or start_hour < until):
+            totals[(start_hour, row.resource_id, row.user_id, row.group or "standard")][1] += 1
+
+    delete_query = db.query(UsageRollupHourly)
+    if since:
+        delete_query = delete_query.filter(UsageRollupHourly.hour >= since)
+    if until:
+        delete_query = delete_query.filter(UsageRollupHourly.hour < until)
+    delete_query.delete(synchronize_session=False)
+    if totals:
+        db.execute(insert(UsageRollupHourly), [
+            {"hour": hour, "resource_id": resource_id, "user_id": user_id, "group": group,
+             "gb_hours": gb_hours, "booking_count": booking_count}
+            for (hour, resource_id, user_id, group), (gb_hours, booking_count) in totals.items()
+        ])
+    db.commit()
+    return len(rows)
+
+
+def summarize(db: Session, start_time: datetime, end_time: datetime, group_by: str = "resource",
+              resource_id: Optional[str] = None, user_id: Optional[str] = None,
+              group: Optional[str] = None) -> List[dict]:
+    """按维度汇总 [start_time, end_time) 内整点行的显存时长与预约数"""
+    if group_by not in GROUP_BY_FIELDS:
+        raise ValueError(f"不支持的汇总维度: {group_by}")
+    key = GROUP_BY_FIELDS[group_by]
+
+    query = (
+        db.query(
+            key.label("key"),
+            func.sum(UsageRollupHourly.gb_hours).label("gb_hours"),
+            func.sum(UsageRollupHourly.booking_count).label("booking_count")
+        )
+        .filter(UsageRollupHourly.hour >= floor_hour(start_time), UsageRollupHourly.hour < end_time)
+    )
+    if resource_id:
+        query = query.filter(UsageRollupHourly.resource_id == resource_id)
+    if user_id:
+        query = query.filter(UsageRollupHourly.user_id == user_id)
+    if group:
+        query = query.filter(UsageRollupHourly.group == group)
+    rows = query.group_by(key).order_by(key).all()
+
+    return [
+        {"key": str(row.key), "gb_hours": round(float(row.gb_hours), 2), "booking_count": int(row.booking_count)}
+        for row in rows
+    ]
@@ -1,16 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional
+from datetime import datetime
 
 from database import get_db
-from auth import require_admin, local_login, create_local_user, get_current_active_user
+from auth import require_admin, local_login, create_local_user_async, get_current_active_user
 from models import User as UserModel, Resource as ResourceModel
 from schemas import (
     AdminUserUpdate, AdminUserList, AdminResourceUpdate, AdminResourceList,
     AdminStats, LocalLogin, LocalUserCreate, SuccessResponse, User, Resource,
-    MemoryUsageCheck
+    MemoryUsageCheck, AuditLogList, AuditSummary, UsageSummary, ResourceHeatmap,
+    DemandForecast
 )
-from services import AdminService
+from services import AdminService, AuditService
+from audit import audit_writer
+import export
 
 router = APIRouter(prefix="/admin", tags=["管理员"])
 
@@ -18,11 +23,13 @@ router = APIRouter(prefix="/admin", tags=["管理员"])
 @router.post("/login", summary="管理员本地登录")
 async def admin_login(
     login_data: LocalLogin,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """管理员通过邮箱密码登录"""
     try:
-        result = local_login(db, login_data.email, login_data.password)
+        client_ip = request.client.host if request.client else None
+        result = await local_login(db, login_data.email, login_data.password, client_ip)
         return result
     except HTTPException:
         raise
@@ -41,7 +48,7 @@ async def create_admin_account(
 ):
     """创建新的管理员账号（只有管理员可以创建）"""
     try:
-        user = create_local_user(
+        user = await create_local_user_async(
             db, 
             user_data.name, 
             user_data.email, 
@@ -75,18 +82,201 @@ async def get_admin_stats(
     stats = service.get_admin_stats()
     return AdminStats(**stats)
 
+# 审计写入队列监控
+@router.get("/audit/queue", summary="获取审计写入队列状态")
+async def get_audit_queue_metrics(
+    current_user: UserModel = Depends(require_admin)
+):
+    """获取异步审计写入队列深度与批量写入统计"""
+    return audit_writer.metrics()
+
+# 审计日志查询
+@router.get("/audit", response_model=AuditLogList, summary="查询预约审计日志")
+async def get_audit_logs(
+    booking_id: Optional[str] = Query(None, description="预约ID"),
+    user_id: Optional[str] = Query(None, description="用户ID"),
+    resource_id: Optional[str] = Query(None, description="资源ID"),
+    action: Optional[str] = Query(None, description="操作类型，如 created、extended、released"),
+    group: Optional[str] = Query(None, description="用户组"),
+    start_time: Optional[datetime] = Query(None, description="开始时间（含）"),
+    end_time: Optional[datetime] = Query(None, description="结束时间（不含）"),
+    cursor: Optional[str] = Query(None, description="分页游标"),
+    limit: int = Query(50, ge=1, le=500, description="每页条数"),
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(require_admin)
+):
+    """按预约、用户、资源、操作和时间范围查询审计日志（游标分页）"""
+    service = AuditService(db)
+    try:
+        return service.get_logs(
+            cursor=cursor, limit=limit, booking_id=booking_id, user_id=user_id,
+            resource_id=resource_id, action=action, group=group,
+            start_time=start_time, end_time=end_time
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.get("/audit/summary", response_model=AuditSummary, summary="审计日志汇总统计")
+async def get_audit_summary(
+    group_by: str = Query("action", description="汇总维度: action, user, resource, group, day"),
+    booking_id: Optional[str] = Query(None, description="预约ID"),
+    user_id: Optional[str] = Query(None, description="用户ID"),
+    resource_id: Optional[str] = Query(None, description="资源ID"),
+    action: Optional[str] = Query(None, description="操作类型"),
+    group: Optional[str] = Query(None, description="用户组"),
+    start_time: Optional[datetime] = Query(None, description="开始时间（含）"),
+    end_time: Optional[datetime] = Query(None, description="结束时间（不含）"),
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(require_admin)
+):
+    """在数据库中按维度汇总审计日志条数和延长/释放小时数"""
+    service = AuditService(db)
+    try:
+        items = service.get_summary(
+            group_by=group_by, booking_id=booking_id, user_id=user_id,
+            resource_id=resource_id, action=action, group=group,
+            start_time=start_time, end_time=end_time
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return AuditSummary(group_by=group_by, items=items)
+
+@router.get("/usage", response_model=UsageSummary, summary="按小时汇总表统计用量")
+async def get_usage_summary(
+    start_time: datetime = Query(..., description="开始时间（含，按整点对齐）"),
+    end_time: datetime = Query(..., description="结束时间（不含）"),
+    group_by: str = Query("resource", description="汇总维度: resource, user, group, day, hour"),
+    resource_id: Optional[str] = Query(None, description="资源ID"),
+    user_id: Optional[str] = Query(None, description="用户ID"),
+    group: Optional[str] = Query(None, description="用户组"),
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(require_admin)
+):
+    """读取预聚合的小时用量（只包含已结束的预约），不扫描 bookings 表"""
+    service = AdminService(db)
+    try:
+        items = service.get_usage_summary(
+            start_time, end_time, group_by=group_by,
+            resource_id=resource_id, user_id=user_id, group=group
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return UsageSummary(group_by=group_by, items=items)
+
+@router.get("/analytics/heatmap", response_model=ResourceHeatmap, summary="资源预约显存热力图")
+async def get_resource_heatmap(
+    weeks: int = Query(4, ge=1, le=53, description="统计最近几周"),
+    bin_by: str = Query("hour_of_week", description="列的划分: hour_of_week（168 列）, day"),
+    end_time: Optional[datetime] = Query(None, description="统计截止时间，默认当前时间"),
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(require_admin)
+):
+    """资源 × 时间段的平均预约显存矩阵，用于容量规划"""
+    service = AdminService(db)
+    try:
+        return service.get_heatmap(weeks, bin_by, end_time)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.get("/analytics/forecast", response_model=DemandForecast, summary="GPU 需求预测报告")
+async def get_demand_forecast(
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(require_admin)
+):
+    """各资源型号的需求预测与扩容方案的预期拒绝率（由 forecast_demand.py 离线生成）"""
+    service = AdminService(db)
+    try:
+        return service.get_demand_forecast()
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+def _export_response(kind: str, fmt: str, gzip: bool, make_stream) -> StreamingResponse:
+    """把导出生成器包装为下载响应"""
+    try:
+        stream = make_stream()
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    filename = export.export_filename(kind, fmt, gzip)
+    return StreamingResponse(
+        stream,
+        media_type=export.media_type(fmt, gzip),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/export/bookings", summary="流式导出预约")
+async def export_bookings(
+    format: str = Query("csv", description="导出格式: csv, jsonl"),
+    gzip: bool = Query(False, description="是否 gzip 压缩"),
+    start_time: Optional[datetime] = Query(None, description="预约开始时间下限（含）"),
+    end_time: Optional[datetime] = Query(None, description="预约开始时间上限（不含）"),
+    resource_id: Optional[str] = Query(None, description="资源ID"),
+    user_id: Optional[str] = Query(None, description="用户ID"),
+    booking_status: Optional[str] = Query(None, alias="status", description="预约状态"),
+    include_deleted: bool = Query(False, description="是否包含已删除的预约"),
+    current_user: UserModel = Depends(require_admin)
+):
+    """按开始时间排序逐批导出预约，内存占用与行数无关"""
+    return _export_response("bookings", format, gzip, lambda: export.stream_bookings(
+        format, gzip, start_time=start_time, end_time=end_time, resource_id=resource_id,
+        user_id=user_id, status=booking_status, include_deleted=include_deleted
+    ))
+
+@router.get("/export/logs", summary="流式导出预约日志")
+async def export_logs(
+    format: str = Query("csv", description="导出格式: csv, jsonl"),
+    gzip: bool = Query(False, description="是否 gzip 压缩"),
+    start_time: Optional[datetime] = Query(None, description="开始时间（含）"),
+    end_time: Optional[datetime] = Query(None, description="结束时间（不含）"),
+    resource_id: Optional[str] = Query(None, description="资源ID"),
+    user_id: Optional[str] = Query(None, description="用户ID"),
+    action: Optional[str] = Query(None, description="操作类型"),
+    booking_id: Optional[str] = Query(None, description="预约ID"),
+    current_user: UserModel = Depends(require_admin)
+):
+    """按时间排序逐批导出预约日志，内存占用与行数无关"""
+    return _export_response("booking_logs", format, gzip, lambda: export.stream_logs(
+        format, gzip, start_time=start_time, end_time=end_time, resource_id=resource_id,
+        user_id=user_id, action=action, booking_id=booking_id
+    ))
+
 # 用户管理
 @router.get("/users", response_model=AdminUserList, summary="获取用户列表")
 async def get_users_list(
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页大小"),
     search: Optional[str] = Query(None, description="搜索关键词"),
+    cursor: Optional[str] = Query(None, description="分页游标，传入时忽略页码"),
+    include_total: bool = Query(True, description="是否返回（缓存的）总数"),
     db: Session = Depends(get_db),
     current_user: UserModel = Depends(require_admin)
 ):
     """获取用户列表（分页和搜索）"""
     service = AdminService(db)
-    result = service.get_users_list(page, page_size, search)
+    try:
+        result = service.get_users_list(page, page_size, search, cursor, include_total)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     return AdminUserList(**result)
 
 @router.put("/users/{user_id}", response_model=User, summary="更新用户信息")
@@ -142,12 +332,20 @@ async def get_resources_list(
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页大小"),
     search: Optional[str] = Query(None, description="搜索关键词"),
+    cursor: Optional[str] = Query(None, description="分页游标，传入时忽略页码"),
+    include_total: bool = Query(True, description="是否返回（缓存的）总数"),
     db: Session = Depends(get_db),
     current_user: UserModel = Depends(require_admin)
 ):
     """获取资源列表（分页和搜索）"""
     service = AdminService(db)
-    result = service.get_resources_list(page, page_size, search)
+    try:
+        result = service.get_resources_list(page, page_size, search, cursor, include_total)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     return AdminResourceList(**result)
 
 @router.post("/resources", response_model=Resource, summary="创建资源")
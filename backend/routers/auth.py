@@ -1,50 +1,49 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.responses import RedirectResponse
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import Optional
 import os
+from urllib.parse import urlencode
 
 from database import get_db
-from auth import create_access_token, get_user_by_email
+from pagination import count_cache
+from auth import (
+    issue_token_pair, rotate_refresh_token, revoke_refresh_token_family, get_user_by_email,
+    invalidate_principal, optional_security, verify_token, revoke_token
+)
 from models import User
-from schemas import Token, SuccessResponse
-from oauth_service import oauth_service, generate_pkce_pair
-
+from schemas import Token, SuccessResponse, RefreshRequest
 router = APIRouter(prefix="/auth", tags=["认证"])
 
+def get_oauth_service():
+    """OAuth服务依赖
+    
+    首次请求OAuth接口时才导入 oauth_service（及 httpx 等依赖）并构建服务，
+    OAuth未配置时只有这些接口返回 503，不影响应用启动和其他接口
+    """
+    from oauth_service import get_oauth_service as build_oauth_service
+    return build_oauth_service()
+
 @router.get("/oauth/authorize", summary="发起OAuth授权")
-async def oauth_authorize():
+async def oauth_authorize(oauth_service=Depends(get_oauth_service)):
     """
     发起OAuth授权流程
     
     重定向用户到OAuth提供商的授权页面
     """
     try:
-        # 生成state参数防CSRF攻击
-        state = oauth_service.generate_state()
-        
-        # 如果启用PKCE，生成代码挑战
-        pkce_data = None
-        code_challenge = None
-        
-        if oauth_service.config.use_pkce:
-            pkce_data = generate_pkce_pair()
-            code_challenge = pkce_data["code_challenge"]
-            
-            # 将code_verifier保存到state中（实际应用中可能需要使用缓存）
-            state = oauth_service.generate_state({
-                "code_verifier": pkce_data["code_verifier"]
-            })
-        
-        # 构建授权URL
-        auth_url = oauth_service.get_authorization_url(state, code_challenge)
+        # 生成state参数防CSRF攻击（启用PKCE时携带code_verifier）并构建授权URL
+        authorization = await oauth_service.build_authorization()
         
         return {
-            "authorization_url": auth_url,
-            "state": state,
+            "authorization_url": authorization["authorization_url"],
+            "state": authorization["state"],
             "provider": oauth_service.config.provider_name
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -56,7 +55,8 @@ async def oauth_callback(
     code: str = Query(..., description="OAuth授权码"),
     state: str = Query(..., description="State参数"),
     error: Optional[str] = Query(None, description="OAuth错误"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    oauth_service=Depends(get_oauth_service)
 ):
     """
     处理OAuth提供商的回调
@@ -75,14 +75,8 @@ async def oauth_callback(
         )
     
     try:
-        # 验证state并提取code_verifier（如果使用PKCE）
-        state_data = oauth_service.verify_state(state)
-        code_verifier = state_data.get("code_verifier")
-        
-        # 完成OAuth流程
-        oauth_user_info = await oauth_service.complete_oauth_flow(
-            code, state, code_verifier
-        )
+        # 完成OAuth流程（验证并消费state，每个state只能使用一次）
+        oauth_user_info = await oauth_service.complete_oauth_flow(code, state)
         
         # 检查必需的用户信息
         email = oauth_user_info.get("email")
@@ -105,19 +99,27 @@ async def oauth_callback(
             db.add(user)
             db.commit()
             db.refresh(user)
+            count_cache.invalidate_prefix("users")
         else:
             # 更新现有用户信息
             if oauth_user_info.get("name"):
                 user.name = oauth_user_info["name"]
                 db.commit()
+                invalidate_principal(user.email)
         
-        # 生成JWT令牌
-        access_token = create_access_token(data={"sub": user.email})
+        # 生成JWT访问令牌和刷新令牌
+        tokens = issue_token_pair(db, user)
+        db.commit()
         
-        # 重定向到前端（带令牌）
+        # 重定向到前端；令牌放在 URL 片段中，片段不会发送给服务器，
+        # 也不会出现在 Referer 和代理访问日志里，前端读取后立即从地址栏清除
         frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
-        redirect_url = f"{frontend_url}?token={access_token}&status=success"
-        return RedirectResponse(url=redirect_url)
+        fragment = urlencode({
+            "token": tokens["access_token"],
+            "refresh_token": tokens["refresh_token"],
+            "status": "success"
+        })
+        return RedirectResponse(url=f"{frontend_url}#{fragment}")
         
     except HTTPException:
         # 重新抛出HTTP异常
@@ -129,36 +131,23 @@ async def oauth_callback(
         return RedirectResponse(url=redirect_url)
 
 @router.get("/oauth/url", summary="获取OAuth授权URL")
-async def get_oauth_url():
+async def get_oauth_url(oauth_service=Depends(get_oauth_service)):
     """
     获取OAuth授权URL
     
     返回前端需要重定向到的OAuth授权URL
     """
     try:
-        # 生成state参数
-        state = oauth_service.generate_state()
-        
-        # 如果启用PKCE，生成代码挑战
-        code_challenge = None
-        if oauth_service.config.use_pkce:
-            pkce_data = generate_pkce_pair()
-            code_challenge = pkce_data["code_challenge"]
-            
-            # 将code_verifier保存到state中
-            state = oauth_service.generate_state({
-                "code_verifier": pkce_data["code_verifier"]
-            })
-        
-        # 构建授权URL
-        auth_url = oauth_service.get_authorization_url(state, code_challenge)
+        authorization = await oauth_service.build_authorization()
         
         return {
-            "oauth_url": auth_url,
+            "oauth_url": authorization["authorization_url"],
             "provider": oauth_service.config.provider_name,
-            "state": state
+            "state": authorization["state"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -166,22 +155,52 @@ async def get_oauth_url():
         )
 
 @router.get("/oauth/provider", summary="获取OAuth提供商信息")
-async def get_oauth_provider():
+async def get_oauth_provider(oauth_service=Depends(get_oauth_service)):
     """获取当前配置的OAuth提供商信息"""
     try:
+        await oauth_service.discover()
         return oauth_service.get_provider_info()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"获取提供商信息失败: {str(e)}"
         )
 
+@router.post("/refresh", response_model=Token, summary="刷新访问令牌")
+async def refresh_access_token(
+    payload: RefreshRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    用刷新令牌换取新的访问令牌和刷新令牌
+    
+    每个刷新令牌只能使用一次；重复使用已轮换的刷新令牌会吊销整个登录会话
+    """
+    return rotate_refresh_token(db, payload.refresh_token)
+
 @router.post("/logout", summary="用户登出")
-async def logout():
+async def logout(
+    payload: Optional[RefreshRequest] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_db)
+):
     """
     用户登出
     
-    由于使用JWT令牌，登出主要在客户端完成
-    服务端可以维护一个黑名单来使令牌失效
+    吊销请求携带的访问令牌，所有进程在数秒内拒绝该令牌；
+    请求体中提供刷新令牌时一并吊销其所在的登录会话。
+    未携带或已失效的令牌直接返回成功
     """
+    if credentials:
+        try:
+            token_data = verify_token(credentials.credentials)
+        except HTTPException:
+            token_data = None
+        if token_data:
+            revoke_token(db, token_data)
+    if payload:
+        revoke_refresh_token_family(db, payload.refresh_token)
+    db.commit()
     return SuccessResponse(message="登出成功")
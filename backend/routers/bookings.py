@@ -1,29 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from typing import List, Optional
 
 from database import get_db
-from auth import get_current_active_user
+from auth import get_current_active_user, get_current_principal
 from models import User
 from schemas import (
     Booking, BookingCreate, BookingUpdate, BookingExtend, BookingRelease,
-    BookingResponse, CalendarResponse, SuccessResponse, ErrorResponse
+    BookingResponse, CalendarResponse, SuccessResponse, ErrorResponse, Principal
 )
 from services import BookingService
+from pagination import next_cursor
 
 router = APIRouter(prefix="/bookings", tags=["预约管理"])
 
 @router.get("/", response_model=List[BookingResponse], summary="获取预约列表")
 async def get_bookings(
+    response: Response,
     skip: int = Query(0, ge=0, description="跳过的记录数"),
     limit: int = Query(100, ge=1, le=1000, description="返回的记录数"),
-    current_user: User = Depends(get_current_active_user),
+    cursor: Optional[str] = Query(None, description="分页游标（来自上一页响应头 X-Next-Cursor）"),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    """获取当前用户的预约列表"""
+    """获取当前用户的预约列表
+
+    下一页游标通过响应头 X-Next-Cursor 返回，最后一页不返回该头。
+    """
     service = BookingService(db)
-    bookings = service.get_bookings(user_id=current_user.id, skip=skip, limit=limit)
+    try:
+        bookings = service.get_bookings(user_id=current_user.id, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    cursor_value = next_cursor(bookings, limit)
+    if cursor_value:
+        response.headers["X-Next-Cursor"] = cursor_value
     
     return [
         BookingResponse(
@@ -53,7 +69,7 @@ async def create_booking(
     service = BookingService(db)
     
     try:
-        db_booking = service.create_booking(booking, current_user.id)
+        db_booking = service.create_booking(booking, current_user)
         
         return BookingResponse(
             id=db_booking.id,
@@ -78,7 +94,7 @@ async def create_booking(
 @router.get("/{booking_id}", response_model=BookingResponse, summary="获取预约详情")
 async def get_booking(
     booking_id: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取指定预约的详情"""
@@ -117,7 +133,7 @@ async def update_booking(
     service = BookingService(db)
     
     try:
-        updated_booking = service.update_booking(booking_id, booking_update, current_user.id)
+        updated_booking = service.update_booking(booking_id, booking_update, current_user)
         
         if not updated_booking:
             raise HTTPException(
@@ -251,7 +267,7 @@ async def release_booking(
 async def get_calendar_data(
     start_date: datetime = Query(..., description="开始日期"),
     end_date: datetime = Query(..., description="结束日期"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取指定时间范围的日历数据"""
@@ -278,7 +294,7 @@ async def get_calendar_data(
 @router.get("/calendar/week", response_model=CalendarResponse, summary="获取周日历数据")
 async def get_week_calendar(
     week_start: Optional[datetime] = Query(None, description="周开始日期，默认为当前周"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取指定周的日历数据"""
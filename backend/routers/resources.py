@@ -4,9 +4,8 @@ from datetime import datetime, timedelta
 from typing import List
 
 from database import get_db
-from auth import get_current_active_user, check_user_permissions
-from models import User
-from schemas import Resource, ResourceStats, SuccessResponse, ResourceAvailability
+from auth import get_current_principal, check_user_permissions
+from schemas import Resource, ResourceStats, SuccessResponse, ResourceAvailability, Principal
 from services import ResourceService
 
 router = APIRouter(prefix="/resources", tags=["资源管理"])
@@ -14,7 +13,7 @@ router = APIRouter(prefix="/resources", tags=["资源管理"])
 @router.get("/", response_model=List[Resource], summary="获取资源列表")
 async def get_resources(
     active_only: bool = Query(True, description="仅返回活跃资源"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取所有可用的GPU资源"""
@@ -22,10 +21,39 @@ async def get_resources(
     resources = service.get_resources(active_only=active_only)
     return resources
 
+def _validate_stats_range(start_date: datetime, end_date: datetime) -> None:
+    """验证统计的日期范围"""
+    if start_date >= end_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="开始日期必须早于结束日期"
+        )
+    
+    # 限制查询范围（最多一年）
+    max_range = timedelta(days=366)
+    if end_date - start_date > max_range:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="查询范围不能超过一年"
+        )
+
+@router.get("/stats", response_model=List[ResourceStats], summary="获取所有资源统计")
+async def get_all_resource_stats(
+    start_date: datetime = Query(..., description="统计开始日期"),
+    end_date: datetime = Query(..., description="统计结束日期"),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """获取所有资源的使用统计（一次聚合查询）"""
+    _validate_stats_range(start_date, end_date)
+    
+    service = ResourceService(db)
+    return service.get_all_resource_stats(start_date, end_date)
+
 @router.get("/{resource_id}", response_model=Resource, summary="获取资源详情")
 async def get_resource(
     resource_id: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取指定资源的详细信息"""
@@ -45,50 +73,27 @@ async def get_resource_stats(
     resource_id: str,
     start_date: datetime = Query(..., description="统计开始日期"),
     end_date: datetime = Query(..., description="统计结束日期"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    """获取资源使用统计"""
-    # 验证日期范围
-    if start_date >= end_date:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="开始日期必须早于结束日期"
-        )
-    
-    # 限制查询范围（最多一年）
-    max_range = timedelta(days=365)
-    if end_date - start_date > max_range:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="查询范围不能超过一年"
-        )
+    """获取资源使用统计（显存时长加权的利用率）"""
+    _validate_stats_range(start_date, end_date)
     
     service = ResourceService(db)
-    resource = service.get_resource(resource_id)
-    
-    if not resource:
+    try:
+        return service.get_resource_stats(resource_id, start_date, end_date)
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="资源不存在"
+            detail=str(e)
         )
-    
-    stats = service.get_resource_stats(resource_id, start_date, end_date)
-    
-    return ResourceStats(
-        resource_id=resource_id,
-        resource_name=resource.name,
-        total_bookings=stats["total_bookings"],
-        utilization_rate=stats["utilization_rate"],
-        total_hours=stats["total_hours"]
-    )
 
 @router.get("/{resource_id}/availability", summary="检查资源可用性")
 async def check_resource_availability(
     resource_id: str,
     start_time: datetime = Query(..., description="检查开始时间"),
     end_time: datetime = Query(..., description="检查结束时间"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """检查资源在指定时间段的可用性"""
@@ -134,7 +139,7 @@ async def check_resource_memory(
     estimated_memory_gb: float = Query(..., description="预估显存需求(GB)"),
     start_time: datetime = Query(..., description="开始时间"),
     end_time: datetime = Query(..., description="结束时间"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """检查资源在指定时间段的显存可用性"""
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from datetime import datetime
 
 from database import get_db
-from auth import get_current_active_user, get_max_extend_hours
+from auth import get_current_active_user, get_current_principal, get_max_extend_hours, invalidate_principal
 from models import User
-from schemas import User as UserSchema, BookingStats, SuccessResponse
+from schemas import User as UserSchema, BookingStats, QuotaStatus, SuccessResponse, Principal
 from services import UserService
+from policy import get_policy
+import quota
 
 router = APIRouter(prefix="/users", tags=["用户管理"])
 
@@ -18,7 +21,7 @@ async def get_current_user_info(
 
 @router.get("/me/stats", response_model=BookingStats, summary="获取用户统计")
 async def get_user_stats(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """获取当前用户的预约统计信息"""
@@ -34,6 +37,14 @@ async def get_user_stats(
         used_hours=stats["used_hours"]
     )
 
+@router.get("/me/quota", response_model=QuotaStatus, summary="获取显存时长配额")
+async def get_user_quota(
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """获取当前用户滚动窗口内的显存时长（GB·小时）用量与剩余配额"""
+    return quota.get_status(db, current_user.id, current_user.group, datetime.utcnow())
+
 @router.get("/me/permissions", summary="获取用户权限信息")
 async def get_user_permissions(
     current_user: User = Depends(get_current_active_user)
@@ -49,25 +60,13 @@ async def get_user_permissions(
         "can_manage_users": current_user.group in ["admin"]
     }
     
-    # 根据用户组设置不同的权限
-    if current_user.group == "standard":
-        permissions.update({
-            "max_booking_duration": 8,  # 最长预约8小时
-            "max_advance_days": 7,      # 最多提前7天预约
-            "max_concurrent_bookings": 2  # 最多同时2个预约
-        })
-    elif current_user.group == "premium":
-        permissions.update({
-            "max_booking_duration": 24,  # 最长预约24小时
-            "max_advance_days": 14,      # 最多提前14天预约
-            "max_concurrent_bookings": 5  # 最多同时5个预约
-        })
-    elif current_user.group == "admin":
-        permissions.update({
-            "max_booking_duration": -1,  # 无限制
-            "max_advance_days": -1,      # 无限制
-            "max_concurrent_bookings": -1  # 无限制
-        })
+    # 根据用户组设置不同的限制（-1 表示无限制），与预约准入使用同一份策略
+    group_policy = get_policy(current_user.group)
+    permissions.update({
+        "max_booking_duration": group_policy["max_booking_duration"],
+        "max_advance_days": group_policy["max_advance_days"],
+        "max_concurrent_bookings": group_policy["max_concurrent_bookings"]
+    })
     
     return {
         "user_id": current_user.id,
@@ -86,12 +85,13 @@ async def update_user_profile(
         current_user.name = name.strip()
         db.commit()
         db.refresh(current_user)
+        invalidate_principal(current_user.email)
     
     return current_user
 
 @router.get("/me/extend-limits", summary="获取延长时间限制")
 async def get_extend_limits(
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """获取当前用户的延长时间限制"""
     max_hours = get_max_extend_hours(current_user)
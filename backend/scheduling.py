@@ -0,0 +1,91 @@
+"""
+显存时间线计算
+
+基于一次查询得到的重叠预约（start_time、end_time、estimated_memory_gb），
+在内存中扫描时间线计算某个时间段内的显存占用峰值，
+并为高优先级预约挑选需要抢占的低优先级预约。
+"""
+
+from datetime import datetime
+from itertools import combinations
+from typing import Callable, List, Optional, Sequence
+
+# 候选预约不超过该数量时穷举求最优解，否则使用贪心近似
+EXACT_SEARCH_LIMIT = 12
+
+
+def peak_usage(bookings: Sequence, start_time: datetime, end_time: datetime) -> int:
+    """[start_time, end_time) 内同时占用显存的峰值（区间左闭右开）"""
+    events = []
+    for booking in bookings:
+        begin = max(booking.start_time, start_time)
+        finish = min(booking.end_time, end_time)
+        if begin < finish:
+            events.append((begin, 1, booking.estimated_memory_gb))
+            events.append((finish, 0, -booking.estimated_memory_gb))
+    # 同一时刻先结束后开始
+    events.sort(key=lambda event: (event[0], event[1]))
+    peak = current = 0
+    for _, _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def gb_hours(booking) -> float:
+    """预约的显存时长（GB·小时）"""
+    return max((booking.end_time - booking.start_time).total_seconds(), 0) / 3600 * booking.estimated_memory_gb
+
+
+def plan_preemption(bookings: Sequence, total_memory_gb: int, required_memory_gb: int,
+                    start_time: datetime, end_time: datetime,
+                    can_preempt: Callable[[object], bool]) -> Optional[List]:
+    """挑选被抢占的预约，使新预约在 [start_time, end_time) 内放得下
+
+    在可抢占的预约中选出一组，使剩余预约的峰值 + 新预约显存不超过总显存，
+    并让被挤占的显存时长（GB·小时）尽量少。无需抢占时返回空列表，无法满足时返回 None。
+    """
+    def fits(removed_ids) -> bool:
+        remaining = [b for b in bookings if b.id not in removed_ids]
+        return peak_usage(remaining, start_time, end_time) + required_memory_gb <= total_memory_gb
+
+    if fits(set()):
+        return []
+
+    candidates = [b for b in bookings if can_preempt(b)]
+    if not candidates or not fits({b.id for b in candidates}):
+        return None
+
+    if len(candidates) <= EXACT_SEARCH_LIMIT:
+        best, best_cost = None, None
+        for size in range(1, len(candidates) + 1):
+            for subset in combinations(candidates, size):
+                cost = sum(gb_hours(b) for b in subset)
+                if best_cost is not None and cost >= best_cost:
+                    continue
+                if fits({b.id for b in subset}):
+                    best, best_cost = list(subset), cost
+        return best
+
+    # 贪心：每次移除单位显存时长降低峰值最多的预约，直到放得下
+    removed: List = []
+    removed_ids = set()
+    remaining_candidates = list(candidates)
+    while not fits(removed_ids):
+        current_peak = peak_usage([b for b in bookings if b.id not in removed_ids], start_time, end_time)
+
+        def gain(booking) -> float:
+            trial = [b for b in bookings if b.id not in removed_ids and b.id != booking.id]
+            reduced = current_peak - peak_usage(trial, start_time, end_time)
+            return reduced / max(gb_hours(booking), 1e-9)
+
+        choice = max(remaining_candidates, key=gain)
+        remaining_candidates.remove(choice)
+        removed.append(choice)
+        removed_ids.add(choice.id)
+
+    # 去掉多余的抢占：代价从高到低尝试放回
+    for booking in sorted(removed, key=gb_hours, reverse=True):
+        if fits(removed_ids - {booking.id}):
+            removed_ids.discard(booking.id)
+    return [b for b in removed if b.id in removed_ids]
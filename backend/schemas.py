@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 
 # 基础模式
@@ -96,11 +96,82 @@ class BookingLog(BaseModel):
     booking_id: str
     action: str
     details: Optional[str] = None
+    data: Optional[dict] = None
+    user_id: Optional[str] = None
+    resource_id: Optional[str] = None
+    actor_id: Optional[str] = None
     timestamp: datetime
     
     class Config:
         from_attributes = True
 
+# 审计查询模式
+class AuditLogList(BaseModel):
+    logs: List[BookingLog]
+    next_cursor: Optional[str] = None  # 下一页游标，最后一页为空
+
+class AuditSummaryItem(BaseModel):
+    key: Optional[str] = None
+    count: int
+    extended_hours: float  # 延长小时数合计
+    released_hours: float  # 提前释放小时数合计
+
+class AuditSummary(BaseModel):
+    group_by: str
+    items: List[AuditSummaryItem]
+
+# 小时汇总用量查询模式
+class UsageSummaryItem(BaseModel):
+    key: Optional[str] = None
+    gb_hours: float  # 显存时长合计（GB·小时）
+    booking_count: int  # 区间内开始的预约数
+
+class UsageSummary(BaseModel):
+    group_by: str
+    items: List[UsageSummaryItem]
+
+# 容量规划热力图：行为资源，列为一周中的小时或自然日
+class ResourceHeatmap(BaseModel):
+    bin_by: str
+    start_time: datetime
+    end_time: datetime
+    resources: List[str]
+    total_memory_gb: List[int]
+    values: List[List[float]]  # 平均预约显存（GB）
+
+# 需求预测报告
+class CapacityScenario(BaseModel):
+    extra_cards: int
+    capacity_gb: int
+    expected_rejection_rate: float  # 超出总显存的需求占比
+
+class ForecastWeek(BaseModel):
+    week_start: datetime
+    mean_demand_gb: float
+    peak_demand_gb: float
+
+class ResourceClassForecast(BaseModel):
+    resource_class: str
+    resources: List[str]
+    capacity_gb: int
+    card_memory_gb: int
+    mean_demand_gb: float
+    trend_gb_per_week: float
+    served_gb_hours: float
+    rejected_gb_hours: float
+    rejections: int
+    baseline: List[float]  # 一周中各小时的平均需求（GB），周一 0 点起 168 个值
+    forecast: List[ForecastWeek]
+    scenarios: List[CapacityScenario]
+
+class DemandForecast(BaseModel):
+    generated_at: datetime
+    history_start: datetime
+    history_end: datetime
+    history_weeks: int
+    horizon_weeks: int
+    classes: List[ResourceClassForecast]
+
 # API响应模式
 class BookingResponse(BaseModel):
     id: str
@@ -151,12 +222,30 @@ class BookingStats(BaseModel):
     total_hours: float
     used_hours: float
 
+class QuotaDay(BaseModel):
+    day: date
+    gb_hours: float
+
+class QuotaStatus(BaseModel):
+    """滚动窗口显存时长配额（limit/remaining 为空表示不限制）"""
+    window_days: int
+    limit_gb_hours: Optional[float] = None
+    used_gb_hours: float  # 截至今天的窗口用量
+    peak_gb_hours: float  # 含已预约未来时段的窗口峰值
+    remaining_gb_hours: Optional[float] = None
+    daily: List[QuotaDay]
+
 class ResourceStats(BaseModel):
     resource_id: str
     resource_name: str
     total_bookings: int
-    utilization_rate: float
-    total_hours: float
+    utilization_rate: float  # 显存时长利用率（%）= 已预约显存时长 / 可用显存时长
+    total_hours: float  # 区间内的预约小时数之和
+    total_memory_gb: int = 0
+    gb_hours_used: float = 0.0
+    gb_hours_available: float = 0.0
+    period_start: Optional[datetime] = None
+    period_end: Optional[datetime] = None
 
 class SystemStats(BaseModel):
     total_users: int
@@ -167,10 +256,26 @@ class SystemStats(BaseModel):
 # OAuth相关模式
 class TokenData(BaseModel):
     email: Optional[str] = None
+    user_id: Optional[str] = None  # uid 声明
+    group: Optional[str] = None    # grp 声明
+    version: Optional[int] = None  # ver 声明，签发时的用户令牌版本
+    jti: Optional[str] = None      # 令牌唯一标识，用于吊销
+    expires_at: Optional[datetime] = None
+
+class Principal(BaseModel):
+    """由令牌声明得到的轻量认证主体（只读接口使用）"""
+    id: str
+    email: str
+    group: str
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # 访问令牌有效期（秒）
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class UserLogin(BaseModel):
     email: str
@@ -195,9 +300,10 @@ class AdminUserUpdate(BaseModel):
 
 class AdminUserList(BaseModel):
     users: List[User]
-    total: int
+    total: Optional[int] = None  # 缓存的近似总数，include_total=false 时为空
     page: int
     page_size: int
+    next_cursor: Optional[str] = None  # 下一页游标，最后一页为空
 
 class AdminResourceUpdate(BaseModel):
     name: Optional[str] = None
@@ -207,9 +313,10 @@ class AdminResourceUpdate(BaseModel):
 
 class AdminResourceList(BaseModel):
     resources: List[Resource]
-    total: int
+    total: Optional[int] = None  # 缓存的近似总数，include_total=false 时为空
     page: int
     page_size: int
+    next_cursor: Optional[str] = None  # 下一页游标，最后一页为空
 
 class AdminStats(BaseModel):
     total_users: int
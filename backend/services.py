@@ -1,12 +1,56 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, func, case, select
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional
+import os
 import uuid
 
-from models import Booking, BookingLog, Resource, User
+from dotenv import load_dotenv
+
+from models import AdmissionRejection, Booking, BookingLog, Resource, User
+from pagination import apply_keyset, next_cursor, count_cache
+from ids import new_id
+from queries import CONFLICTING_BOOKINGS, CALENDAR_BOOKINGS, OCCUPYING_STATUSES
+from audit import audit_writer
+import metrics
+import policy
+import quota
+import rollup
+import forecast
+from scheduling import peak_usage, plan_preemption
+from analytics import hours_between, reserved_memory_heatmap, resource_utilization
+from auth import invalidate_principal, bump_token_version, revoke_refresh_tokens
+from cache import TTLCache
 from schemas import BookingCreate, BookingUpdate, BookingExtend, CalendarResponse, CalendarSlot, BookingResponse, ResourceStats
 
+load_dotenv()
+
+# 管理员仪表盘统计缓存（秒，0 表示禁用）；预约、用户、资源写入后立即失效
+ADMIN_STATS_CACHE_TTL = float(os.getenv("ADMIN_STATS_CACHE_TTL", "10"))
+admin_stats_cache = TTLCache(maxsize=1, ttl_seconds=ADMIN_STATS_CACHE_TTL)
+
+
+def invalidate_admin_stats() -> None:
+    """使管理员统计缓存失效（只删除一个内存条目，不访问数据库）"""
+    admin_stats_cache.invalidate("admin_stats")
+
+
+def _to_naive_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    """将时区感知的 datetime 转为无时区的 UTC 时间"""
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _serialize_log_data(data: Optional[dict]) -> Optional[dict]:
+    """将日志详情中的 datetime 转为 ISO 字符串，便于存入 JSON 列"""
+    if data is None:
+        return None
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in data.items()
+    }
+
 
 class BookingService:
     def __init__(self, db: Session):
@@ -44,17 +88,23 @@ class BookingService:
         # 检查结束时间必须晚于开始时间
         if end_time <= start_time:
             raise ValueError("预约结束时间必须晚于开始时间")
-        
-        # 检查预约时长不能超过24小时
-        duration = end_time - start_time
-        if duration > timedelta(hours=24):
-            raise ValueError("单次预约时长不能超过24小时")
+        # 预约时长等按用户组的限制由 policy 校验
+
+    def _load_timeline(self, resource_id: str, start_time: datetime, end_time: datetime,
+                       exclude_booking_id: str = None) -> list:
+        """与时间段重叠且占用显存的预约（id、用户、显存、起止时间、状态）"""
+        return self.db.execute(CONFLICTING_BOOKINGS, {
+            "resource_id": resource_id,
+            "start_time": start_time,
+            "end_time": end_time,
+            "exclude_booking_id": exclude_booking_id or ""
+        }).all()
 
     def _check_memory_availability(self, resource_id: str, start_time: datetime = None, end_time: datetime = None, 
                                  required_memory_gb: int = None, exclude_booking_id: str = None) -> dict:
         """检查资源显存可用性"""
-        # 获取资源信息
-        resource = self.db.query(Resource).filter(Resource.id == resource_id).first()
+        # 获取资源信息（优先命中会话的标识映射）
+        resource = self.db.get(Resource, resource_id)
         if not resource:
             raise ValueError("资源不存在")
         
@@ -64,24 +114,12 @@ class BookingService:
             start_time = current_time
             end_time = current_time + timedelta(hours=1)  # 默认检查1小时
         
-        # 查找在指定时间段内有冲突的预约
-        query = self.db.query(Booking).filter(
-            Booking.resource_id == resource_id,
-            Booking.is_deleted == False,
-            Booking.status.in_(["upcoming", "active"]),
-            # 时间重叠检查
-            Booking.start_time < end_time,
-            Booking.end_time > start_time
-        )
-        
+        # 查找在指定时间段内有冲突的预约（时间重叠且占用显存），
         # 如果是更新预约，排除当前预约
-        if exclude_booking_id:
-            query = query.filter(Booking.id != exclude_booking_id)
-            
-        conflicting_bookings = query.all()
+        conflicting_bookings = self._load_timeline(resource_id, start_time, end_time, exclude_booking_id)
         
-        # 计算已使用的显存
-        used_memory = sum(booking.estimated_memory_gb for booking in conflicting_bookings)
+        # 计算时间段内同时占用显存的峰值（不重叠的预约不会同时占用）
+        used_memory = peak_usage(conflicting_bookings, start_time, end_time)
         available_memory = resource.total_memory_gb - used_memory
         
         result = {
@@ -250,16 +288,20 @@ class BookingService:
                 'last_updated': current_time.isoformat()
             }
 
-    def get_bookings(self, user_id: str, skip: int = 0, limit: int = 100) -> List[Booking]:
-        """获取用户的预约列表"""
-        return (
-            self.db.query(Booking)
-            .filter(Booking.user_id == user_id, Booking.is_deleted == False)
-            .order_by(Booking.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
+    def get_bookings(self, user_id: str, skip: int = 0, limit: int = 100,
+                     cursor: Optional[str] = None) -> List[Booking]:
+        """获取用户的预约列表
+
+        传入 cursor 时使用 (created_at, id) 键集分页并忽略 skip。
+        """
+        query = apply_keyset(
+            self.db.query(Booking).filter(Booking.user_id == user_id, Booking.is_deleted == False),
+            Booking,
+            cursor
         )
+        if not cursor and skip:
+            query = query.offset(skip)
+        return query.limit(limit).all()
 
     def get_booking(self, booking_id: str, user_id: str) -> Optional[Booking]:
         """获取指定预约详情"""
@@ -273,16 +315,17 @@ class BookingService:
             .first()
         )
 
-    def create_booking(self, booking: BookingCreate, user_id: str) -> Booking:
+    def create_booking(self, booking: BookingCreate, current_user: User) -> Booking:
         """创建新预约"""
+        user_id = current_user.id
         # 标准化时间格式（确保为UTC无时区）
         start_time = self._ensure_timezone_naive(booking.start_time)
         end_time = self._ensure_timezone_naive(booking.end_time)
         
         # 验证预约时间
         self._validate_booking_time(start_time, end_time)
-
-        # 检查资源是否存在且可用
+        
+        # 检查资源是否存在且可用（先于准入检查，拒绝计数只记录已存在的资源）
         resource = self.db.query(Resource).filter(
             Resource.id == booking.resource_id,
             Resource.is_active == True
@@ -290,6 +333,20 @@ class BookingService:
         if not resource:
             raise ValueError("资源不存在或不可用")
 
+        # 用户组策略准入（时长、提前天数、并发预约数）与滚动窗口配额
+        try:
+            policy.check_create(self.db, user_id, current_user.group, start_time, end_time,
+                                self._get_current_time())
+        except ValueError:
+            metrics.ADMISSIONS_REJECTED.inc(resource.id, "policy")
+            raise
+        try:
+            quota.check(self.db, user_id, current_user.group, start_time, end_time,
+                        booking.estimated_memory_gb)
+        except ValueError:
+            metrics.ADMISSIONS_REJECTED.inc(resource.id, "quota")
+            raise
+
         # 检查显存可用性
         memory_check = self._check_memory_availability(
             booking.resource_id, 
@@ -297,17 +354,33 @@ class BookingService:
             end_time, 
             booking.estimated_memory_gb
         )
+        preempted = []
         if not memory_check["can_book"]:
-            raise ValueError(
-                f"显存不足！需要 {booking.estimated_memory_gb}GB，"
-                f"可用 {memory_check['available_memory_gb']}GB"
-            )
+            # 高优先级用户可以抢占低优先级用户未开始的预约
+            preempted = self._plan_preemption(resource, start_time, end_time,
+                                              booking.estimated_memory_gb, current_user)
+            if preempted is None:
+                # 记录被拒绝的需求（供需求预测使用），单独提交后再拒绝
+                self.db.add(AdmissionRejection(
+                    resource_id=resource.id,
+                    user_id=user_id,
+                    start_time=start_time,
+                    end_time=end_time,
+                    requested_memory_gb=booking.estimated_memory_gb,
+                    available_memory_gb=memory_check["available_memory_gb"]
+                ))
+                self.db.commit()
+                metrics.ADMISSIONS_REJECTED.inc(resource.id, "memory")
+                raise ValueError(
+                    f"显存不足！需要 {booking.estimated_memory_gb}GB，"
+                    f"可用 {memory_check['available_memory_gb']}GB"
+                )
         # 显存检查已经包含了必要的冲突检查
         # 移除传统的时间冲突检查，因为现在允许多个预约共享同一资源（只要显存够）
         
         # 创建预约
         db_booking = Booking(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             user_id=user_id,
             resource_id=booking.resource_id,
             task_name=booking.task_name,
@@ -319,18 +392,78 @@ class BookingService:
         )
 
         self.db.add(db_booking)
+        policy.adjust_counters(self.db, user_id, upcoming=1)
+        quota.record(self.db, user_id, current_user.group, start_time, end_time,
+                     booking.estimated_memory_gb)
         
         # 记录日志
-        self._create_booking_log(db_booking.id, "created", f"创建预约: {booking.task_name}")
+        self._create_booking_log(db_booking, "created", f"创建预约: {booking.task_name}", {
+            "task_name": booking.task_name,
+            "estimated_memory_gb": booking.estimated_memory_gb,
+            "start_time": start_time,
+            "new_end_time": end_time
+        })
+        
+        # 与新预约在同一事务内取消被抢占的预约
+        for victim_id in preempted:
+            self._preempt_booking(victim_id, db_booking, current_user)
         
         self.db.commit()
+        invalidate_admin_stats()
+        metrics.ADMISSIONS_ACCEPTED.inc(resource.id)
         self.db.refresh(db_booking)
         
         return db_booking
 
-    def update_booking(self, booking_id: str, booking_update: BookingUpdate, user_id: str) -> Optional[Booking]:
+    def _plan_preemption(self, resource: Resource, start_time: datetime, end_time: datetime,
+                         required_memory_gb: int, current_user: User) -> Optional[List[str]]:
+        """计算需要抢占的预约ID，无法抢占或抢占也放不下时返回 None"""
+        requester_policy = policy.get_policy(current_user.group)
+        if not requester_policy["can_preempt"]:
+            return None
+        requester_priority = requester_policy["priority"]
+        
+        timeline = self._load_timeline(resource.id, start_time, end_time)
+        owner_ids = {row.user_id for row in timeline if row.status == "upcoming"}
+        owner_groups = dict(
+            self.db.query(User.id, User.group).filter(User.id.in_(owner_ids)).all()
+        ) if owner_ids else {}
+        
+        def can_preempt(row) -> bool:
+            # 只抢占优先级更低的用户尚未开始的预约
+            owner_priority = policy.get_policy(owner_groups.get(row.user_id, "standard"))["priority"]
+            return row.status == "upcoming" and owner_priority < requester_priority
+        
+        plan = plan_preemption(timeline, resource.total_memory_gb, required_memory_gb,
+                               start_time, end_time, can_preempt)
+        return None if plan is None else [row.id for row in plan]
+
+    def _preempt_booking(self, booking_id: str, preemptor: Booking, current_user: User) -> None:
+        """取消被抢占的预约，归还其计数器与配额，并写入审计日志通知预约所有者"""
+        victim = self.db.get(Booking, booking_id)
+        victim.status = "cancelled"
+        victim.updated_at = datetime.utcnow()
+        policy.adjust_counters(self.db, victim.user_id, upcoming=-1)
+        quota.record(self.db, victim.user_id, victim.user.group, victim.start_time,
+                     victim.end_time, victim.estimated_memory_gb, sign=-1)
+        self._create_booking_log(
+            victim,
+            "preempted",
+            f"预约被更高优先级的预约抢占: {preemptor.task_name}",
+            {
+                "old_status": "upcoming",
+                "new_status": "cancelled",
+                "preempted_by": preemptor.id,
+                "preempted_by_user": current_user.id,
+                "gb_hours": (victim.end_time - victim.start_time).total_seconds() / 3600
+                            * victim.estimated_memory_gb
+            },
+            actor_id=current_user.id
+        )
+
+    def update_booking(self, booking_id: str, booking_update: BookingUpdate, current_user: User) -> Optional[Booking]:
         """更新预约信息（仅限未开始的预约）"""
-        db_booking = self.get_booking(booking_id, user_id)
+        db_booking = self.get_booking(booking_id, current_user.id)
         if not db_booking:
             return None
 
@@ -338,6 +471,8 @@ class BookingService:
         if db_booking.status != "upcoming":
             raise ValueError("只能更新未开始的预约")
 
+        old_end_time = db_booking.end_time
+
         # 更新字段
         if booking_update.task_name is not None:
             db_booking.task_name = booking_update.task_name
@@ -349,6 +484,7 @@ class BookingService:
             # 检查新的结束时间是否合理
             if new_end_time <= db_booking.start_time:
                 raise ValueError("结束时间必须晚于开始时间")
+            policy.check_duration(current_user.group, db_booking.start_time, new_end_time)
 
             # 检查显存可用性（包括时间重叠和显存限制）
             memory_check = self._check_memory_availability(
@@ -364,12 +500,26 @@ class BookingService:
                     f"可用 {memory_check['available_memory_gb']}GB"
                 )
 
+            # 配额按新旧结束时间之间的差额调整
+            if new_end_time > old_end_time:
+                quota.check(self.db, current_user.id, current_user.group, old_end_time,
+                            new_end_time, db_booking.estimated_memory_gb)
+                quota.record(self.db, current_user.id, current_user.group, old_end_time,
+                             new_end_time, db_booking.estimated_memory_gb)
+            else:
+                quota.record(self.db, current_user.id, current_user.group, new_end_time,
+                             old_end_time, db_booking.estimated_memory_gb, sign=-1)
+
             db_booking.end_time = new_end_time
 
         db_booking.updated_at = datetime.utcnow()
         
         # 记录日志
-        self._create_booking_log(booking_id, "updated", "更新预约信息")
+        self._create_booking_log(db_booking, "updated", "更新预约信息", {
+            "task_name": db_booking.task_name,
+            "old_end_time": old_end_time,
+            "new_end_time": db_booking.end_time
+        })
         
         self.db.commit()
         self.db.refresh(db_booking)
@@ -390,11 +540,18 @@ class BookingService:
         db_booking.is_deleted = True
         db_booking.status = "cancelled"
         db_booking.updated_at = datetime.utcnow()
+        policy.adjust_counters(self.db, user_id, upcoming=-1)
+        quota.record(self.db, user_id, db_booking.user.group, db_booking.start_time,
+                     db_booking.end_time, db_booking.estimated_memory_gb, sign=-1)
         
         # 记录日志
-        self._create_booking_log(booking_id, "cancelled", "用户取消预约")
+        self._create_booking_log(db_booking, "cancelled", "用户取消预约", {
+            "old_status": "upcoming",
+            "new_status": "cancelled"
+        })
         
         self.db.commit()
+        invalidate_admin_stats()
         
         return True
 
@@ -407,9 +564,14 @@ class BookingService:
         # 只允许延长正在进行的预约
         if db_booking.status != "active":
             raise ValueError("只能延长正在进行的预约")
+        
+        policy.check_extend(current_user.group, extend_data.hours)
 
-        # 计算新的结束时间
+        # 计算新的结束时间；多次延长后的总时长同样不能超过用户组的单次预约上限
         new_end_time = db_booking.end_time + timedelta(hours=extend_data.hours)
+        policy.check_duration(current_user.group, db_booking.start_time, new_end_time)
+        quota.check(self.db, current_user.id, current_user.group, db_booking.end_time,
+                    new_end_time, db_booking.estimated_memory_gb)
 
         # 检查显存可用性（包括时间重叠和显存限制）
         memory_check = self._check_memory_availability(
@@ -426,14 +588,18 @@ class BookingService:
             )
 
         # 更新结束时间
+        old_end_time = db_booking.end_time
         db_booking.end_time = new_end_time
         db_booking.updated_at = datetime.utcnow()
+        quota.record(self.db, current_user.id, current_user.group, old_end_time,
+                     new_end_time, db_booking.estimated_memory_gb)
         
         # 记录日志
         self._create_booking_log(
-            booking_id, 
+            db_booking, 
             "extended", 
-            f"延长预约 {extend_data.hours} 小时，新结束时间: {new_end_time}"
+            f"延长预约 {extend_data.hours} 小时，新结束时间: {new_end_time}",
+            {"hours": extend_data.hours, "old_end_time": old_end_time, "new_end_time": new_end_time}
         )
         
         self.db.commit()
@@ -453,18 +619,32 @@ class BookingService:
 
         # 设置结束时间为当前时间
         current_time = datetime.utcnow()
+        old_end_time = db_booking.end_time
         db_booking.end_time = current_time
         db_booking.status = "completed"
         db_booking.updated_at = current_time
+        policy.adjust_counters(self.db, user_id, active=-1)
+        # 归还未使用的时长
+        quota.record(self.db, user_id, db_booking.user.group, current_time, old_end_time,
+                     db_booking.estimated_memory_gb, sign=-1)
+        rollup.record(self.db, db_booking, db_booking.user.group)
         
         # 记录日志
         self._create_booking_log(
-            booking_id, 
+            db_booking, 
             "released", 
-            f"用户主动释放剩余时间，实际结束时间: {current_time}"
+            f"用户主动释放剩余时间，实际结束时间: {current_time}",
+            {
+                "old_end_time": old_end_time,
+                "new_end_time": current_time,
+                "released_hours": max((old_end_time - current_time).total_seconds() / 3600, 0),
+                "old_status": "active",
+                "new_status": "completed"
+            }
         )
         
         self.db.commit()
+        invalidate_admin_stats()
         self.db.refresh(db_booking)
         
         return db_booking
@@ -478,16 +658,14 @@ class BookingService:
         # 获取所有资源
         resources = self.db.query(Resource).filter(Resource.is_active == True).all()
         
-        # 获取时间范围内的所有预约
-        bookings = (
-            self.db.query(Booking)
-            .filter(
-                Booking.is_deleted == False,
-                Booking.start_time < end_date,
-                Booking.end_time > start_date
-            )
-            .all()
-        )
+        # 获取时间范围内的所有预约（连同资源名称一次查出）
+        booking_responses = [
+            BookingResponse(**row._mapping)
+            for row in self.db.execute(CALENDAR_BOOKINGS, {
+                "start_date": start_date,
+                "end_date": end_date
+            })
+        ]
 
         # 生成时间槽
         slots = []
@@ -498,23 +676,9 @@ class BookingService:
             
             # 查找此时间槽的预约
             booking_for_slot = None
-            for booking in bookings:
+            for booking in booking_responses:
                 if (booking.start_time <= current_time and booking.end_time > current_time):
-                    # 将 Booking 模型转换为 BookingResponse
-                    booking_for_slot = BookingResponse(
-                        id=booking.id,
-                        user_id=booking.user_id,
-                        resource_id=booking.resource_id,
-                        resource_name=booking.resource.name,
-                        task_name=booking.task_name,
-                        estimated_memory_gb=booking.estimated_memory_gb,
-                        start_time=booking.start_time,
-                        end_time=booking.end_time,
-                        original_end_time=booking.original_end_time,
-                        status=booking.status,
-                        created_at=booking.created_at,
-                        updated_at=booking.updated_at
-                    )
+                    booking_for_slot = booking
                     break
             
             slots.append(CalendarSlot(
@@ -526,24 +690,6 @@ class BookingService:
             
             current_time = slot_end
 
-        # Convert all bookings to BookingResponse format for the bookings list
-        booking_responses = []
-        for booking in bookings:
-            booking_responses.append(BookingResponse(
-                id=booking.id,
-                user_id=booking.user_id,
-                resource_id=booking.resource_id,
-                resource_name=booking.resource.name,
-                task_name=booking.task_name,
-                estimated_memory_gb=booking.estimated_memory_gb,
-                start_time=booking.start_time,
-                end_time=booking.end_time,
-                original_end_time=booking.original_end_time,
-                status=booking.status,
-                created_at=booking.created_at,
-                updated_at=booking.updated_at
-            ))
-
         return CalendarResponse(
             start_date=start_date,
             end_date=end_date,
@@ -581,18 +727,31 @@ class BookingService:
         
         return conflicting_booking is not None
 
-    def _create_booking_log(self, booking_id: str, action: str, details: str):
-        """创建预约日志"""
-        log = BookingLog(
-            booking_id=booking_id,
-            action=action,
-            details=details,
-            timestamp=datetime.utcnow()
-        )
-        self.db.add(log)
+    def _create_booking_log(self, booking: Booking, action: str, details: str,
+                            data: Optional[dict] = None, actor_id: Optional[str] = None):
+        """创建预约日志
+
+        data 为结构化详情（时间字段以 ISO 字符串保存），actor_id 缺省为预约所属用户。
+        启用异步审计时只在会话上暂存，事务提交后由后台线程批量写入。
+        """
+        entry = {
+            "booking_id": booking.id,
+            "action": action,
+            "details": details,
+            "data": _serialize_log_data(data),
+            "user_id": booking.user_id,
+            "resource_id": booking.resource_id,
+            "actor_id": actor_id or booking.user_id,
+            "timestamp": datetime.utcnow()
+        }
+        if audit_writer.running:
+            audit_writer.defer(self.db, entry)
+            return
 
-    def update_booking_statuses(self):
-        """更新预约状态（定时任务调用）"""
+        self.db.add(BookingLog(**entry))
+
+    def update_booking_statuses(self) -> int:
+        """更新预约状态（定时任务调用），返回状态转换的数量"""
         current_time = datetime.utcnow()
         
         # 更新应该开始的预约
@@ -607,10 +766,13 @@ class BookingService:
             .all()
         )
         
+        transitions = []
         for booking in upcoming_bookings:
             booking.status = "active"
             booking.updated_at = current_time
-            self._create_booking_log(booking.id, "started", "预约自动开始")
+            transitions.append((booking.user_id, "upcoming", "active"))
+            self._create_booking_log(booking, "started", "预约自动开始",
+                                     {"old_status": "upcoming", "new_status": "active"}, actor_id="system")
 
         # 更新应该结束的预约
         active_bookings = (
@@ -626,9 +788,44 @@ class BookingService:
         for booking in active_bookings:
             booking.status = "completed"
             booking.updated_at = current_time
-            self._create_booking_log(booking.id, "completed", "预约自动结束")
+            transitions.append((booking.user_id, "active", "completed"))
+            self._create_booking_log(booking, "completed", "预约自动结束",
+                                     {"old_status": "active", "new_status": "completed"}, actor_id="system")
+
+        # 整个时间段都已过去仍未开始的预约（如服务停机期间）直接结束，避免一直占用并发名额
+        expired_bookings = (
+            self.db.query(Booking)
+            .filter(
+                Booking.status == "upcoming",
+                Booking.end_time <= current_time,
+                Booking.is_deleted == False
+            )
+            .all()
+        )
+        
+        for booking in expired_bookings:
+            booking.status = "completed"
+            booking.updated_at = current_time
+            transitions.append((booking.user_id, "upcoming", "completed"))
+            self._create_booking_log(booking, "completed", "预约已过期",
+                                     {"old_status": "upcoming", "new_status": "completed"}, actor_id="system")
+
+        # 结束的预约计入小时汇总，预约者的用户组一次查出
+        finished = active_bookings + expired_bookings
+        if finished:
+            groups = dict(
+                self.db.query(User.id, User.group).filter(User.id.in_({b.user_id for b in finished})).all()
+            )
+            for booking in finished:
+                rollup.record(self.db, booking, groups.get(booking.user_id))
 
+        policy.apply_transitions(self.db, transitions)
         self.db.commit()
+        if transitions:
+            invalidate_admin_stats()
+        for _, old_status, new_status in transitions:
+            metrics.STATUS_TRANSITIONS.inc(old_status, new_status)
+        return len(transitions)
 
 
 class ResourceService:
@@ -650,56 +847,55 @@ class ResourceService:
             .first()
         )
 
-    def get_resource_stats(self, resource_id: str, start_date: datetime, end_date: datetime) -> ResourceStats:
-        """获取资源统计信息"""
-        # 获取资源
-        resource = self.get_resource(resource_id)
-        if not resource:
-            raise ValueError("资源不存在")
-
-        # 处理时区问题
-        start_date = self._make_timezone_naive(start_date)
-        end_date = self._make_timezone_naive(end_date)
-
-        # 计算时间范围内的预约统计
-        bookings = (
-            self.db.query(Booking)
-            .filter(
-                Booking.resource_id == resource_id,
+    def get_current_memory_usage(self) -> List[dict]:
+        """各启用资源在当前时刻已预约的显存（一次 GROUP BY）"""
+        current_time = datetime.utcnow()
+        reserved = (
+            select(Booking.resource_id, func.sum(Booking.estimated_memory_gb).label("reserved"))
+            .where(
                 Booking.is_deleted == False,
-                Booking.start_time < end_date,
-                Booking.end_time > start_date
+                Booking.status.in_(OCCUPYING_STATUSES),
+                Booking.start_time <= current_time,
+                Booking.end_time > current_time
             )
+            .group_by(Booking.resource_id)
+            .subquery()
+        )
+        rows = (
+            self.db.query(Resource.id, Resource.name, Resource.total_memory_gb,
+                          func.coalesce(reserved.c.reserved, 0).label("reserved"))
+            .outerjoin(reserved, reserved.c.resource_id == Resource.id)
+            .filter(Resource.is_active == True)
+            .order_by(Resource.name)
             .all()
         )
+        return [
+            {
+                "resource_id": row.id,
+                "resource_name": row.name,
+                "total_memory_gb": row.total_memory_gb,
+                "reserved_memory_gb": int(row.reserved),
+                "free_memory_gb": row.total_memory_gb - int(row.reserved)
+            }
+            for row in rows
+        ]
 
-        # 计算总使用时间
-        total_hours_used = 0
-        total_bookings = len(bookings)
-        
-        for booking in bookings:
-            # 计算交集时间
-            booking_start = max(booking.start_time, start_date)
-            booking_end = min(booking.end_time, end_date)
-            if booking_start < booking_end:
-                duration = (booking_end - booking_start).total_seconds() / 3600
-                total_hours_used += duration
-
-        # 计算总可用时间
-        total_hours_available = (end_date - start_date).total_seconds() / 3600
-
-        # 计算利用率
-        utilization_rate = (total_hours_used / total_hours_available * 100) if total_hours_available > 0 else 0
-
-        return ResourceStats(
-            resource_id=resource_id,
-            resource_name=resource.name,
-            total_bookings=total_bookings,
-            total_hours_used=total_hours_used,
-            utilization_rate=utilization_rate,
-            period_start=start_date,
-            period_end=end_date
-        )
+    def get_resource_stats(self, resource_id: str, start_date: datetime, end_date: datetime) -> ResourceStats:
+        """获取资源统计信息（按显存时长加权的利用率）"""
+        stats = self.get_all_resource_stats(start_date, end_date, resource_id)
+        if not stats:
+            raise ValueError("资源不存在")
+        return stats[0]
+
+    def get_all_resource_stats(self, start_date: datetime, end_date: datetime,
+                               resource_id: Optional[str] = None) -> List[ResourceStats]:
+        """获取所有资源（或指定资源）在时间范围内的统计信息"""
+        start_date = _to_naive_utc(start_date)
+        end_date = _to_naive_utc(end_date)
+        return [
+            ResourceStats(**row)
+            for row in resource_utilization(self.db, start_date, end_date, resource_id)
+        ]
 
 
 class UserService:
@@ -707,51 +903,49 @@ class UserService:
         self.db = db
 
     def get_user_stats(self, user_id: str) -> dict:
-        """获取用户统计信息"""
-        # 获取用户的所有预约
-        all_bookings = (
-            self.db.query(Booking)
+        """获取用户统计信息（在数据库中一次聚合，不取回预约）"""
+        current_time = datetime.utcnow()
+        duration = hours_between(self.db, Booking.start_time, Booking.end_time)
+        # 进行中的预约只计算已过去的时间
+        elapsed = hours_between(
+            self.db,
+            Booking.start_time,
+            case((Booking.end_time < current_time, Booking.end_time), else_=current_time)
+        )
+
+        def count(status: str):
+            return func.coalesce(func.sum(case((Booking.status == status, 1), else_=0)), 0)
+
+        row = (
+            self.db.query(
+                func.count(Booking.id).label("total_bookings"),
+                count("active").label("active_bookings"),
+                count("upcoming").label("upcoming_bookings"),
+                count("completed").label("completed_bookings"),
+                # 总预约时间（包括未来的预约）
+                func.coalesce(func.sum(duration), 0).label("total_hours"),
+                # 已实际使用的时间：已完成的全部计入，进行中的计入已过去的部分
+                func.coalesce(func.sum(case(
+                    (Booking.status == "completed", duration),
+                    (and_(Booking.status == "active", Booking.start_time <= current_time), elapsed),
+                    else_=0
+                )), 0).label("used_hours")
+            )
             .filter(
                 Booking.user_id == user_id,
                 Booking.is_deleted == False
             )
-            .all()
+            .one()
         )
 
-        # 计算各种统计
-        total_bookings = len(all_bookings)
-        active_bookings = len([b for b in all_bookings if b.status == "active"])
-        upcoming_bookings = len([b for b in all_bookings if b.status == "upcoming"])
-        completed_bookings = len([b for b in all_bookings if b.status == "completed"])
-
-        # 计算总预约时间和已使用时间
-        total_hours = 0  # 总预约时间（包括未来的预约）
-        used_hours = 0   # 已实际使用的时间
-        
-        current_time = datetime.utcnow()
-        
-        for booking in all_bookings:
-            # 计算预约的总时长
-            booking_duration = (booking.end_time - booking.start_time).total_seconds() / 3600
-            total_hours += booking_duration
-            
-            # 计算已使用的时间
-            if booking.status == "completed":
-                # 已完成的预约，全部时间都算已使用
-                used_hours += booking_duration
-            elif booking.status == "active":
-                # 正在进行的预约，计算已过去的时间
-                if booking.start_time <= current_time:
-                    elapsed_time = min(current_time, booking.end_time) - booking.start_time
-                    used_hours += elapsed_time.total_seconds() / 3600
-
         return {
-            "total_bookings": total_bookings,
-            "active_bookings": active_bookings,
-            "upcoming_bookings": upcoming_bookings,
-            "completed_bookings": completed_bookings,
-            "total_hours": total_hours,
-            "used_hours": used_hours
+            "total_bookings": row.total_bookings,
+            "active_bookings": row.active_bookings,
+            "upcoming_bookings": row.upcoming_bookings,
+            "completed_bookings": row.completed_bookings,
+            # julianday 相减有浮点误差，与其他统计一样保留两位小数
+            "total_hours": round(float(row.total_hours), 2),
+            "used_hours": round(float(row.used_hours), 2)
         }
 
     def update_booking_statuses(self) -> int:
@@ -886,8 +1080,13 @@ class AdminService:
     def __init__(self, db: Session):
         self.db = db
 
-    def get_users_list(self, page: int = 1, page_size: int = 20, search: Optional[str] = None) -> dict:
-        """获取用户列表"""
+    def get_users_list(self, page: int = 1, page_size: int = 20, search: Optional[str] = None,
+                       cursor: Optional[str] = None, include_total: bool = True) -> dict:
+        """获取用户列表
+
+        传入 cursor 时按 (created_at, id) 键集分页，忽略 page；
+        total 来自短期缓存，include_total=False 时不计算。
+        """
         query = self.db.query(User)
         
         # 搜索过滤
@@ -900,14 +1099,18 @@ class AdminService:
             )
         
         # 分页
-        total = query.count()
-        users = query.offset((page - 1) * page_size).limit(page_size).all()
+        total = count_cache.get_or_compute(("users", search), query.count) if include_total else None
+        paged = apply_keyset(query, User, cursor)
+        if not cursor:
+            paged = paged.offset((page - 1) * page_size)
+        users = paged.limit(page_size).all()
         
         return {
             "users": users,
             "total": total,
             "page": page,
-            "page_size": page_size
+            "page_size": page_size,
+            "next_cursor": next_cursor(users, page_size)
         }
 
     def update_user(self, user_id: str, update_data: dict) -> User:
@@ -915,15 +1118,29 @@ class AdminService:
         user = self.db.query(User).filter(User.id == user_id).first()
         if not user:
             raise ValueError("用户不存在")
+        old_email = user.email
+        old_claims = (user.email, user.group, user.is_active)
         
         # 更新字段
         for field, value in update_data.items():
             if hasattr(user, field) and value is not None:
                 setattr(user, field, value)
         
+        # 用户组配额日桶随用户迁移到新组
+        quota.move_user_group(self.db, user.id, old_claims[1], user.group)
+
+        # 令牌声明涉及的字段变更后，使已签发令牌的声明失效
+        if (user.email, user.group, user.is_active) != old_claims:
+            bump_token_version(self.db, user.id)
+        if not user.is_active:
+            revoke_refresh_tokens(self.db, user_id=user.id)
+        
         user.updated_at = datetime.utcnow()
         self.db.commit()
         self.db.refresh(user)
+        count_cache.invalidate_prefix("users")
+        invalidate_admin_stats()
+        invalidate_principal(old_email, user.email)
         return user
 
     def delete_user(self, user_id: str) -> bool:
@@ -943,11 +1160,17 @@ class AdminService:
             raise ValueError("用户有活跃的预约，无法删除")
         
         user.is_active = False
+        bump_token_version(self.db, user.id)
+        revoke_refresh_tokens(self.db, user_id=user.id)
         self.db.commit()
+        count_cache.invalidate_prefix("users")
+        invalidate_admin_stats()
+        invalidate_principal(user.email)
         return True
 
-    def get_resources_list(self, page: int = 1, page_size: int = 20, search: Optional[str] = None) -> dict:
-        """获取资源列表"""
+    def get_resources_list(self, page: int = 1, page_size: int = 20, search: Optional[str] = None,
+                           cursor: Optional[str] = None, include_total: bool = True) -> dict:
+        """获取资源列表（分页方式同 get_users_list）"""
         query = self.db.query(Resource)
         
         # 搜索过滤
@@ -960,14 +1183,18 @@ class AdminService:
             )
         
         # 分页
-        total = query.count()
-        resources = query.offset((page - 1) * page_size).limit(page_size).all()
+        total = count_cache.get_or_compute(("resources", search), query.count) if include_total else None
+        paged = apply_keyset(query, Resource, cursor)
+        if not cursor:
+            paged = paged.offset((page - 1) * page_size)
+        resources = paged.limit(page_size).all()
         
         return {
             "resources": resources,
             "total": total,
             "page": page,
-            "page_size": page_size
+            "page_size": page_size,
+            "next_cursor": next_cursor(resources, page_size)
         }
 
     def update_resource(self, resource_id: str, update_data: dict) -> Resource:
@@ -984,6 +1211,8 @@ class AdminService:
         resource.updated_at = datetime.utcnow()
         self.db.commit()
         self.db.refresh(resource)
+        count_cache.invalidate_prefix("resources")
+        invalidate_admin_stats()
         return resource
 
     def create_resource(self, name: str, description: Optional[str] = None, 
@@ -1004,6 +1233,8 @@ class AdminService:
         self.db.add(resource)
         self.db.commit()
         self.db.refresh(resource)
+        count_cache.invalidate_prefix("resources")
+        invalidate_admin_stats()
         return resource
 
     def delete_resource(self, resource_id: str) -> bool:
@@ -1024,27 +1255,126 @@ class AdminService:
         
         resource.is_active = False
         self.db.commit()
+        count_cache.invalidate_prefix("resources")
+        invalidate_admin_stats()
         return True
 
     def get_admin_stats(self) -> dict:
-        """获取管理员统计信息"""
-        total_users = self.db.query(User).count()
-        active_users = self.db.query(User).filter(User.is_active == True).count()
-        
-        total_resources = self.db.query(Resource).count()
-        active_resources = self.db.query(Resource).filter(Resource.is_active == True).count()
-        
-        total_bookings = self.db.query(Booking).filter(Booking.is_deleted == False).count()
-        active_bookings = self.db.query(Booking).filter(
-            Booking.status.in_(["upcoming", "active"]),
-            Booking.is_deleted == False
-        ).count()
-        
+        """获取管理员统计信息（短时缓存，未命中时一次查询算出全部计数）"""
+        stats = admin_stats_cache.get("admin_stats")
+        if stats is None:
+            stats = self._compute_admin_stats()
+            admin_stats_cache.set("admin_stats", stats)
+        return dict(stats)
+
+    def get_usage_summary(self, start_time: datetime, end_time: datetime, group_by: str = "resource",
+                          **filters) -> List[dict]:
+        """从小时汇总表读取区间内的用量"""
+        return rollup.summarize(self.db, _to_naive_utc(start_time), _to_naive_utc(end_time),
+                                group_by=group_by, **filters)
+
+    def get_heatmap(self, weeks: int, bin_by: str = "hour_of_week", end_time: Optional[datetime] = None) -> dict:
+        """最近 weeks 周（截至 end_time）各资源的预约显存热力图"""
+        end_time = _to_naive_utc(end_time) or datetime.utcnow()
+        return reserved_memory_heatmap(self.db, end_time - timedelta(weeks=weeks), end_time, bin_by)
+
+    def get_demand_forecast(self) -> dict:
+        """最新一份离线需求预测报告"""
+        record = forecast.latest(self.db)
+        if not record:
+            raise ValueError("尚未生成需求预测，请先运行 forecast_demand.py")
+        return {"generated_at": record.generated_at, **record.report}
+
+    def _compute_admin_stats(self) -> dict:
+        """六个标量子查询作为同一条语句的列（每张表各扫描一次条件聚合，无笛卡尔积）"""
+        def count_if(condition):
+            return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+        active_booking = Booking.status.in_(["upcoming", "active"])
+        row = self.db.execute(select(
+            select(func.count(User.id)).scalar_subquery().label("total_users"),
+            select(count_if(User.is_active == True)).scalar_subquery().label("active_users"),
+            select(func.count(Resource.id)).scalar_subquery().label("total_resources"),
+            select(count_if(Resource.is_active == True)).scalar_subquery().label("active_resources"),
+            select(func.count(Booking.id)).where(Booking.is_deleted == False)
+            .scalar_subquery().label("total_bookings"),
+            select(count_if(active_booking)).where(Booking.is_deleted == False)
+            .scalar_subquery().label("active_bookings")
+        )).one()
+        return dict(row._mapping)
+
+
+class AuditService:
+    # 汇总维度 -> 分组表达式
+    GROUP_BY_FIELDS = ("action", "user", "resource", "group", "day")
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _apply_filters(self, query, booking_id: Optional[str] = None, user_id: Optional[str] = None,
+                       resource_id: Optional[str] = None, action: Optional[str] = None,
+                       group: Optional[str] = None, start_time: Optional[datetime] = None,
+                       end_time: Optional[datetime] = None):
+        """按预约、用户、资源、动作、用户组和时间范围过滤日志"""
+        if booking_id:
+            query = query.filter(BookingLog.booking_id == booking_id)
+        if user_id:
+            query = query.filter(BookingLog.user_id == user_id)
+        if resource_id:
+            query = query.filter(BookingLog.resource_id == resource_id)
+        if action:
+            query = query.filter(BookingLog.action == action)
+        if group:
+            query = query.filter(BookingLog.user_id.in_(
+                self.db.query(User.id).filter(User.group == group)
+            ))
+        if start_time:
+            query = query.filter(BookingLog.timestamp >= _to_naive_utc(start_time))
+        if end_time:
+            query = query.filter(BookingLog.timestamp < _to_naive_utc(end_time))
+        return query
+
+    def get_logs(self, cursor: Optional[str] = None, limit: int = 50, **filters) -> dict:
+        """按 (timestamp, id) 倒序游标分页查询审计日志"""
+        query = self._apply_filters(self.db.query(BookingLog), **filters)
+        logs = apply_keyset(query, BookingLog, cursor, time_attr="timestamp").limit(limit).all()
         return {
-            "total_users": total_users,
-            "active_users": active_users,
-            "total_resources": total_resources,
-            "active_resources": active_resources,
-            "total_bookings": total_bookings,
-            "active_bookings": active_bookings
+            "logs": logs,
+            "next_cursor": next_cursor(logs, limit, time_attr="timestamp")
         }
+
+    def get_summary(self, group_by: str = "action", **filters) -> List[dict]:
+        """在 SQL 中按指定维度汇总日志条数与延长/释放小时数"""
+        if group_by not in self.GROUP_BY_FIELDS:
+            raise ValueError(f"不支持的汇总维度: {group_by}")
+
+        if group_by == "group":
+            key = User.group
+        elif group_by == "user":
+            key = BookingLog.user_id
+        elif group_by == "resource":
+            key = BookingLog.resource_id
+        elif group_by == "day":
+            key = func.date(BookingLog.timestamp)
+        else:
+            key = BookingLog.action
+
+        query = self.db.query(
+            key.label("key"),
+            func.count(BookingLog.id).label("count"),
+            func.coalesce(func.sum(BookingLog.data["hours"].as_float()), 0).label("extended_hours"),
+            func.coalesce(func.sum(BookingLog.data["released_hours"].as_float()), 0).label("released_hours")
+        )
+        if group_by == "group":
+            query = query.outerjoin(User, User.id == BookingLog.user_id)
+        rows = self._apply_filters(query, **filters).group_by(key).order_by(key).all()
+
+        return [
+            {
+                "key": row.key,
+                "count": row.count,
+                "extended_hours": float(row.extended_hours),
+                "released_hours": float(row.released_hours)
+            }
+            for row in rows
+        ]
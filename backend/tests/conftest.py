@@ -0,0 +1,69 @@
+"""
+测试公共配置：把 backend 目录加入导入路径，并在导入任何应用模块前指向临时 SQLite 数据库
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_fd, DB_PATH = tempfile.mkstemp(suffix=".db")
+os.close(_fd)
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+
+@pytest.fixture
+def db():
+    """每个测试使用一套空表（同时清空按表内容缓存的总数）"""
+    from database import SessionLocal, engine
+    from models import Base
+    from pagination import count_cache
+
+    Base.metadata.create_all(bind=engine)
+    count_cache.clear()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def make_user(db):
+    """创建用户：make_user("alice", group="premium")"""
+    from models import User
+
+    def make(user_id: str, group: str = "standard") -> User:
+        user = User(id=user_id, name=user_id, email=f"{user_id}@example.com", group=group)
+        db.add(user)
+        db.commit()
+        return user
+
+    return make
+
+
+@pytest.fixture
+def make_resource(db):
+    """创建资源：make_resource("gpu-01", total_memory_gb=24)"""
+    from models import Resource
+
+    def make(resource_id: str, total_memory_gb: int = 24) -> Resource:
+        resource = Resource(id=resource_id, name=resource_id, total_memory_gb=total_memory_gb)
+        db.add(resource)
+        db.commit()
+        return resource
+
+    return make
+
+
+def pytest_sessionfinish(session, exitstatus):
+    from database import engine
+
+    engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(DB_PATH + suffix):
+            os.remove(DB_PATH + suffix)
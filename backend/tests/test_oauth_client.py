@@ -0,0 +1,192 @@
+"""
+OAuth 客户端：在本地桩 IdP 上验证连接复用、退避重试、超时，以及重试前关闭丢弃的响应
+"""
+
+import asyncio
+import socket
+import threading
+import time
+
+import httpx
+import pytest
+import uvicorn
+from fastapi import FastAPI, Form, Request, Response
+
+import oauth_service
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubIdP:
+    """令牌端点、用户信息端点（可设置先返回几次 503）和慢端点，记录每个请求的客户端端口"""
+
+    def __init__(self):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.failures_left = 0
+        self.calls = []
+        self.app = FastAPI()
+
+        @self.app.post("/token")
+        async def token(request: Request, code: str = Form(...)):
+            self.calls.append(("token", request.client.port))
+            return {"access_token": f"at-{code}", "token_type": "Bearer"}
+
+        @self.app.get("/userinfo")
+        async def userinfo(request: Request, response: Response):
+            self.calls.append(("userinfo", request.client.port))
+            if self.failures_left > 0:
+                self.failures_left -= 1
+                response.status_code = 503
+                return {"error": "temporarily_unavailable"}
+            return {"sub": "42", "email": "stub@example.com", "name": "Stub"}
+
+        @self.app.post("/slow")
+        async def slow(request: Request):
+            self.calls.append(("slow", request.client.port))
+            await asyncio.sleep(1)
+            return {}
+
+    def reset(self) -> None:
+        self.failures_left = 0
+        self.calls.clear()
+
+
+@pytest.fixture(scope="module")
+def idp():
+    stub = StubIdP()
+    server = uvicorn.Server(uvicorn.Config(stub.app, host="127.0.0.1", port=stub.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield stub
+    server.should_exit = True
+    thread.join(5)
+
+
+@pytest.fixture
+def service(idp, monkeypatch):
+    idp.reset()
+    monkeypatch.setenv("OAUTH_CLIENT_ID", "test-client")
+    monkeypatch.setenv("OAUTH_CLIENT_SECRET", "test-secret")
+    monkeypatch.setenv("OAUTH_AUTHORIZATION_URL", f"{idp.url}/authorize")
+    monkeypatch.setenv("OAUTH_TOKEN_URL", f"{idp.url}/token")
+    monkeypatch.setenv("OAUTH_USER_INFO_URL", f"{idp.url}/userinfo")
+    monkeypatch.delenv("OAUTH_OIDC_ISSUER", raising=False)
+    monkeypatch.setattr(oauth_service, "OAUTH_HTTP_RETRIES", 2)
+    monkeypatch.setattr(oauth_service, "OAUTH_HTTP_BACKOFF", 0.01)
+    return oauth_service.GenericOAuthService()
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """记录 oauth_service 在主线程中的退避等待时长（桩 IdP 在另一个线程的事件循环中运行）"""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args, **kwargs):
+        if threading.current_thread() is threading.main_thread():
+            delays.append(delay)
+        return await real_sleep(delay, *args, **kwargs)
+
+    monkeypatch.setattr(oauth_service.asyncio, "sleep", sleep)
+    return delays
+
+
+def _run(service, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await service.aclose()
+
+    return asyncio.run(main())
+
+
+def test_requests_reuse_one_connection(service, idp):
+    async def flow():
+        for i in range(5):
+            await service.exchange_code_for_token(f"code-{i}")
+            await service.get_user_info(f"at-code-{i}")
+
+    _run(service, flow())
+
+    assert len(idp.calls) == 10
+    assert len({port for _, port in idp.calls}) == 1
+
+
+def test_retries_5xx_with_exponential_backoff(service, idp, backoffs):
+    idp.failures_left = 2
+
+    info = _run(service, service.get_user_info("at"))
+
+    assert info["email"] == "stub@example.com"
+    assert [name for name, _ in idp.calls] == ["userinfo"] * 3
+    assert backoffs == [0.01, 0.02]
+
+
+def test_gives_up_after_retries(service, idp, backoffs):
+    idp.failures_left = 10
+
+    with pytest.raises(httpx.HTTPStatusError):
+        _run(service, service._request("GET", f"{idp.url}/userinfo"))
+
+    assert len(idp.calls) == 3
+    assert backoffs == [0.01, 0.02]
+
+
+def test_retries_connect_errors(service, backoffs):
+    closed_url = f"http://127.0.0.1:{_free_port()}/token"
+
+    with pytest.raises(httpx.ConnectError):
+        # 连接尚未建立，非幂等请求同样可以重试
+        _run(service, service._request("POST", closed_url, idempotent=False, data={"code": "x"}))
+
+    assert backoffs == [0.01, 0.02]
+
+
+def test_timeout_is_enforced_and_not_retried_for_non_idempotent(service, idp, backoffs, monkeypatch):
+    monkeypatch.setattr(oauth_service, "OAUTH_HTTP_TIMEOUT", 0.2)
+
+    started = time.perf_counter()
+    with pytest.raises(httpx.ReadTimeout):
+        _run(service, service._request("POST", f"{idp.url}/slow", idempotent=False))
+
+    assert time.perf_counter() - started < 0.9
+    assert len(idp.calls) == 1
+    assert backoffs == []
+
+
+def test_discarded_response_is_closed_before_next_attempt(service, idp, monkeypatch):
+    idp.failures_left = 2
+    responses = []
+    client = service.http
+    send = client.request
+
+    async def request(*args, **kwargs):
+        assert all(response.is_closed for response in responses)
+        response = await send(*args, **kwargs)
+        responses.append(response)
+        return response
+
+    monkeypatch.setattr(client, "request", request)
+    closed = []
+    real_aclose = httpx.Response.aclose
+
+    async def aclose(response):
+        # 只记录客户端交回响应之后的关闭（httpx 读完响应体时自己也会关闭一次）
+        if any(response is returned for returned in responses):
+            closed.append(response)
+        await real_aclose(response)
+
+    monkeypatch.setattr(httpx.Response, "aclose", aclose)
+
+    _run(service, service.get_user_info("at"))
+
+    assert [response.status_code for response in responses] == [503, 503, 200]
+    assert closed[:2] == responses[:2]
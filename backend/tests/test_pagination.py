@@ -0,0 +1,63 @@
+"""
+键集分页游标
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import User
+from pagination import apply_keyset, decode_cursor, encode_cursor, next_cursor
+from services import AdminService
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 1, 2, 3, 4, 5, 678901)
+
+    assert decode_cursor(encode_cursor(created_at, "user|7")) == (created_at, "user|7")
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", "!!!"])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match="无效的分页游标"):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_every_row_once_with_timestamp_ties(db):
+    base = datetime(2024, 1, 1)
+    # 每 3 个用户共用同一个 created_at，翻页时必须按 id 区分
+    db.add_all([
+        User(id=f"u{i:02d}", name=f"u{i}", email=f"u{i}@example.com", created_at=base + timedelta(minutes=i // 3))
+        for i in range(20)
+    ])
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        page = apply_keyset(db.query(User), User, cursor).limit(7).all()
+        seen.extend(page)
+        cursor = next_cursor(page, 7)
+        if cursor is None:
+            break
+
+    assert [user.id for user in seen] == [f"u{i:02d}" for i in sorted(range(20), key=lambda i: (i // 3, i),
+                                                                       reverse=True)]
+    assert len(seen) == 20
+
+
+def test_next_cursor_is_none_on_last_page():
+    assert next_cursor([], 10) is None
+
+
+def test_admin_user_list_pages_by_cursor(db, make_user):
+    for i in range(5):
+        make_user(f"user{i}")
+    service = AdminService(db)
+
+    first = service.get_users_list(page_size=3)
+    second = service.get_users_list(page_size=3, cursor=first["next_cursor"])
+
+    assert first["total"] == 5
+    assert len(first["users"]) == 3 and len(second["users"]) == 2
+    assert second["next_cursor"] is None
+    assert {u.id for u in first["users"]} | {u.id for u in second["users"]} == {f"user{i}" for i in range(5)}
@@ -0,0 +1,82 @@
+"""
+用户组策略准入与预约计数器
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import policy
+from models import Booking
+
+NOW = datetime(2024, 1, 1, 8)
+
+
+def test_duration_limit_by_group(db):
+    start = NOW + timedelta(hours=1)
+
+    policy.check_create(db, "u", "standard", start, start + timedelta(hours=8), NOW)
+    with pytest.raises(ValueError, match="8小时"):
+        policy.check_create(db, "u", "standard", start, start + timedelta(hours=9), NOW)
+    policy.check_create(db, "u", "premium", start, start + timedelta(hours=24), NOW)
+    policy.check_create(db, "u", "admin", start, start + timedelta(days=30), NOW)
+
+
+def test_advance_days_limit(db):
+    start = NOW + timedelta(days=8)
+
+    with pytest.raises(ValueError, match="7天"):
+        policy.check_create(db, "u", "standard", start, start + timedelta(hours=1), NOW)
+    policy.check_create(db, "u", "premium", start, start + timedelta(hours=1), NOW)
+
+
+def test_unknown_group_uses_standard_policy():
+    assert policy.get_policy("nobody") is policy.GROUP_POLICIES["standard"]
+
+
+def test_concurrent_booking_limit_uses_counters(db):
+    start = NOW + timedelta(hours=1)
+    end = start + timedelta(hours=1)
+
+    policy.adjust_counters(db, "u", upcoming=1)
+    policy.adjust_counters(db, "u", active=1)
+    db.commit()
+    with pytest.raises(ValueError, match="2个"):
+        policy.check_create(db, "u", "standard", start, end, NOW)
+    policy.check_create(db, "u", "premium", start, end, NOW)
+
+    policy.apply_transitions(db, [("u", "active", "completed")])
+    db.commit()
+    policy.check_create(db, "u", "standard", start, end, NOW)
+
+
+def test_counters_never_go_negative(db):
+    policy.adjust_counters(db, "u", upcoming=1)
+    db.commit()
+    policy.adjust_counters(db, "u", upcoming=-3, active=2)
+    db.commit()
+
+    assert policy.get_counters(db, "u") == (0, 2)
+    assert policy.get_counters(db, "missing") == (0, 0)
+
+
+def test_rebuild_counters_from_bookings(db):
+    for i, status in enumerate(["upcoming", "upcoming", "active", "completed", "cancelled"]):
+        db.add(Booking(id=f"b{i}", user_id="u", resource_id="gpu", task_name="t", estimated_memory_gb=1,
+                       start_time=NOW, end_time=NOW + timedelta(hours=1),
+                       original_end_time=NOW + timedelta(hours=1), status=status))
+    db.commit()
+    policy.adjust_counters(db, "u", upcoming=5)
+    db.commit()
+
+    policy.rebuild_counters(db)
+
+    assert policy.get_counters(db, "u") == (2, 1)
+
+
+def test_extend_limit():
+    policy.check_extend("standard", 4)
+    with pytest.raises(ValueError):
+        policy.check_extend("standard", 5)
+    with pytest.raises(ValueError):
+        policy.check_extend("admin", 0)
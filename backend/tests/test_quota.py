@@ -0,0 +1,121 @@
+"""
+显存时长配额日桶：准入、取消/释放/抢占时退还、用户改组时迁移
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func
+
+import quota
+from models import Booking, QuotaLedger
+from schemas import BookingCreate
+from services import AdminService, BookingService
+
+
+def _usage(db, scope: str) -> float:
+    return db.query(func.coalesce(func.sum(QuotaLedger.gb_hours), 0.0)).filter(QuotaLedger.scope == scope).scalar()
+
+
+def _create(db, user, resource_id, memory_gb, hours=2, start_in=timedelta(hours=1)):
+    start = datetime.utcnow().replace(microsecond=0) + start_in
+    return BookingService(db).create_booking(
+        BookingCreate(resource_id=resource_id, task_name="train", estimated_memory_gb=memory_gb,
+                      start_time=start, end_time=start + timedelta(hours=hours)),
+        user
+    )
+
+
+def test_split_gb_hours_by_utc_day():
+    start = datetime(2024, 1, 1, 22)
+    buckets = quota.split_gb_hours(start, start + timedelta(hours=4), 3)
+
+    assert buckets == {datetime(2024, 1, 1).date(): 6.0, datetime(2024, 1, 2).date(): 6.0}
+
+
+def test_create_records_and_cancel_refunds(db, make_user, make_resource):
+    user = make_user("alice")
+    make_resource("gpu-01")
+
+    booking = _create(db, user, "gpu-01", 4, hours=2)
+    assert _usage(db, "user:alice") == pytest.approx(8)
+    assert _usage(db, "group:standard") == pytest.approx(8)
+
+    assert BookingService(db).delete_booking(booking.id, "alice")
+    assert _usage(db, "user:alice") == pytest.approx(0)
+    assert _usage(db, "group:standard") == pytest.approx(0)
+
+
+def test_release_refunds_unused_time(db, make_user, make_resource):
+    user = make_user("alice")
+    make_resource("gpu-01")
+    now = datetime.utcnow()
+    booking = Booking(id="running", user_id="alice", resource_id="gpu-01", task_name="train",
+                      estimated_memory_gb=4, start_time=now - timedelta(hours=1),
+                      end_time=now + timedelta(hours=3), original_end_time=now + timedelta(hours=3),
+                      status="active")
+    db.add(booking)
+    quota.record(db, "alice", "standard", booking.start_time, booking.end_time, 4)
+    db.commit()
+
+    BookingService(db).release_booking("running", "alice")
+
+    # 只保留已经使用的约 1 小时
+    assert _usage(db, "user:alice") == pytest.approx(4, abs=0.05)
+    assert _usage(db, "group:standard") == pytest.approx(4, abs=0.05)
+
+
+def test_preemption_refunds_victim(db, make_user, make_resource):
+    victim = make_user("victim")
+    premium = make_user("vip", group="premium")
+    make_resource("gpu-01", total_memory_gb=24)
+
+    _create(db, victim, "gpu-01", 20, hours=2)
+    _create(db, premium, "gpu-01", 10, hours=2)
+
+    assert _usage(db, "user:victim") == pytest.approx(0)
+    assert _usage(db, "group:standard") == pytest.approx(0)
+    assert _usage(db, "user:vip") == pytest.approx(20)
+    assert _usage(db, "group:premium") == pytest.approx(20)
+
+
+def test_group_change_moves_usage_and_later_refunds_new_group(db, make_user, make_resource):
+    user = make_user("alice")
+    make_resource("gpu-01")
+    booking = _create(db, user, "gpu-01", 4, hours=2)
+
+    AdminService(db).update_user("alice", {"group": "premium"})
+    assert _usage(db, "group:standard") == pytest.approx(0)
+    assert _usage(db, "group:premium") == pytest.approx(8)
+
+    BookingService(db).delete_booking(booking.id, "alice")
+    assert _usage(db, "user:alice") == pytest.approx(0)
+    assert _usage(db, "group:premium") == pytest.approx(0)
+
+
+def test_check_rejects_usage_over_rolling_window(db):
+    start = datetime(2024, 1, 1, 0)
+    quota.record(db, "alice", "standard", start, start + timedelta(hours=20), 24)  # 480 GB·小时
+    db.commit()
+
+    quota.check(db, "alice", "standard", start + timedelta(days=6), start + timedelta(days=6, hours=1), 20)
+    with pytest.raises(ValueError, match="配额不足"):
+        quota.check(db, "alice", "standard", start + timedelta(days=6), start + timedelta(days=6, hours=1), 24)
+    # 已滑出窗口的用量不再计入
+    quota.check(db, "alice", "standard", start + timedelta(days=7), start + timedelta(days=7, hours=1), 24)
+
+
+def test_rebuild_matches_incremental_ledger(db, make_user, make_resource):
+    alice = make_user("alice")
+    bob = make_user("bob", group="premium")
+    make_resource("gpu-01", total_memory_gb=48)
+    _create(db, alice, "gpu-01", 4, hours=3)
+    cancelled = _create(db, alice, "gpu-01", 2, hours=1)
+    _create(db, bob, "gpu-01", 8, hours=5)
+    BookingService(db).delete_booking(cancelled.id, "alice")
+    scopes = ["user:alice", "user:bob", "group:standard", "group:premium"]
+    incremental = {scope: _usage(db, scope) for scope in scopes}
+
+    quota.rebuild(db)
+
+    assert {scope: _usage(db, scope) for scope in scopes} == pytest.approx(incremental)
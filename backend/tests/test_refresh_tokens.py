@@ -0,0 +1,74 @@
+"""
+刷新令牌轮换与重复使用检测
+"""
+
+import pytest
+from fastapi import HTTPException
+
+from auth import issue_token_pair, revoke_refresh_token_family, rotate_refresh_token
+from models import RefreshToken
+
+
+def _login(db, user) -> str:
+    tokens = issue_token_pair(db, user)
+    db.commit()
+    return tokens["refresh_token"]
+
+
+def test_rotation_issues_new_token_and_retires_old(db, make_user):
+    user = make_user("alice")
+    old = _login(db, user)
+
+    new = rotate_refresh_token(db, old)["refresh_token"]
+
+    assert new != old
+    assert rotate_refresh_token(db, new)["refresh_token"]
+    records = db.query(RefreshToken).all()
+    assert len(records) == 3
+    assert len({record.family_id for record in records}) == 1
+    # 三个令牌首尾相连：前两个已被替换，最新的一个仍然有效
+    replaced = {record.id: record.replaced_by for record in records}
+    assert sum(value is None for value in replaced.values()) == 1
+    assert set(filter(None, replaced.values())) <= set(replaced)
+
+
+def test_reusing_a_rotated_token_revokes_the_family(db, make_user):
+    user = make_user("alice")
+    other_session = _login(db, user)
+    stolen = _login(db, user)
+    current = rotate_refresh_token(db, stolen)["refresh_token"]
+
+    with pytest.raises(HTTPException) as exc:
+        rotate_refresh_token(db, stolen)
+    assert exc.value.status_code == 401
+
+    # 同族最新的令牌随之作废，其他登录不受影响
+    with pytest.raises(HTTPException):
+        rotate_refresh_token(db, current)
+    assert rotate_refresh_token(db, other_session)["refresh_token"]
+
+
+def test_unknown_token_is_rejected(db):
+    with pytest.raises(HTTPException) as exc:
+        rotate_refresh_token(db, "not-a-token")
+    assert exc.value.status_code == 401
+
+
+def test_inactive_user_cannot_refresh(db, make_user):
+    user = make_user("alice")
+    token = _login(db, user)
+    user.is_active = False
+    db.commit()
+
+    with pytest.raises(HTTPException):
+        rotate_refresh_token(db, token)
+
+
+def test_logout_revokes_the_family(db, make_user):
+    user = make_user("alice")
+    token = rotate_refresh_token(db, _login(db, user))["refresh_token"]
+
+    assert revoke_refresh_token_family(db, token) == 1
+    db.commit()
+    with pytest.raises(HTTPException):
+        rotate_refresh_token(db, token)
@@ -0,0 +1,109 @@
+"""
+显存时间线：峰值计算与抢占方案
+"""
+
+import random
+from datetime import datetime, timedelta
+from itertools import combinations
+from types import SimpleNamespace
+
+import scheduling
+from scheduling import gb_hours, peak_usage, plan_preemption
+
+START = datetime(2024, 1, 1, 10)
+END = START + timedelta(hours=4)
+
+
+def _booking(booking_id, memory_gb, start_hour=0, hours=4, preemptable=True):
+    start = START + timedelta(hours=start_hour)
+    return SimpleNamespace(id=booking_id, user_id=f"owner-{booking_id}", estimated_memory_gb=memory_gb,
+                           start_time=start, end_time=start + timedelta(hours=hours),
+                           status="upcoming" if preemptable else "active")
+
+
+def _preemptable(booking):
+    return booking.status == "upcoming"
+
+
+def _fits(bookings, removed, total, required):
+    removed_ids = {b.id for b in removed}
+    remaining = [b for b in bookings if b.id not in removed_ids]
+    return peak_usage(remaining, START, END) + required <= total
+
+
+def test_peak_usage_counts_only_overlapping_bookings():
+    bookings = [_booking("a", 8, 0, 2), _booking("b", 8, 2, 2), _booking("c", 4, 1, 2)]
+
+    # a 与 b 首尾相接，不同时占用；c 与两者各重叠一段
+    assert peak_usage(bookings, START, END) == 12
+
+
+def test_booking_ending_at_start_time_does_not_count():
+    before = _booking("before", 24, -2, 2)
+    after = _booking("after", 24, 4, 2)
+
+    assert peak_usage([before, after], START, END) == 0
+    assert plan_preemption([before, after], 24, 24, START, END, _preemptable) == []
+
+
+def test_no_preemption_needed():
+    bookings = [_booking("a", 8), _booking("b", 8)]
+
+    assert plan_preemption(bookings, 24, 8, START, END, _preemptable) == []
+
+
+def test_infeasible_returns_none():
+    bookings = [_booking("running", 16, preemptable=False), _booking("a", 4)]
+
+    # 即使抢占全部可抢占的预约也放不下
+    assert plan_preemption(bookings, 24, 12, START, END, _preemptable) is None
+    # 没有可抢占的预约
+    assert plan_preemption(bookings, 24, 8, START, END, lambda booking: False) is None
+
+
+def test_exact_search_returns_minimum_gb_hours():
+    big = _booking("big", 12, 0, 4)        # 48 GB·小时
+    small_1 = _booking("small-1", 6, 0, 1)  # 6 GB·小时
+    small_2 = _booking("small-2", 6, 0, 1)
+
+    plan = plan_preemption([big, small_1, small_2], 24, 12, START, END, _preemptable)
+
+    assert {b.id for b in plan} == {"small-1", "small-2"}
+
+
+def test_exact_search_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(30):
+        bookings = [_booking(str(i), rng.randint(1, 8), rng.randint(0, 3), rng.randint(1, 3),
+                             preemptable=rng.random() < 0.8)
+                    for i in range(rng.randint(3, 8))]
+        required = rng.randint(4, 16)
+        candidates = [b for b in bookings if _preemptable(b)]
+        feasible = [subset for size in range(len(candidates) + 1)
+                    for subset in combinations(candidates, size)
+                    if _fits(bookings, subset, 24, required)]
+
+        plan = plan_preemption(bookings, 24, required, START, END, _preemptable)
+
+        if not feasible:
+            assert plan is None
+            continue
+        assert _fits(bookings, plan, 24, required)
+        best = min(sum(gb_hours(b) for b in subset) for subset in feasible)
+        assert abs(sum(gb_hours(b) for b in plan) - best) < 1e-9
+
+
+def test_greedy_result_is_feasible_without_redundant_victims(monkeypatch):
+    monkeypatch.setattr(scheduling, "EXACT_SEARCH_LIMIT", 0)
+    rng = random.Random(11)
+    for _ in range(30):
+        bookings = [_booking(str(i), rng.randint(1, 6), rng.randint(0, 3), rng.randint(1, 3))
+                    for i in range(20)]
+        required = rng.randint(8, 24)
+
+        plan = plan_preemption(bookings, 48, required, START, END, _preemptable)
+
+        assert plan is not None
+        assert _fits(bookings, plan, 48, required)
+        for victim in plan:
+            assert not _fits(bookings, [b for b in plan if b is not victim], 48, required)
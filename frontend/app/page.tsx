@@ -10,14 +10,24 @@ export default function HomePage() {
   useEffect(() => {
     // Check for OAuth callback parameters
     if (typeof window !== 'undefined') {
+      // Tokens arrive in the URL fragment (never sent to servers or logged); errors in the query string
+      const fragmentParams = new URLSearchParams(window.location.hash.slice(1));
       const urlParams = new URLSearchParams(window.location.search);
-      const token = urlParams.get('token');
-      const status = urlParams.get('status');
+      const token = fragmentParams.get('token');
+      const refreshToken = fragmentParams.get('refresh_token');
+      const status = fragmentParams.get('status') || urlParams.get('status');
       const error = urlParams.get('message');
+      if (token) {
+        // Remove the tokens from the address bar and browser history
+        window.history.replaceState(null, '', window.location.pathname);
+      }
 
       if (token && status === 'success') {
         // OAuth login successful
         localStorage.setItem('openbook_token', token);
+        if (refreshToken) {
+          localStorage.setItem('openbook_refresh_token', refreshToken);
+        }
         setStatus('success');
         setMessage('登录成功，正在跳转...');
         setTimeout(() => {
@@ -3,6 +3,8 @@ const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || '/api';
 class ApiClient {
   private baseURL: string;
   private token: string | null = null;
+  private refreshToken: string | null = null;
+  private refreshing: Promise<boolean> | null = null;
 
   constructor() {
     this.baseURL = API_BASE_URL;
@@ -12,17 +14,64 @@ class ApiClient {
   private loadToken() {
     if (typeof window !== 'undefined') {
       this.token = localStorage.getItem('openbook_token');
+      this.refreshToken = localStorage.getItem('openbook_refresh_token');
     }
   }
 
-  private saveToken(token: string) {
+  private saveToken(token: string, refreshToken?: string) {
     this.token = token;
+    if (refreshToken) {
+      this.refreshToken = refreshToken;
+    }
     if (typeof window !== 'undefined') {
       localStorage.setItem('openbook_token', token);
+      if (refreshToken) {
+        localStorage.setItem('openbook_refresh_token', refreshToken);
+      }
+    }
+  }
+
+  private clearTokens() {
+    this.token = null;
+    this.refreshToken = null;
+    if (typeof window !== 'undefined') {
+      localStorage.removeItem('openbook_token');
+      localStorage.removeItem('openbook_refresh_token');
+    }
+  }
+
+  // 用刷新令牌换取新的令牌对；并发的 401 共用同一次刷新
+  private refreshAccessToken(): Promise<boolean> {
+    if (!this.refreshing) {
+      this.refreshing = (async () => {
+        if (typeof window !== 'undefined') {
+          this.refreshToken = localStorage.getItem('openbook_refresh_token');
+        }
+        if (!this.refreshToken) {
+          return false;
+        }
+        const response = await fetch(`${this.baseURL}/auth/refresh`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ refresh_token: this.refreshToken }),
+        }).catch(() => null);
+        if (!response || !response.ok) {
+          if (response && response.status === 401) {
+            this.clearTokens();
+          }
+          return false;
+        }
+        const result = await response.json();
+        this.saveToken(result.access_token, result.refresh_token);
+        return true;
+      })().finally(() => {
+        this.refreshing = null;
+      });
     }
+    return this.refreshing;
   }
 
-  private async request<T>(endpoint: string, options: RequestInit = {}): Promise<T> {
+  private async request<T>(endpoint: string, options: RequestInit = {}, retry: boolean = true): Promise<T> {
     const url = `${this.baseURL}${endpoint}`;
     const headers: Record<string, string> = {
       'Content-Type': 'application/json',
@@ -38,6 +87,13 @@ class ApiClient {
       headers,
     });
 
+    // 访问令牌过期时刷新一次后重试
+    if (response.status === 401 && retry && this.token && !endpoint.startsWith('/auth/')) {
+      if (await this.refreshAccessToken()) {
+        return this.request<T>(endpoint, options, false);
+      }
+    }
+
     if (!response.ok) {
       const error = await response.json().catch(() => ({ detail: 'Network error' }));
       // FastAPI 返回的错误信息在 detail 字段中
@@ -52,12 +108,12 @@ class ApiClient {
     return this.request('/auth/oauth/url');
   }
 
-  async handleOAuthCallback(code: string, state: string): Promise<{ access_token: string; user: any }> {
-    const result = await this.request<{ access_token: string; user: any }>('/auth/oauth/callback', {
+  async handleOAuthCallback(code: string, state: string): Promise<{ access_token: string; refresh_token?: string; user: any }> {
+    const result = await this.request<{ access_token: string; refresh_token?: string; user: any }>('/auth/oauth/callback', {
       method: 'POST',
       body: JSON.stringify({ code, state }),
     });
-    this.saveToken(result.access_token);
+    this.saveToken(result.access_token, result.refresh_token);
     return result;
   }
 
@@ -151,12 +207,12 @@ class ApiClient {
   }
 
   // 管理员功能
-  async adminLogin(email: string, password: string): Promise<{ access_token: string; user: any }> {
-    const result = await this.request<{ access_token: string; user: any }>('/admin/login', {
+  async adminLogin(email: string, password: string): Promise<{ access_token: string; refresh_token: string; user: any }> {
+    const result = await this.request<{ access_token: string; refresh_token: string; user: any }>('/admin/login', {
       method: 'POST',
       body: JSON.stringify({ email, password }),
-    });
-    this.saveToken(result.access_token);
+    }, false);
+    this.saveToken(result.access_token, result.refresh_token);
     return result;
   }
 
@@ -264,10 +320,12 @@ class ApiClient {
   }
 
   logout() {
-    this.token = null;
-    if (typeof window !== 'undefined') {
-      localStorage.removeItem('openbook_token');
+    if (this.token || this.refreshToken) {
+      // 通知服务端吊销当前令牌及刷新令牌，失败不影响本地登出
+      const body = this.refreshToken ? JSON.stringify({ refresh_token: this.refreshToken }) : undefined;
+      this.request('/auth/logout', { method: 'POST', body }).catch(() => {});
     }
+    this.clearTokens();
   }
 
   isAuthenticated(): boolean {